@@ -1,16 +1,22 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 import os
-from typing import Optional
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import pandas as pd
-from sqlalchemy import create_engine
 from dotenv import load_dotenv
 
+from analytics.report_render import REPORT_EXTENSIONS, SUMMARY_FIELDS, iter_report, write_report
+from src.etl.db import get_engine
+
 load_dotenv("src/config/.env")
-engine = create_engine(os.getenv("DB_URL"))
 
+# Wallets per evidence query; keeps the IN list under SQLite's bound-parameter limit.
+CASE_REPORT_BATCH_SIZE = 500
+# Rows kept per wallet in each evidence table.
+EVIDENCE_LIMITS = {"counterparties": 5, "largest_txs": 10, "contracts": 5, "risk_events": 10}
 REASON_COLUMNS = [
     "reason_velocity",
     "reason_new_counterparties",
@@ -18,24 +24,6 @@ REASON_COLUMNS = [
 ]
 
 
-def _format_eth(value: Optional[float]) -> str:
-    if value is None or pd.isna(value):
-        return "n/a"
-    return f"{value:,.4f}"
-
-
-def _format_int(value: Optional[float]) -> str:
-    if value is None or pd.isna(value):
-        return "n/a"
-    return f"{int(value):,}"
-
-
-def _format_date(value: Optional[str]) -> str:
-    if not value or pd.isna(value):
-        return "n/a"
-    return str(value)
-
-
 def _top_reasons(row: pd.Series) -> list[str]:
     scored = {}
     for col in REASON_COLUMNS:
@@ -48,158 +36,200 @@ def _top_reasons(row: pd.Series) -> list[str]:
     return ranked
 
 
-def generate_case_report(wallet_address: str, output_path: Optional[str] = None) -> str:
-    wallet = wallet_address.lower().strip()
-
-    risk_query = """
-        SELECT *
-        FROM risk_metrics
-        WHERE LOWER(wallet_address) = :wallet
-        ORDER BY as_of_date DESC
-        LIMIT 1;
-    """
-    risk_df = pd.read_sql(risk_query, engine, params={"wallet": wallet})
-    risk_row = risk_df.iloc[0] if not risk_df.empty else None
-
-    counterparties_query = """
-        SELECT
-          CASE WHEN direction = 'out' THEN to_address ELSE from_address END AS counterparty,
-          COUNT(*) AS tx_count,
-          SUM(value_eth) AS volume_eth
-        FROM transactions
-        WHERE LOWER(wallet_address) = :wallet
-          AND timestamp >= datetime('now', '-30 days')
-        GROUP BY counterparty
-        ORDER BY volume_eth DESC
-        LIMIT 5;
-    """
-    counterparties_df = pd.read_sql(counterparties_query, engine, params={"wallet": wallet})
-
-    largest_txs_query = """
-        SELECT
-          timestamp,
-          direction,
-          from_address,
-          to_address,
-          value_eth,
-          tx_hash
-        FROM transactions
-        WHERE LOWER(wallet_address) = :wallet
-          AND timestamp >= datetime('now', '-30 days')
-        ORDER BY value_eth DESC
-        LIMIT 10;
-    """
-    largest_txs_df = pd.read_sql(largest_txs_query, engine, params={"wallet": wallet})
-
-    contract_interactions_query = """
-        SELECT
-          to_address AS contract_address,
-          COUNT(*) AS tx_count,
-          SUM(value_eth) AS volume_eth
-        FROM transactions
-        WHERE LOWER(wallet_address) = :wallet
-          AND timestamp >= datetime('now', '-30 days')
-          AND is_contract_interaction = 1
-        GROUP BY contract_address
-        ORDER BY tx_count DESC
-        LIMIT 5;
-    """
-    contract_df = pd.read_sql(contract_interactions_query, engine, params={"wallet": wallet})
-
-    risk_events_query = """
-        SELECT rule_name, severity, event_time, details
-        FROM risk_events
-        WHERE LOWER(wallet_address) = :wallet
-        ORDER BY event_time DESC
-        LIMIT 10;
-    """
-    risk_events_df = pd.read_sql(risk_events_query, engine, params={"wallet": wallet})
-
-    generated_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
-
-    lines = [
-        f"# Case Report: {wallet_address}",
-        "",
-        f"Generated: {generated_at}",
-        "",
-        "## Risk Summary",
-    ]
-
-    if risk_row is None:
-        lines.append("- No risk metrics available for this wallet yet.")
-    else:
-        top_reasons = _top_reasons(risk_row)
-        lines.extend([
-            f"- As of: {_format_date(risk_row.get('as_of_date'))}",
-            f"- Risk score: {risk_row.get('risk_score', 'n/a')}",
-            f"- 30d tx count: {_format_int(risk_row.get('tx_count_30d'))}",
-            f"- 30d volume (ETH): {_format_eth(risk_row.get('volume_30d'))}",
-            f"- 30d unique counterparties: {_format_int(risk_row.get('unique_counterparties_30d'))}",
-            f"- 30d contract interactions: {_format_int(risk_row.get('contract_interactions_30d'))}",
-            f"- Avg tx size (ETH): {_format_eth(risk_row.get('avg_tx_size'))}",
-            f"- Top reasons: {', '.join(top_reasons) if top_reasons else 'none'}",
-        ])
-
-    lines.extend(["", "## Evidence", "", "### Top Counterparties (30d)"])
-    if counterparties_df.empty:
-        lines.append("- None found.")
-    else:
-        lines.append("| Counterparty | Tx Count | Volume (ETH) |")
-        lines.append("| --- | --- | --- |")
-        for _, row in counterparties_df.iterrows():
-            lines.append(
-                f"| {row['counterparty']} | {_format_int(row['tx_count'])} | {_format_eth(row['volume_eth'])} |"
+def _wallet_params(wallets: Sequence[str]) -> Tuple[str, Dict[str, object]]:
+    params = {f"wallet_{i}": wallet for i, wallet in enumerate(wallets)}
+    return ", ".join(f":{name}" for name in params), params
+
+
+def load_case_evidence(
+    wallets: Sequence[str],
+    limits: Optional[Dict[str, int]] = None,
+) -> Dict[str, pd.DataFrame]:
+    # One query per evidence section for the whole wallet set; ROW_NUMBER keeps
+    # each wallet's top rows, in the order the per-wallet report queries used.
+    limits = {**EVIDENCE_LIMITS, **(limits or {})}
+    placeholders, params = _wallet_params(wallets)
+    # Evidence covers the last 30 days of block time (epoch seconds).
+    params["since"] = int(datetime.now(timezone.utc).timestamp()) - 30 * 86400
+    queries = {
+        "risk": f"""
+            SELECT * FROM (
+              SELECT
+                *,
+                ROW_NUMBER() OVER (
+                  PARTITION BY wallet_address ORDER BY as_of_date DESC, id DESC
+                ) AS row_rank
+              FROM risk_metrics
+              WHERE wallet_address IN ({placeholders})
             )
-
-    lines.extend(["", "### Largest Transfers (30d)"])
-    if largest_txs_df.empty:
-        lines.append("- None found.")
-    else:
-        lines.append("| Timestamp | Direction | Counterparty | Value (ETH) | Tx Hash |")
-        lines.append("| --- | --- | --- | --- | --- |")
-        for _, row in largest_txs_df.iterrows():
-            counterparty = row["to_address"] if row["direction"] == "out" else row["from_address"]
-            lines.append(
-                "| {timestamp} | {direction} | {counterparty} | {value} | {tx_hash} |".format(
-                    timestamp=row["timestamp"],
-                    direction=row["direction"],
-                    counterparty=counterparty,
-                    value=_format_eth(row["value_eth"]),
-                    tx_hash=row["tx_hash"],
-                )
+            WHERE row_rank = 1;
+        """,
+        "counterparties": f"""
+            SELECT wallet_address, counterparty, tx_count, volume_eth FROM (
+              SELECT
+                wallet_address,
+                counterparty,
+                COUNT(*) AS tx_count,
+                SUM(value_eth) AS volume_eth,
+                ROW_NUMBER() OVER (
+                  PARTITION BY wallet_address ORDER BY SUM(value_eth) DESC
+                ) AS row_rank
+              FROM (
+                SELECT
+                  wallet_address,
+                  CASE WHEN direction = 'out' THEN to_address ELSE from_address END AS counterparty,
+                  value_eth
+                FROM transactions
+                WHERE wallet_address IN ({placeholders})
+                  AND block_time >= :since
+              )
+              GROUP BY wallet_address, counterparty
             )
-
-    lines.extend(["", "### Contract Interactions (30d)"])
-    if contract_df.empty:
-        lines.append("- None found.")
-    else:
-        lines.append("| Contract | Tx Count | Volume (ETH) |")
-        lines.append("| --- | --- | --- |")
-        for _, row in contract_df.iterrows():
-            lines.append(
-                f"| {row['contract_address']} | {_format_int(row['tx_count'])} | {_format_eth(row['volume_eth'])} |"
+            WHERE row_rank <= {limits['counterparties']}
+            ORDER BY wallet_address, row_rank;
+        """,
+        "largest_txs": f"""
+            SELECT wallet_address, timestamp, direction, from_address, to_address, value_eth, tx_hash FROM (
+              SELECT
+                *,
+                ROW_NUMBER() OVER (
+                  PARTITION BY wallet_address ORDER BY value_eth DESC
+                ) AS row_rank
+              FROM transactions
+              WHERE wallet_address IN ({placeholders})
+                AND block_time >= :since
             )
-
-    lines.extend(["", "### Risk Events (latest)"])
-    if risk_events_df.empty:
-        lines.append("- None found.")
-    else:
-        lines.append("| Rule | Severity | Event Time | Details |")
-        lines.append("| --- | --- | --- | --- |")
-        for _, row in risk_events_df.iterrows():
-            details = row["details"] if row["details"] else ""
-            lines.append(
-                f"| {row['rule_name']} | {_format_int(row['severity'])} | {row['event_time']} | {details} |"
+            WHERE row_rank <= {limits['largest_txs']}
+            ORDER BY wallet_address, row_rank;
+        """,
+        "contracts": f"""
+            SELECT wallet_address, contract_address, tx_count, volume_eth FROM (
+              SELECT
+                wallet_address,
+                to_address AS contract_address,
+                COUNT(*) AS tx_count,
+                SUM(value_eth) AS volume_eth,
+                ROW_NUMBER() OVER (
+                  PARTITION BY wallet_address ORDER BY COUNT(*) DESC
+                ) AS row_rank
+              FROM transactions
+              WHERE wallet_address IN ({placeholders})
+                AND block_time >= :since
+                AND is_contract_interaction = 1
+              GROUP BY wallet_address, to_address
             )
-
-    report = "\n".join(lines) + "\n"
-
-    if not output_path:
-        safe_wallet = wallet_address[:10].lower()
-        output_path = os.path.join("reports", f"case_{safe_wallet}_{datetime.utcnow().date().isoformat()}.md")
-
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    with open(output_path, "w", encoding="utf-8") as handle:
-        handle.write(report)
-
-    return output_path
+            WHERE row_rank <= {limits['contracts']}
+            ORDER BY wallet_address, row_rank;
+        """,
+        "risk_events": f"""
+            SELECT wallet_address, rule_name, severity, event_time, details FROM (
+              SELECT
+                *,
+                ROW_NUMBER() OVER (
+                  PARTITION BY wallet_address ORDER BY event_time DESC
+                ) AS row_rank
+              FROM risk_events
+              WHERE wallet_address IN ({placeholders})
+            )
+            WHERE row_rank <= {limits['risk_events']}
+            ORDER BY wallet_address, row_rank;
+        """,
+    }
+    with get_engine().connect() as conn:
+        return {name: pd.read_sql(query, conn, params=params) for name, query in queries.items()}
+
+
+def build_case_model(
+    wallet_address: str,
+    evidence: Dict[str, pd.DataFrame],
+    generated_at: Optional[str] = None,
+) -> dict:
+    risk_df = evidence["risk"]
+    summary = None
+    if not risk_df.empty:
+        risk_row = risk_df.iloc[0]
+        summary = {column: risk_row[column] for _, column, _ in SUMMARY_FIELDS if column in risk_row}
+        summary["top_reasons"] = _top_reasons(risk_row)
+    largest_txs = evidence["largest_txs"]
+    outbound = largest_txs["direction"].eq("out")
+    return {
+        "wallet_address": wallet_address,
+        "generated_at": generated_at or datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC"),
+        "summary": summary,
+        "tables": {
+            "counterparties": evidence["counterparties"],
+            "largest_txs": largest_txs.assign(
+                counterparty=largest_txs["to_address"].where(outbound, largest_txs["from_address"])
+            ),
+            "contracts": evidence["contracts"],
+            "risk_events": evidence["risk_events"],
+        },
+    }
+
+
+def render_case_report(
+    wallet_address: str,
+    evidence: Dict[str, pd.DataFrame],
+    generated_at: Optional[str] = None,
+    fmt: str = "markdown",
+) -> str:
+    return "".join(iter_report(build_case_model(wallet_address, evidence, generated_at), fmt))
+
+
+def _default_report_path(
+    wallet_address: str,
+    directory: str = "reports",
+    prefix_only: bool = True,
+    fmt: str = "markdown",
+) -> str:
+    # Batches use the full address: 10-character prefixes collide across hundreds of wallets.
+    safe_wallet = wallet_address[:10].lower() if prefix_only else wallet_address.lower()
+    filename = f"case_{safe_wallet}_{datetime.utcnow().date().isoformat()}{REPORT_EXTENSIONS[fmt]}"
+    return os.path.join(directory, filename)
+
+
+def _write_report(model: dict, output_path: str, fmt: str) -> str:
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    return write_report(model, output_path, fmt)
+
+
+def generate_case_report(
+    wallet_address: str,
+    output_path: Optional[str] = None,
+    fmt: str = "markdown",
+) -> str:
+    wallet = wallet_address.lower().strip()
+    model = build_case_model(wallet_address, load_case_evidence([wallet]))
+    return _write_report(model, output_path or _default_report_path(wallet_address, fmt=fmt), fmt)
+
+
+def generate_case_reports(
+    wallet_addresses: Sequence[str],
+    output_dir: str = "reports",
+    workers: Optional[int] = None,
+    fmt: str = "markdown",
+) -> List[str]:
+    wallets = list(dict.fromkeys(wallet.lower().strip() for wallet in wallet_addresses if wallet.strip()))
+    workers = workers or int(os.getenv("CASE_REPORT_WORKERS", "4"))
+    generated_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+    paths = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for start in range(0, len(wallets), CASE_REPORT_BATCH_SIZE):
+            batch = wallets[start:start + CASE_REPORT_BATCH_SIZE]
+            evidence = load_case_evidence(batch)
+            grouped = {
+                name: dict(tuple(frame.groupby("wallet_address", sort=False)))
+                for name, frame in evidence.items()
+            }
+
+            def _render(wallet: str) -> str:
+                wallet_evidence = {
+                    name: groups.get(wallet, evidence[name].iloc[:0])
+                    for name, groups in grouped.items()
+                }
+                model = build_case_model(wallet, wallet_evidence, generated_at)
+                path = _default_report_path(wallet, output_dir, prefix_only=False, fmt=fmt)
+                return _write_report(model, path, fmt)
+
+            paths.extend(executor.map(_render, batch))
+    return paths
@@ -0,0 +1,230 @@
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from analytics.metrics import (
+    DELTA_METRIC,
+    EXCHANGE_METRICS,
+    METRIC_COLUMNS,
+    STABLECOIN_METRICS,
+    ZERO_ADDRESS,
+    add_transfer_count_delta,
+    melt_metrics,
+    partition_params,
+    restrict_to_partitions,
+)
+from src.etl.db import get_engine
+from src.etl.load import SECONDS_PER_DAY, day_labels
+
+METRICS_CHUNK_ROWS = int(os.getenv("METRICS_CHUNK_ROWS", "500000"))
+TRANSFER_KEY = ["tx_hash", "category", "log_index"]
+TRANSFER_COLUMNS = [
+    "tx_hash",
+    "category",
+    "log_index",
+    "wallet_address",
+    "from_address",
+    "to_address",
+    "from_entity_id",
+    "to_entity_id",
+    "value_eth",
+    "token_symbol",
+    "token_value",
+    "block_time",
+]
+STABLE_ENTITY_TYPES = {"stablecoin", "contract", "bridge", "erc20"}
+
+
+def _load_entities() -> pd.DataFrame:
+    entities = pd.read_sql("SELECT id, address, label AS entity_label, entity_type FROM entities", get_engine())
+    kind = entities["entity_type"].str.lower()
+    entities["is_exchange"] = kind.str.contains("exchange", na=False) | kind.str.contains("hot", na=False)
+    entities["is_stable"] = kind.isin(STABLE_ENTITY_TYPES)
+    return entities
+
+
+def _iter_transfer_chunks(params: Dict[str, Any]):
+    placeholder = "?" if get_engine().dialect.paramstyle == "qmark" else "%s"
+    where = f"WHERE block_time >= {placeholder} AND block_time < {placeholder}" if params else ""
+    query = f"""
+    SELECT {", ".join(TRANSFER_COLUMNS)}
+    FROM transactions
+    {where}
+    ORDER BY tx_hash, category, log_index
+    """
+    # A DBAPI cursor skips SQLAlchemy's per-row wrapping, which dominates at millions of rows.
+    raw = get_engine().raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute(query, (params["stable_start_time"], params["stable_end_time"]) if params else ())
+        carry = None
+        while True:
+            rows = cursor.fetchmany(METRICS_CHUNK_ROWS)
+            if not rows:
+                break
+            chunk = pd.DataFrame.from_records(rows, columns=TRANSFER_COLUMNS, coerce_float=True)
+            if carry is not None:
+                chunk = pd.concat([carry, chunk], ignore_index=True)
+            # Copies of the last transfer may continue in the next chunk, so hold them back.
+            last = chunk.iloc[-1]
+            tail = (
+                chunk["tx_hash"].eq(last["tx_hash"])
+                & chunk["category"].eq(last["category"])
+                & chunk["log_index"].eq(last["log_index"])
+            )
+            carry = chunk[tail]
+            if not tail.all():
+                yield chunk[~tail]
+        if carry is not None and not carry.empty:
+            yield carry
+    finally:
+        raw.close()
+
+
+def _sum_by(df: pd.DataFrame, keys: List[str], columns: List[str]) -> pd.DataFrame:
+    if df.empty:
+        return pd.DataFrame(columns=keys + columns)
+    return df.groupby(keys, dropna=False, sort=False)[columns].sum().reset_index()
+
+
+def _entity_flows(unique: pd.DataFrame, entities: pd.DataFrame) -> pd.DataFrame:
+    eth = unique[unique["value_eth"].notna()]
+    lookup = entities[["id", "entity_type", "entity_label"]]
+    inbound = eth.merge(lookup, left_on="to_entity_id", right_on="id")
+    inbound = inbound.assign(inflow=inbound["value_eth"], outflow=0.0)
+    outbound = eth.merge(lookup, left_on="from_entity_id", right_on="id")
+    outbound = outbound.assign(inflow=0.0, outflow=outbound["value_eth"])
+    flows = pd.concat([inbound, outbound], ignore_index=True)
+    return _sum_by(flows, ["metric_date", "entity_type", "entity_label"], ["inflow", "outflow"])
+
+
+def _large_transfers(unique: pd.DataFrame, threshold: float) -> pd.DataFrame:
+    large = unique[unique["value_eth"] >= threshold].assign(large_tx_count=1)
+    large = large.rename(columns={"value_eth": "large_tx_volume"})
+    return _sum_by(large, ["metric_date"], ["large_tx_count", "large_tx_volume"])
+
+
+def _stablecoin_flows(
+    chunk: pd.DataFrame,
+    stable_entities: pd.DataFrame,
+    exchange_ids: pd.Index,
+) -> pd.DataFrame:
+    tokens = chunk[chunk["token_value"].notna()]
+    tokens = tokens.merge(stable_entities, left_on="wallet_address", right_on="address")
+    value = tokens["token_value"]
+    tokens = tokens.assign(
+        asset_symbol=tokens["token_symbol"],
+        minted=value.where(tokens["from_address"].eq(ZERO_ADDRESS), 0.0),
+        burned=value.where(tokens["to_address"].eq(ZERO_ADDRESS), 0.0),
+        to_exchanges=value.where(tokens["to_entity_id"].isin(exchange_ids), 0.0),
+        from_exchanges=value.where(tokens["from_entity_id"].isin(exchange_ids), 0.0),
+        transfer_count=1,
+    )
+    return _sum_by(
+        tokens,
+        ["metric_date", "entity_type", "entity_label", "asset_symbol"],
+        ["minted", "burned", "to_exchanges", "from_exchanges", "transfer_count"],
+    )
+
+
+def _exchange_flows(unique: pd.DataFrame, exchange_labels: pd.Series) -> pd.DataFrame:
+    to_label = unique["to_entity_id"].map(exchange_labels)
+    from_label = unique["from_entity_id"].map(exchange_labels)
+    deposit = to_label.notna() & from_label.isna()
+    withdrawal = from_label.notna() & to_label.isna()
+    flows = unique[deposit | withdrawal].assign(entity_label=to_label.where(deposit, from_label))
+    deposit = deposit[flows.index]
+
+    eth = flows[flows["value_eth"].notna() & flows["token_value"].isna()]
+    eth = eth.assign(
+        asset_symbol="ETH",
+        deposits=eth["value_eth"].where(deposit[eth.index], 0.0),
+        withdrawals=eth["value_eth"].where(~deposit[eth.index], 0.0),
+    )
+    tokens = flows[flows["token_value"].notna()]
+    tokens = tokens.assign(
+        asset_symbol=tokens["token_symbol"],
+        deposits=tokens["token_value"].where(deposit[tokens.index], 0.0),
+        withdrawals=tokens["token_value"].where(~deposit[tokens.index], 0.0),
+    )
+    keys = ["metric_date", "entity_label", "asset_symbol"]
+    return pd.concat(
+        [_sum_by(eth, keys, ["deposits", "withdrawals"]), _sum_by(tokens, keys, ["deposits", "withdrawals"])],
+        ignore_index=True,
+    )
+
+
+def _combine(parts: List[pd.DataFrame], keys: List[str], columns: List[str]) -> pd.DataFrame:
+    parts = [part for part in parts if not part.empty]
+    if not parts:
+        return pd.DataFrame(columns=keys + columns)
+    return _sum_by(pd.concat(parts, ignore_index=True), keys, columns)
+
+
+def build_daily_metrics_columnar(
+    large_tx_threshold: float = 1000.0,
+    dates: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    params = partition_params(dates) if dates else {}
+    entities = _load_entities()
+    stable_entities = entities.loc[entities["is_stable"], ["address", "entity_type", "entity_label"]]
+    exchange_labels = entities[entities["is_exchange"]].set_index("id")["entity_label"]
+
+    entity_parts, large_parts, stable_parts, exchange_parts = [], [], [], []
+    for chunk in _iter_transfer_chunks(params):
+        chunk = chunk.assign(metric_date=day_labels(chunk["block_time"] // SECONDS_PER_DAY))
+        stable_parts.append(_stablecoin_flows(chunk, stable_entities, exchange_labels.index))
+
+        unique = chunk.drop_duplicates(TRANSFER_KEY)
+        if params:
+            block_time = unique["block_time"]
+            in_range = (block_time >= params["start_time"]) & (block_time < params["end_time"])
+            unique = unique[in_range]
+        entity_parts.append(_entity_flows(unique, entities))
+        large_parts.append(_large_transfers(unique, large_tx_threshold))
+        exchange_parts.append(_exchange_flows(unique, exchange_labels))
+
+    entity_df = _combine(entity_parts, ["metric_date", "entity_type", "entity_label"], ["inflow", "outflow"])
+    entity_df["net_flow"] = entity_df["inflow"] - entity_df["outflow"]
+
+    large_df = _combine(large_parts, ["metric_date"], ["large_tx_count", "large_tx_volume"])
+
+    stable_df = _combine(
+        stable_parts,
+        ["metric_date", "entity_type", "entity_label", "asset_symbol"],
+        ["minted", "burned", "to_exchanges", "from_exchanges", "transfer_count"],
+    )
+    stable_df["net_flow_to_exchanges"] = stable_df["to_exchanges"] - stable_df["from_exchanges"]
+    if not stable_df.empty:
+        stable_df = stable_df.sort_values(["metric_date", "entity_type", "entity_label", "asset_symbol"])
+        stable_df = add_transfer_count_delta(stable_df.sort_values("metric_date").reset_index(drop=True))
+
+    exchange_df = _combine(
+        exchange_parts, ["metric_date", "entity_label", "asset_symbol"], ["deposits", "withdrawals"]
+    )
+    exchange_df["net_flow"] = exchange_df["deposits"] - exchange_df["withdrawals"]
+
+    frames = [
+        melt_metrics(
+            entity_df.assign(asset_symbol="ETH"),
+            {"inflow": "inflow", "outflow": "outflow", "net_flow": "net_flow"},
+        ),
+        melt_metrics(
+            large_df.assign(entity_type=None, entity_label=None, asset_symbol="ETH"),
+            {"large_tx_count": "large_tx_count", "large_tx_volume": "large_tx_volume"},
+        ),
+        melt_metrics(stable_df, STABLECOIN_METRICS),
+        melt_metrics(exchange_df.assign(entity_type="exchange"), EXCHANGE_METRICS),
+    ]
+    if not stable_df.empty:
+        frames.append(
+            melt_metrics(stable_df.dropna(subset=[DELTA_METRIC]), {DELTA_METRIC: DELTA_METRIC})
+        )
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=METRIC_COLUMNS)
+    result = pd.concat(frames, ignore_index=True)
+    result = result.astype({"value": np.float64})
+    return restrict_to_partitions(result, dates)
@@ -0,0 +1,112 @@
+import os
+import re
+from typing import Any, Callable, Optional, Sequence
+
+import pandas as pd
+
+from analytics.metrics import daily_metrics_from, partition_params
+from analytics.risk import WINDOWS
+from src.etl.db import get_engine
+from src.etl.parquet_store import TRANSACTION_COLUMNS, TRANSACTION_DTYPES, partition_files
+
+DUCKDB_DAY = {
+    "number": "{} // 86400",
+    "label": "CAST(DATE '1970-01-01' + CAST({} AS INTEGER) AS VARCHAR)",
+}
+# Partitions exported before block_time was stored derive it from timestamp.
+LEGACY_BLOCK_TIME = "CAST(floor(epoch(timestamp)) AS BIGINT)"
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", "0"))
+NAMED_PARAM = re.compile(r"(?<![:\w]):(\w+)")
+# Same shape as the hourly bucket tables load.py keeps in SQLite, so the risk
+# feature queries run unchanged against the Parquet partitions.
+BUCKET_TABLES = """
+CREATE TEMP TABLE wallet_activity_buckets AS
+SELECT
+    wallet_address,
+    strftime(date_trunc('hour', timestamp), '%Y-%m-%d %H:%M:%S') AS bucket_start,
+    COUNT(*) AS tx_count,
+    SUM(value_eth) AS volume_eth,
+    COUNT(value_eth) AS value_count,
+    SUM(CASE WHEN is_contract_interaction THEN 1 ELSE 0 END) AS contract_interactions
+FROM transactions
+GROUP BY ALL;
+CREATE TEMP TABLE wallet_counterparty_buckets AS
+SELECT DISTINCT
+    wallet_address,
+    strftime(date_trunc('hour', timestamp), '%Y-%m-%d %H:%M:%S') AS bucket_start,
+    CASE WHEN direction = 'out' THEN to_address ELSE from_address END AS counterparty
+FROM transactions
+WHERE CASE WHEN direction = 'out' THEN to_address ELSE from_address END IS NOT NULL;
+"""
+
+
+def connect(start: Optional[str] = None, end: Optional[str] = None):
+    # duckdb is only needed for this engine, so import it on demand.
+    try:
+        import duckdb
+    except ImportError as exc:
+        raise RuntimeError("--metrics-engine duckdb requires the duckdb package.") from exc
+    conn = duckdb.connect()
+    if DUCKDB_THREADS:
+        conn.execute(f"SET threads = {DUCKDB_THREADS}")
+    files = partition_files(start, end)
+    if files:
+        paths = ", ".join("'" + path.replace("'", "''") + "'" for path in files)
+        source = f"read_parquet([{paths}], union_by_name = true)"
+        columns = {row[0] for row in conn.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()}
+        if "block_time" in columns:
+            select = f"* REPLACE (COALESCE(block_time, {LEGACY_BLOCK_TIME}) AS block_time)"
+        else:
+            select = f"*, {LEGACY_BLOCK_TIME} AS block_time"
+        conn.execute(f"CREATE VIEW transactions AS SELECT {select} FROM {source}")
+    else:
+        empty = pd.DataFrame(columns=TRANSACTION_COLUMNS).astype(
+            {**TRANSACTION_DTYPES, "timestamp": "datetime64[us]"}
+        )
+        conn.register("transactions", empty)
+    # Entities are small and change in place, so they are read from the database each time.
+    conn.register("entities", pd.read_sql("SELECT id, address, label, entity_type FROM entities", get_engine()))
+    return conn
+
+
+def _reader(conn) -> Callable[[str, Any], pd.DataFrame]:
+    def read_sql(query: str, params) -> pd.DataFrame:
+        if isinstance(params, dict):
+            # :name placeholders become $name, and DuckDB rejects unused parameters.
+            names = set(NAMED_PARAM.findall(query))
+            query = NAMED_PARAM.sub(r"$\1", query)
+            params = {name: value for name, value in params.items() if name in names}
+        result = conn.execute(query, params)
+        hugeints = [column for column, kind, *_ in result.description if str(kind) == "HUGEINT"]
+        frame = result.df()
+        # SUM over integers is a HUGEINT, which pandas receives as float; keep SQLite's ints.
+        for column in hugeints:
+            if frame[column].notna().all():
+                frame[column] = frame[column].astype("int64")
+        return frame
+
+    return read_sql
+
+
+def build_daily_metrics_duckdb(
+    large_tx_threshold: float = 1000.0,
+    dates: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    start = end = None
+    if dates:
+        # The padded stablecoin range is the widest any family reads.
+        params = partition_params(dates)
+        start, end = params["stable_start"], params["stable_end"]
+    conn = connect(start, end)
+    try:
+        return daily_metrics_from(_reader(conn), large_tx_threshold, dates, DUCKDB_DAY)
+    finally:
+        conn.close()
+
+
+def risk_bucket_reader() -> Callable[[str, Sequence[Any]], pd.DataFrame]:
+    # One extra day covers the partial day at the start of the 30d window.
+    start = (pd.Timestamp.now(tz="UTC") - WINDOWS["30d"] - pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    conn = connect(start)
+    conn.execute(BUCKET_TABLES)
+    return _reader(conn)
@@ -1,259 +1,316 @@
-import os
-from typing import List, Dict, Any
+from datetime import date, timedelta
+from typing import Callable, List, Dict, Any, Optional, Sequence, Tuple
 
 import pandas as pd
-from sqlalchemy import create_engine
-from dotenv import load_dotenv
 
-load_dotenv("src/config/.env")
-engine = create_engine(os.getenv("DB_URL"))
+from src.etl.bulk import bulk_insert
+from src.etl.db import get_engine
+from src.etl.load import day_start
+
 ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
 
+# The 7d delta rolls over observed days rather than calendar days, so an
+# incremental rebuild pads the stablecoin window generously on both sides.
+DELTA_PADDING_DAYS = 30
+DELTA_METRIC = "transfer_count_7d_delta"
+METRIC_ID_COLUMNS = ["metric_date", "entity_type", "entity_label", "asset_symbol"]
+METRIC_COLUMNS = ["metric_date", "metric_name", "entity_type", "entity_label", "asset_symbol", "value"]
+STABLECOIN_METRICS = {
+    "minted": "tokens_minted",
+    "burned": "tokens_burned",
+    "net_flow_to_exchanges": "net_flow_to_exchanges",
+    "transfer_count": "transfer_count",
+}
+EXCHANGE_METRICS = {
+    "deposits": "exchange_deposits",
+    "withdrawals": "exchange_withdrawals",
+    "net_flow": "exchange_net_flow",
+}
+# Expressions that turn block_time into a day number, and a day number into its
+# 'YYYY-MM-DD' metric_date. Queries group on the number and label each group.
+SQLITE_DAY = {"number": "{} / 86400", "label": "date({} * 86400, 'unixepoch')"}
+
+
+def _unique_transfers_cte(range_filter: str = "") -> str:
+    # A transfer between two tracked wallets is stored once per wallet; collapse
+    # those copies so entity and market-wide flows count it once.
+    where = f"WHERE {range_filter}" if range_filter else ""
+    return f"""
+    unique_transfers AS (
+        SELECT
+            tx_hash,
+            category,
+            log_index,
+            MIN(from_entity_id) AS from_entity_id,
+            MIN(to_entity_id) AS to_entity_id,
+            MIN(value_eth) AS value_eth,
+            MIN(token_symbol) AS token_symbol,
+            MIN(token_value) AS token_value,
+            MIN(block_time) AS block_time
+        FROM transactions
+        {where}
+        GROUP BY tx_hash, category, log_index
+    )
+    """
+
+
+def metric_partitions(dates: Sequence[str]) -> Tuple[List[str], str, str]:
+    base_dates = sorted({str(value) for value in dates if value})
+    first = date.fromisoformat(base_dates[0])
+    last = date.fromisoformat(base_dates[-1])
+    delta_end = last + timedelta(days=DELTA_PADDING_DAYS + 1)
+    return base_dates, first.isoformat(), delta_end.isoformat()
+
+
+def partition_params(dates: Sequence[str]) -> Dict[str, Any]:
+    base_dates, delta_start, delta_end = metric_partitions(dates)
+    params = {
+        "start": base_dates[0],
+        "end": (date.fromisoformat(base_dates[-1]) + timedelta(days=1)).isoformat(),
+        "stable_start": (
+            date.fromisoformat(delta_start) - timedelta(days=DELTA_PADDING_DAYS)
+        ).isoformat(),
+        "stable_end": delta_end,
+    }
+    # The same bounds as block_time, which is what the range filters compare.
+    for key in list(params):
+        params[f"{key}_time"] = day_start(params[key])
+    return params
+
+
+def add_transfer_count_delta(stable_df: pd.DataFrame) -> pd.DataFrame:
+    stable_df["transfer_count"] = pd.to_numeric(stable_df["transfer_count"], errors="coerce").fillna(0)
+    stable_df["transfer_count_7d_avg"] = (
+        stable_df.groupby(["entity_label", "asset_symbol"])["transfer_count"]
+        .rolling(7, min_periods=2)
+        .mean()
+        .shift(1)
+        .reset_index(level=[0, 1], drop=True)
+    )
+    stable_df["transfer_count_7d_delta"] = (
+        stable_df["transfer_count"] - stable_df["transfer_count_7d_avg"]
+    )
+    return stable_df
+
+
+def restrict_to_partitions(result: pd.DataFrame, dates: Optional[Sequence[str]]) -> pd.DataFrame:
+    if not dates or result.empty:
+        return result
+    # The padded stablecoin window also yields rows outside the rebuilt partitions.
+    base_dates, delta_start, delta_end = metric_partitions(dates)
+    is_delta = result["metric_name"].eq(DELTA_METRIC)
+    in_base = result["metric_date"].isin(base_dates) & ~is_delta
+    in_delta = is_delta & (result["metric_date"] >= delta_start) & (result["metric_date"] < delta_end)
+    return result[in_base | in_delta].reset_index(drop=True)
+
+
+def melt_metrics(wide: pd.DataFrame, metric_columns: Dict[str, str]) -> pd.DataFrame:
+    if wide.empty:
+        return pd.DataFrame(columns=METRIC_COLUMNS)
+    # ignore_index=False plus a stable sort keeps each source row's metrics together.
+    long = (
+        wide.reset_index(drop=True)
+        .rename(columns=metric_columns)
+        .melt(
+            id_vars=METRIC_ID_COLUMNS,
+            value_vars=list(metric_columns.values()),
+            var_name="metric_name",
+            value_name="value",
+            ignore_index=False,
+        )
+        .sort_index(kind="stable")
+        .reset_index(drop=True)
+    )
+    return long[METRIC_COLUMNS]
+
+
+def build_daily_metrics(
+    large_tx_threshold: float = 1000.0,
+    dates: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    return daily_metrics_from(
+        lambda query, params: pd.read_sql(query, get_engine(), params=params),
+        large_tx_threshold,
+        dates,
+    )
+
 
-def build_daily_metrics(large_tx_threshold: float = 1000.0) -> pd.DataFrame:
-    metrics: List[Dict[str, Any]] = []
+def daily_metrics_from(
+    read_sql: Callable[[str, Dict[str, Any]], pd.DataFrame],
+    large_tx_threshold: float = 1000.0,
+    dates: Optional[Sequence[str]] = None,
+    day: Dict[str, str] = SQLITE_DAY,
+) -> pd.DataFrame:
+    # The queries only assume transactions and entities tables, so another engine
+    # can run them by supplying read_sql and its own day expressions.
+    frames: List[pd.DataFrame] = []
+    t_day = day["number"].format("t.block_time")
+    t_date = day["label"].format(t_day)
+    tx_day = day["number"].format("block_time")
+    tx_date = day["label"].format(tx_day)
+    grouped_date = day["label"].format("metric_day")
 
-    entity_query = """
-    WITH entity_txs AS (
+    params: Dict[str, Any] = {}
+    range_filter = ""
+    stable_range_filter = ""
+    if dates:
+        params = partition_params(dates)
+        range_filter = "block_time >= :start_time AND block_time < :end_time"
+        stable_range_filter = "AND t.block_time >= :stable_start_time AND t.block_time < :stable_end_time"
+
+    entity_query = f"""
+    WITH {_unique_transfers_cte(range_filter)},
+    entity_txs AS (
+        SELECT
+            {t_day} AS metric_day,
+            e.entity_type AS entity_type,
+            e.label AS entity_label,
+            t.value_eth AS inflow,
+            0 AS outflow
+        FROM unique_transfers t
+        JOIN entities e ON e.id = t.to_entity_id
+        WHERE t.value_eth IS NOT NULL
+        UNION ALL
         SELECT
-            date(t.timestamp) AS metric_date,
+            {t_day} AS metric_day,
             e.entity_type AS entity_type,
             e.label AS entity_label,
-            CASE WHEN LOWER(t.to_address) = e.address THEN t.value_eth ELSE 0 END AS inflow,
-            CASE WHEN LOWER(t.from_address) = e.address THEN t.value_eth ELSE 0 END AS outflow
-        FROM transactions t
-        JOIN entities e
-          ON LOWER(t.to_address) = e.address OR LOWER(t.from_address) = e.address
+            0 AS inflow,
+            t.value_eth AS outflow
+        FROM unique_transfers t
+        JOIN entities e ON e.id = t.from_entity_id
         WHERE t.value_eth IS NOT NULL
     )
     SELECT
-        metric_date,
+        {grouped_date} AS metric_date,
         entity_type,
         entity_label,
         SUM(inflow) AS inflow,
         SUM(outflow) AS outflow,
         SUM(inflow) - SUM(outflow) AS net_flow
     FROM entity_txs
-    GROUP BY metric_date, entity_type, entity_label;
+    GROUP BY metric_day, entity_type, entity_label;
     """
-    entity_df = pd.read_sql(entity_query, engine)
-    if not entity_df.empty:
-        for _, row in entity_df.iterrows():
-            metrics.append(
-                {
-                    "metric_date": row["metric_date"],
-                    "metric_name": "inflow",
-                    "entity_type": row["entity_type"],
-                    "entity_label": row["entity_label"],
-                    "asset_symbol": "ETH",
-                    "value": row["inflow"],
-                }
-            )
-            metrics.append(
-                {
-                    "metric_date": row["metric_date"],
-                    "metric_name": "outflow",
-                    "entity_type": row["entity_type"],
-                    "entity_label": row["entity_label"],
-                    "asset_symbol": "ETH",
-                    "value": row["outflow"],
-                }
-            )
-            metrics.append(
-                {
-                    "metric_date": row["metric_date"],
-                    "metric_name": "net_flow",
-                    "entity_type": row["entity_type"],
-                    "entity_label": row["entity_label"],
-                    "asset_symbol": "ETH",
-                    "value": row["net_flow"],
-                }
-            )
+    entity_df = read_sql(entity_query, params)
+    frames.append(
+        melt_metrics(
+            entity_df.assign(asset_symbol="ETH"),
+            {"inflow": "inflow", "outflow": "outflow", "net_flow": "net_flow"},
+        )
+    )
 
-    large_tx_query = """
+    large_tx_query = f"""
+    WITH {_unique_transfers_cte(range_filter)}
     SELECT
-        date(timestamp) AS metric_date,
+        {tx_date} AS metric_date,
         COUNT(*) AS large_tx_count,
         SUM(value_eth) AS large_tx_volume
-    FROM transactions
-    WHERE value_eth >= ?
-    GROUP BY date(timestamp);
+    FROM unique_transfers
+    WHERE value_eth >= :threshold
+    GROUP BY {tx_day};
     """
-    large_df = pd.read_sql(large_tx_query, engine, params=(large_tx_threshold,))
-    if not large_df.empty:
-        for _, row in large_df.iterrows():
-            metrics.append(
-                {
-                    "metric_date": row["metric_date"],
-                    "metric_name": "large_tx_count",
-                    "entity_type": None,
-                    "entity_label": None,
-                    "asset_symbol": "ETH",
-                    "value": row["large_tx_count"],
-                }
-            )
-            metrics.append(
-                {
-                    "metric_date": row["metric_date"],
-                    "metric_name": "large_tx_volume",
-                    "entity_type": None,
-                    "entity_label": None,
-                    "asset_symbol": "ETH",
-                    "value": row["large_tx_volume"],
-                }
-            )
+    large_df = read_sql(large_tx_query, {**params, "threshold": large_tx_threshold})
+    frames.append(
+        melt_metrics(
+            large_df.assign(entity_type=None, entity_label=None, asset_symbol="ETH"),
+            {"large_tx_count": "large_tx_count", "large_tx_volume": "large_tx_volume"},
+        )
+    )
 
-    stablecoin_query = """
+    stablecoin_query = f"""
     SELECT
-        date(t.timestamp) AS metric_date,
+        {t_date} AS metric_date,
         e.entity_type AS entity_type,
         e.label AS entity_label,
         t.token_symbol AS asset_symbol,
-        SUM(CASE WHEN LOWER(t.from_address) = :zero_address THEN t.token_value ELSE 0 END) AS minted,
-        SUM(CASE WHEN LOWER(t.to_address) = :zero_address THEN t.token_value ELSE 0 END) AS burned,
-        SUM(CASE WHEN ex_to.address IS NOT NULL THEN t.token_value ELSE 0 END) AS to_exchanges,
-        SUM(CASE WHEN ex_from.address IS NOT NULL THEN t.token_value ELSE 0 END) AS from_exchanges,
+        SUM(CASE WHEN t.from_address = :zero_address THEN t.token_value ELSE 0 END) AS minted,
+        SUM(CASE WHEN t.to_address = :zero_address THEN t.token_value ELSE 0 END) AS burned,
+        SUM(CASE WHEN ex_to.id IS NOT NULL THEN t.token_value ELSE 0 END) AS to_exchanges,
+        SUM(CASE WHEN ex_from.id IS NOT NULL THEN t.token_value ELSE 0 END) AS from_exchanges,
         COUNT(*) AS transfer_count
     FROM transactions t
     JOIN entities e
-      ON LOWER(t.wallet_address) = e.address
+      ON t.wallet_address = e.address
     LEFT JOIN entities ex_to
-      ON LOWER(t.to_address) = ex_to.address
+      ON t.to_entity_id = ex_to.id
      AND (LOWER(ex_to.entity_type) LIKE '%exchange%' OR LOWER(ex_to.entity_type) LIKE '%hot%')
     LEFT JOIN entities ex_from
-      ON LOWER(t.from_address) = ex_from.address
+      ON t.from_entity_id = ex_from.id
      AND (LOWER(ex_from.entity_type) LIKE '%exchange%' OR LOWER(ex_from.entity_type) LIKE '%hot%')
     WHERE LOWER(e.entity_type) IN ('stablecoin', 'contract', 'bridge', 'erc20')
       AND t.token_value IS NOT NULL
-    GROUP BY metric_date, e.entity_type, e.label, t.token_symbol;
+      {stable_range_filter}
+    GROUP BY {t_day}, e.entity_type, e.label, t.token_symbol;
     """
-    stable_df = pd.read_sql(stablecoin_query, engine, params={"zero_address": ZERO_ADDRESS})
+    stable_df = read_sql(stablecoin_query, {**params, "zero_address": ZERO_ADDRESS})
     if not stable_df.empty:
         stable_df = stable_df.sort_values("metric_date")
-        for _, row in stable_df.iterrows():
-            net_exchange_flow = row["to_exchanges"] - row["from_exchanges"]
-            metrics.append(
-                {
-                    "metric_date": row["metric_date"],
-                    "metric_name": "tokens_minted",
-                    "entity_type": row["entity_type"],
-                    "entity_label": row["entity_label"],
-                    "asset_symbol": row["asset_symbol"],
-                    "value": row["minted"],
-                }
-            )
-            metrics.append(
-                {
-                    "metric_date": row["metric_date"],
-                    "metric_name": "tokens_burned",
-                    "entity_type": row["entity_type"],
-                    "entity_label": row["entity_label"],
-                    "asset_symbol": row["asset_symbol"],
-                    "value": row["burned"],
-                }
-            )
-            metrics.append(
-                {
-                    "metric_date": row["metric_date"],
-                    "metric_name": "net_flow_to_exchanges",
-                    "entity_type": row["entity_type"],
-                    "entity_label": row["entity_label"],
-                    "asset_symbol": row["asset_symbol"],
-                    "value": net_exchange_flow,
-                }
-            )
-            metrics.append(
-                {
-                    "metric_date": row["metric_date"],
-                    "metric_name": "transfer_count",
-                    "entity_type": row["entity_type"],
-                    "entity_label": row["entity_label"],
-                    "asset_symbol": row["asset_symbol"],
-                    "value": row["transfer_count"],
-                }
-            )
-
-        stable_df["transfer_count"] = pd.to_numeric(stable_df["transfer_count"], errors="coerce").fillna(0)
-        stable_df["transfer_count_7d_avg"] = (
-            stable_df.groupby(["entity_label", "asset_symbol"])["transfer_count"]
-            .rolling(7, min_periods=2)
-            .mean()
-            .shift(1)
-            .reset_index(level=[0, 1], drop=True)
+        stable_df["net_flow_to_exchanges"] = stable_df["to_exchanges"] - stable_df["from_exchanges"]
+        frames.append(melt_metrics(stable_df, STABLECOIN_METRICS))
+        stable_df = add_transfer_count_delta(stable_df)
+        frames.append(
+            melt_metrics(stable_df.dropna(subset=[DELTA_METRIC]), {DELTA_METRIC: DELTA_METRIC})
         )
-        stable_df["transfer_count_7d_delta"] = (
-            stable_df["transfer_count"] - stable_df["transfer_count_7d_avg"]
-        )
-        for _, row in stable_df.dropna(subset=["transfer_count_7d_delta"]).iterrows():
-            metrics.append(
-                {
-                    "metric_date": row["metric_date"],
-                    "metric_name": "transfer_count_7d_delta",
-                    "entity_type": row["entity_type"],
-                    "entity_label": row["entity_label"],
-                    "asset_symbol": row["asset_symbol"],
-                    "value": row["transfer_count_7d_delta"],
-                }
-            )
 
-    exchange_flow_query = """
-    WITH exchange_addresses AS (
-        SELECT address, label
+    exchange_flow_query = f"""
+    WITH {_unique_transfers_cte(range_filter)},
+    exchange_entities AS (
+        SELECT id, label
         FROM entities
         WHERE LOWER(entity_type) LIKE '%exchange%' OR LOWER(entity_type) LIKE '%hot%'
     ),
     eth_flows AS (
         SELECT
-            date(t.timestamp) AS metric_date,
+            {t_date} AS metric_date,
             CASE
-                WHEN to_ex.address IS NOT NULL AND from_ex.address IS NULL THEN to_ex.label
-                WHEN from_ex.address IS NOT NULL AND to_ex.address IS NULL THEN from_ex.label
+                WHEN to_ex.id IS NOT NULL AND from_ex.id IS NULL THEN to_ex.label
+                WHEN from_ex.id IS NOT NULL AND to_ex.id IS NULL THEN from_ex.label
             END AS exchange_label,
             'ETH' AS asset_symbol,
             SUM(CASE
-                    WHEN to_ex.address IS NOT NULL AND from_ex.address IS NULL
+                    WHEN to_ex.id IS NOT NULL AND from_ex.id IS NULL
                     THEN t.value_eth ELSE 0 END) AS deposits,
             SUM(CASE
-                    WHEN from_ex.address IS NOT NULL AND to_ex.address IS NULL
+                    WHEN from_ex.id IS NOT NULL AND to_ex.id IS NULL
                     THEN t.value_eth ELSE 0 END) AS withdrawals
-        FROM transactions t
-        LEFT JOIN exchange_addresses to_ex
-          ON LOWER(t.to_address) = to_ex.address
-        LEFT JOIN exchange_addresses from_ex
-          ON LOWER(t.from_address) = from_ex.address
+        FROM unique_transfers t
+        LEFT JOIN exchange_entities to_ex
+          ON t.to_entity_id = to_ex.id
+        LEFT JOIN exchange_entities from_ex
+          ON t.from_entity_id = from_ex.id
         WHERE t.value_eth IS NOT NULL
           AND t.token_value IS NULL
           AND (
-              (to_ex.address IS NOT NULL AND from_ex.address IS NULL)
-              OR (from_ex.address IS NOT NULL AND to_ex.address IS NULL)
+              (to_ex.id IS NOT NULL AND from_ex.id IS NULL)
+              OR (from_ex.id IS NOT NULL AND to_ex.id IS NULL)
           )
-        GROUP BY metric_date, exchange_label
+        GROUP BY {t_day}, exchange_label
     ),
     token_flows AS (
         SELECT
-            date(t.timestamp) AS metric_date,
+            {t_date} AS metric_date,
             CASE
-                WHEN to_ex.address IS NOT NULL AND from_ex.address IS NULL THEN to_ex.label
-                WHEN from_ex.address IS NOT NULL AND to_ex.address IS NULL THEN from_ex.label
+                WHEN to_ex.id IS NOT NULL AND from_ex.id IS NULL THEN to_ex.label
+                WHEN from_ex.id IS NOT NULL AND to_ex.id IS NULL THEN from_ex.label
             END AS exchange_label,
             t.token_symbol AS asset_symbol,
             SUM(CASE
-                    WHEN to_ex.address IS NOT NULL AND from_ex.address IS NULL
+                    WHEN to_ex.id IS NOT NULL AND from_ex.id IS NULL
                     THEN t.token_value ELSE 0 END) AS deposits,
             SUM(CASE
-                    WHEN from_ex.address IS NOT NULL AND to_ex.address IS NULL
+                    WHEN from_ex.id IS NOT NULL AND to_ex.id IS NULL
                     THEN t.token_value ELSE 0 END) AS withdrawals
-        FROM transactions t
-        LEFT JOIN exchange_addresses to_ex
-          ON LOWER(t.to_address) = to_ex.address
-        LEFT JOIN exchange_addresses from_ex
-          ON LOWER(t.from_address) = from_ex.address
+        FROM unique_transfers t
+        LEFT JOIN exchange_entities to_ex
+          ON t.to_entity_id = to_ex.id
+        LEFT JOIN exchange_entities from_ex
+          ON t.from_entity_id = from_ex.id
         WHERE t.token_value IS NOT NULL
           AND (
-              (to_ex.address IS NOT NULL AND from_ex.address IS NULL)
-              OR (from_ex.address IS NOT NULL AND to_ex.address IS NULL)
+              (to_ex.id IS NOT NULL AND from_ex.id IS NULL)
+              OR (from_ex.id IS NOT NULL AND to_ex.id IS NULL)
           )
-        GROUP BY metric_date, exchange_label, t.token_symbol
+        GROUP BY {t_day}, exchange_label, t.token_symbol
     )
     SELECT metric_date, exchange_label, asset_symbol, deposits, withdrawals
     FROM eth_flows
@@ -261,48 +318,62 @@ def build_daily_metrics(large_tx_threshold: float = 1000.0) -> pd.DataFrame:
     SELECT metric_date, exchange_label, asset_symbol, deposits, withdrawals
     FROM token_flows;
     """
-    exchange_df = pd.read_sql(exchange_flow_query, engine)
-    if not exchange_df.empty:
-        for _, row in exchange_df.iterrows():
-            net_flow = row["deposits"] - row["withdrawals"]
-            metrics.append(
-                {
-                    "metric_date": row["metric_date"],
-                    "metric_name": "exchange_deposits",
-                    "entity_type": "exchange",
-                    "entity_label": row["exchange_label"],
-                    "asset_symbol": row["asset_symbol"],
-                    "value": row["deposits"],
-                }
-            )
-            metrics.append(
-                {
-                    "metric_date": row["metric_date"],
-                    "metric_name": "exchange_withdrawals",
-                    "entity_type": "exchange",
-                    "entity_label": row["exchange_label"],
-                    "asset_symbol": row["asset_symbol"],
-                    "value": row["withdrawals"],
-                }
-            )
-            metrics.append(
-                {
-                    "metric_date": row["metric_date"],
-                    "metric_name": "exchange_net_flow",
-                    "entity_type": "exchange",
-                    "entity_label": row["exchange_label"],
-                    "asset_symbol": row["asset_symbol"],
-                    "value": net_flow,
-                }
+    exchange_df = read_sql(exchange_flow_query, params)
+    exchange_df["net_flow"] = exchange_df["deposits"] - exchange_df["withdrawals"]
+    frames.append(
+        melt_metrics(
+            exchange_df.rename(columns={"exchange_label": "entity_label"}).assign(entity_type="exchange"),
+            EXCHANGE_METRICS,
+        )
+    )
+
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=METRIC_COLUMNS)
+    # infer_objects keeps the str dtypes the per-row dict build produced.
+    result = pd.concat(frames, ignore_index=True).infer_objects()
+    return restrict_to_partitions(result, dates)
+
+
+def write_daily_metrics(df: pd.DataFrame, dates: Optional[Sequence[str]] = None) -> None:
+    with get_engine().begin() as conn:
+        if not dates:
+            conn.exec_driver_sql("DELETE FROM daily_metrics")
+        else:
+            base_dates, delta_start, delta_end = metric_partitions(dates)
+            for start in range(0, len(base_dates), 500):
+                chunk = base_dates[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                conn.exec_driver_sql(
+                    f"DELETE FROM daily_metrics WHERE metric_date IN ({placeholders}) "
+                    "AND metric_name <> ?",
+                    (*chunk, DELTA_METRIC),
+                )
+            conn.exec_driver_sql(
+                "DELETE FROM daily_metrics WHERE metric_name = ? "
+                "AND metric_date >= ? AND metric_date < ?",
+                (DELTA_METRIC, delta_start, delta_end),
             )
+    if not df.empty:
+        bulk_insert(get_engine(), "daily_metrics", df)
 
-    return pd.DataFrame(metrics)
 
+def get_dirty_dates() -> List[str]:
+    with get_engine().connect() as conn:
+        rows = conn.exec_driver_sql(
+            "SELECT metric_date FROM daily_metrics_dirty ORDER BY metric_date"
+        ).fetchall()
+    return [row[0] for row in rows]
 
-def write_daily_metrics(df: pd.DataFrame) -> None:
-    if df.empty:
+
+def clear_dirty_dates(dates: Sequence[str]) -> None:
+    if not dates:
         return
-    df.to_sql("daily_metrics", engine, if_exists="append", index=False)
+    with get_engine().begin() as conn:
+        conn.exec_driver_sql(
+            "DELETE FROM daily_metrics_dirty WHERE metric_date = ?",
+            [(value,) for value in dates],
+        )
 
 
 def summarize_flow_metrics(df: pd.DataFrame, allowed_entity_types=None) -> pd.DataFrame:
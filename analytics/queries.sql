@@ -6,27 +6,27 @@ SELECT
       AS unique_counterparties_30d,
   AVG(value_eth) AS avg_tx_size
 FROM transactions
-WHERE timestamp >= datetime('now', '-30 days')
+WHERE block_time >= CAST(strftime('%s', 'now', '-30 days') AS INTEGER)
 GROUP BY wallet_address;
 
 -- Daily net flows by entity (requires entities table)
 SELECT
-  date(t.timestamp) AS metric_date,
+  date(t.block_time / 86400 * 86400, 'unixepoch') AS metric_date,
   e.entity_type,
   e.label AS entity_label,
-  SUM(CASE WHEN LOWER(t.to_address) = e.address THEN t.value_eth ELSE 0 END) AS inflow,
-  SUM(CASE WHEN LOWER(t.from_address) = e.address THEN t.value_eth ELSE 0 END) AS outflow,
-  SUM(CASE WHEN LOWER(t.to_address) = e.address THEN t.value_eth ELSE 0 END)
-    - SUM(CASE WHEN LOWER(t.from_address) = e.address THEN t.value_eth ELSE 0 END)
+  SUM(CASE WHEN t.to_entity_id = e.id THEN t.value_eth ELSE 0 END) AS inflow,
+  SUM(CASE WHEN t.from_entity_id = e.id THEN t.value_eth ELSE 0 END) AS outflow,
+  SUM(CASE WHEN t.to_entity_id = e.id THEN t.value_eth ELSE 0 END)
+    - SUM(CASE WHEN t.from_entity_id = e.id THEN t.value_eth ELSE 0 END)
     AS net_flow
 FROM transactions t
 JOIN entities e
-  ON LOWER(t.to_address) = e.address OR LOWER(t.from_address) = e.address
+  ON e.id IN (t.to_entity_id, t.from_entity_id)
 GROUP BY metric_date, e.entity_type, e.label;
 
 -- Large transfer counts by day
 SELECT
-  date(timestamp) AS metric_date,
+  date(block_time / 86400 * 86400, 'unixepoch') AS metric_date,
   COUNT(*) AS large_tx_count,
   SUM(value_eth) AS large_tx_volume
 FROM transactions
@@ -35,68 +35,68 @@ GROUP BY metric_date;
 
 -- Stablecoin flow metrics (requires token_value + entities table)
 SELECT
-  date(t.timestamp) AS metric_date,
+  date(t.block_time / 86400 * 86400, 'unixepoch') AS metric_date,
   e.entity_type,
   e.label AS entity_label,
   t.token_symbol AS asset_symbol,
-  SUM(CASE WHEN LOWER(t.from_address) = '0x0000000000000000000000000000000000000000' THEN t.token_value ELSE 0 END) AS tokens_minted,
-  SUM(CASE WHEN LOWER(t.to_address) = '0x0000000000000000000000000000000000000000' THEN t.token_value ELSE 0 END) AS tokens_burned,
-  SUM(CASE WHEN ex_to.address IS NOT NULL THEN t.token_value ELSE 0 END) AS to_exchanges,
-  SUM(CASE WHEN ex_from.address IS NOT NULL THEN t.token_value ELSE 0 END) AS from_exchanges,
+  SUM(CASE WHEN t.from_address = '0x0000000000000000000000000000000000000000' THEN t.token_value ELSE 0 END) AS tokens_minted,
+  SUM(CASE WHEN t.to_address = '0x0000000000000000000000000000000000000000' THEN t.token_value ELSE 0 END) AS tokens_burned,
+  SUM(CASE WHEN ex_to.id IS NOT NULL THEN t.token_value ELSE 0 END) AS to_exchanges,
+  SUM(CASE WHEN ex_from.id IS NOT NULL THEN t.token_value ELSE 0 END) AS from_exchanges,
   COUNT(*) AS transfer_count
 FROM transactions t
 JOIN entities e
-  ON LOWER(t.wallet_address) = e.address
+  ON t.wallet_address = e.address
 LEFT JOIN entities ex_to
-  ON LOWER(t.to_address) = ex_to.address
+  ON t.to_entity_id = ex_to.id
  AND (LOWER(ex_to.entity_type) LIKE '%exchange%' OR LOWER(ex_to.entity_type) LIKE '%hot%')
 LEFT JOIN entities ex_from
-  ON LOWER(t.from_address) = ex_from.address
+  ON t.from_entity_id = ex_from.id
  AND (LOWER(ex_from.entity_type) LIKE '%exchange%' OR LOWER(ex_from.entity_type) LIKE '%hot%')
 WHERE LOWER(e.entity_type) IN ('stablecoin', 'contract')
   AND t.token_value IS NOT NULL
 GROUP BY metric_date, e.entity_type, e.label, t.token_symbol;
 
 -- Exchange net flow (deposits/withdrawals; excludes exchange↔exchange)
-WITH exchange_addresses AS (
-  SELECT address
+WITH exchange_entities AS (
+  SELECT id
   FROM entities
   WHERE LOWER(entity_type) LIKE '%exchange%' OR LOWER(entity_type) LIKE '%hot%'
 ),
 eth_flows AS (
   SELECT
-    date(t.timestamp) AS metric_date,
+    date(t.block_time / 86400 * 86400, 'unixepoch') AS metric_date,
     'ETH' AS asset_symbol,
     SUM(CASE
-          WHEN to_ex.address IS NOT NULL AND from_ex.address IS NULL
+          WHEN to_ex.id IS NOT NULL AND from_ex.id IS NULL
           THEN t.value_eth ELSE 0 END) AS deposits,
     SUM(CASE
-          WHEN from_ex.address IS NOT NULL AND to_ex.address IS NULL
+          WHEN from_ex.id IS NOT NULL AND to_ex.id IS NULL
           THEN t.value_eth ELSE 0 END) AS withdrawals
   FROM transactions t
-  LEFT JOIN exchange_addresses to_ex
-    ON LOWER(t.to_address) = to_ex.address
-  LEFT JOIN exchange_addresses from_ex
-    ON LOWER(t.from_address) = from_ex.address
+  LEFT JOIN exchange_entities to_ex
+    ON t.to_entity_id = to_ex.id
+  LEFT JOIN exchange_entities from_ex
+    ON t.from_entity_id = from_ex.id
   WHERE t.value_eth IS NOT NULL
     AND t.token_value IS NULL
   GROUP BY metric_date
 ),
 token_flows AS (
   SELECT
-    date(t.timestamp) AS metric_date,
+    date(t.block_time / 86400 * 86400, 'unixepoch') AS metric_date,
     t.token_symbol AS asset_symbol,
     SUM(CASE
-          WHEN to_ex.address IS NOT NULL AND from_ex.address IS NULL
+          WHEN to_ex.id IS NOT NULL AND from_ex.id IS NULL
           THEN t.token_value ELSE 0 END) AS deposits,
     SUM(CASE
-          WHEN from_ex.address IS NOT NULL AND to_ex.address IS NULL
+          WHEN from_ex.id IS NOT NULL AND to_ex.id IS NULL
           THEN t.token_value ELSE 0 END) AS withdrawals
   FROM transactions t
-  LEFT JOIN exchange_addresses to_ex
-    ON LOWER(t.to_address) = to_ex.address
-  LEFT JOIN exchange_addresses from_ex
-    ON LOWER(t.from_address) = from_ex.address
+  LEFT JOIN exchange_entities to_ex
+    ON t.to_entity_id = to_ex.id
+  LEFT JOIN exchange_entities from_ex
+    ON t.from_entity_id = from_ex.id
   WHERE t.token_value IS NOT NULL
   GROUP BY metric_date, t.token_symbol
 )
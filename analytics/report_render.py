@@ -0,0 +1,187 @@
+import html
+import json
+from typing import Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.etl.options import REPORT_FORMATS
+
+REPORT_EXTENSIONS = {"markdown": ".md", "html": ".html", "json": ".json"}
+
+# (label, risk_metrics column, kind) for the summary bullets.
+SUMMARY_FIELDS = [
+    ("As of", "as_of_date", "date"),
+    ("Risk score", "risk_score", "raw"),
+    ("30d tx count", "tx_count_30d", "int"),
+    ("30d volume (ETH)", "volume_30d", "eth"),
+    ("30d unique counterparties", "unique_counterparties_30d", "int"),
+    ("30d new counterparties", "new_counterparties_30d", "int"),
+    ("30d contract interactions", "contract_interactions_30d", "int"),
+    ("Avg tx size (ETH)", "avg_tx_size", "eth"),
+]
+# (evidence key, heading, [(label, column, kind)]) for the evidence tables.
+SECTIONS = [
+    (
+        "counterparties",
+        "Top Counterparties (30d)",
+        [
+            ("Counterparty", "counterparty", "text"),
+            ("Tx Count", "tx_count", "int"),
+            ("Volume (ETH)", "volume_eth", "eth"),
+        ],
+    ),
+    (
+        "largest_txs",
+        "Largest Transfers (30d)",
+        [
+            ("Timestamp", "timestamp", "text"),
+            ("Direction", "direction", "text"),
+            ("Counterparty", "counterparty", "text"),
+            ("Value (ETH)", "value_eth", "eth"),
+            ("Tx Hash", "tx_hash", "text"),
+        ],
+    ),
+    (
+        "contracts",
+        "Contract Interactions (30d)",
+        [
+            ("Contract", "contract_address", "text"),
+            ("Tx Count", "tx_count", "int"),
+            ("Volume (ETH)", "volume_eth", "eth"),
+        ],
+    ),
+    (
+        "risk_events",
+        "Risk Events (latest)",
+        [
+            ("Rule", "rule_name", "text"),
+            ("Severity", "severity", "int"),
+            ("Event Time", "event_time", "text"),
+            ("Details", "details", "optional"),
+        ],
+    ),
+]
+
+
+def _format_value(value, kind: str) -> str:
+    if kind == "raw":
+        return str(value)
+    if value is None or pd.isna(value):
+        return "n/a"
+    if kind == "eth":
+        return f"{value:,.4f}"
+    if kind == "int":
+        return f"{int(value):,}"
+    return str(value) if value else "n/a"
+
+
+def _format_column(values: pd.Series, kind: str) -> List[str]:
+    # Formats a whole column at once; the tables are built column-wise, never per row.
+    values = values.astype(object).where(values.notna(), None).tolist()
+    if kind == "optional":
+        return ["" if value is None else str(value) for value in values]
+    if kind == "text":
+        return ["n/a" if value is None else str(value) for value in values]
+    return [_format_value(value, kind) for value in values]
+
+
+def _table_rows(table: pd.DataFrame, columns, separator: str, escape=None) -> List[str]:
+    cells = [_format_column(table[column], kind) for _, column, kind in columns]
+    if escape is not None:
+        cells = [list(map(escape, column)) for column in cells]
+    return list(map(separator.join, zip(*cells)))
+
+
+def _json_value(value):
+    if value is None or (not isinstance(value, (list, dict, str)) and pd.isna(value)):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _summary_lines(model: dict) -> List[Tuple[str, str]]:
+    summary = model["summary"]
+    lines = [(label, _format_value(summary.get(column, "n/a"), kind)) for label, column, kind in SUMMARY_FIELDS]
+    reasons = summary["top_reasons"]
+    return lines + [("Top reasons", ", ".join(reasons) if reasons else "none")]
+
+
+def _markdown_chunks(model: dict) -> Iterator[str]:
+    yield f"# Case Report: {model['wallet_address']}\n\nGenerated: {model['generated_at']}\n\n## Risk Summary\n"
+    if model["summary"] is None:
+        yield "- No risk metrics available for this wallet yet.\n"
+    else:
+        yield "".join(f"- {label}: {value}\n" for label, value in _summary_lines(model))
+    yield "\n## Evidence\n"
+    for key, heading, columns in SECTIONS:
+        table = model["tables"][key]
+        yield f"\n### {heading}\n"
+        if table.empty:
+            yield "- None found.\n"
+            continue
+        yield "| " + " | ".join(label for label, _, _ in columns) + " |\n"
+        yield "| " + " | ".join("---" for _ in columns) + " |\n"
+        yield "| " + " |\n| ".join(_table_rows(table, columns, " | ")) + " |\n"
+
+
+def _html_chunks(model: dict) -> Iterator[str]:
+    title = html.escape(f"Case Report: {model['wallet_address']}")
+    yield (
+        f'<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>{title}</title>\n</head>\n<body>\n'
+        f"<h1>{title}</h1>\n<p>Generated: {html.escape(model['generated_at'])}</p>\n<h2>Risk Summary</h2>\n"
+    )
+    if model["summary"] is None:
+        yield "<p>No risk metrics available for this wallet yet.</p>\n"
+    else:
+        items = "".join(
+            f"<li>{html.escape(label)}: {html.escape(value)}</li>\n" for label, value in _summary_lines(model)
+        )
+        yield f"<ul>\n{items}</ul>\n"
+    yield "<h2>Evidence</h2>\n"
+    for key, heading, columns in SECTIONS:
+        table = model["tables"][key]
+        yield f"<h3>{html.escape(heading)}</h3>\n"
+        if table.empty:
+            yield "<p>None found.</p>\n"
+            continue
+        header = "".join(f"<th>{html.escape(label)}</th>" for label, _, _ in columns)
+        rows = _table_rows(table, columns, "</td><td>", escape=html.escape)
+        yield f"<table>\n<thead><tr>{header}</tr></thead>\n<tbody>\n"
+        yield "<tr><td>" + "</td></tr>\n<tr><td>".join(rows) + "</td></tr>\n"
+        yield "</tbody>\n</table>\n"
+    yield "</body>\n</html>\n"
+
+
+def _json_chunks(model: dict) -> Iterator[str]:
+    # Raw values rather than display strings, so consumers do not re-parse numbers.
+    summary = None
+    if model["summary"] is not None:
+        summary = {column: _json_value(model["summary"].get(column)) for _, column, _ in SUMMARY_FIELDS}
+        summary["top_reasons"] = model["summary"]["top_reasons"]
+    yield (
+        f'{{"wallet_address": {json.dumps(model["wallet_address"])}, '
+        f'"generated_at": {json.dumps(model["generated_at"])}, '
+        f'"risk_summary": {json.dumps(summary)}, "evidence": {{'
+    )
+    for position, (key, _, columns) in enumerate(SECTIONS):
+        table = model["tables"][key][[column for _, column, _ in columns]]
+        separator = ", " if position else ""
+        yield f'{separator}"{key}": {table.to_json(orient="records", double_precision=15) if not table.empty else "[]"}'
+    yield "}}\n"
+
+
+RENDERERS = {"markdown": _markdown_chunks, "html": _html_chunks, "json": _json_chunks}
+
+
+def iter_report(model: dict, fmt: str = "markdown") -> Iterator[str]:
+    if fmt not in RENDERERS:
+        raise ValueError(f"Unknown report format {fmt!r}; expected one of {', '.join(REPORT_FORMATS)}.")
+    return RENDERERS[fmt](model)
+
+
+def write_report(model: dict, output_path: str, fmt: str = "markdown") -> str:
+    # Sections are written as they render, so only one table is in memory as text.
+    with open(output_path, "w", encoding="utf-8") as handle:
+        for chunk in iter_report(model, fmt):
+            handle.write(chunk)
+    return output_path
@@ -1,14 +1,18 @@
 from datetime import date
+import math
 import os
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 
 import pandas as pd
-from sqlalchemy import create_engine
-from dotenv import load_dotenv
 
-load_dotenv("src/config/.env")
-engine = create_engine(os.getenv("DB_URL"))
+from src.etl import hll
+from src.etl.bulk import bulk_insert
+from src.etl.db import get_engine
 
 PIPELINE_VERSION = "v1.1"
+# How far (as a fraction of the scored std) a feature's population mean or std
+# may move before every stored score is restandardized against the new stats.
+RISK_STATS_TOLERANCE = float(os.getenv("RISK_STATS_TOLERANCE", "0.05"))
 REASON_COLUMNS = [
     "reason_velocity",
     "reason_new_counterparties",
@@ -16,58 +20,396 @@ REASON_COLUMNS = [
 ]
 
 
-def _zscore(series: pd.Series) -> pd.Series:
-    std = series.std()
+# z-score column -> 30d feature it standardizes.
+RISK_FEATURES = {
+    "z_volume": "volume_30d",
+    "z_txs": "tx_count_30d",
+    "z_new_counterparties": "new_counterparties_30d",
+    "z_contract_interactions": "contract_interactions_30d",
+    "z_txs_24h": "tx_count_24h",
+}
+# Windows summed from the hourly buckets; 30d drives the score, the shorter
+# ones give velocity signals that react within hours.
+WINDOWS = {
+    "1h": pd.Timedelta(hours=1),
+    "24h": pd.Timedelta(hours=24),
+    "7d": pd.Timedelta(days=7),
+    "30d": pd.Timedelta(days=30),
+}
+SHORT_WINDOWS = ["1h", "24h", "7d"]
+WINDOW_COLUMNS = [f"{metric}_{window}" for window in SHORT_WINDOWS for metric in ("tx_count", "volume")]
+STATE_COLUMNS = [
+    "wallet_address",
+    "window_start",
+    "tx_count_30d",
+    "volume_30d",
+    "unique_counterparties_30d",
+    "new_counterparties_30d",
+    "contract_interactions_30d",
+    "avg_tx_size",
+    *WINDOW_COLUMNS,
+    "risk_score",
+    *REASON_COLUMNS,
+]
+
+
+def _zscore(series: pd.Series, mean=None, std=None) -> pd.Series:
+    if mean is None:
+        mean, std = series.mean(), series.std()
     if std == 0 or pd.isna(std):
         return pd.Series(0, index=series.index)
-    return (series - series.mean()) / std
+    return (series - mean) / std
 
-def get_metrics():
-    query = """
+
+def _window_starts() -> Dict[str, str]:
+    now = pd.Timestamp.now(tz="UTC").floor("h")
+    return {window: (now - span).strftime("%Y-%m-%d %H:%M:%S") for window, span in WINDOWS.items()}
+
+
+def _wallet_filter(wallets: Optional[Sequence[str]], column: str) -> str:
+    if wallets is None:
+        return ""
+    return f"AND {column} IN ({', '.join('?' for _ in wallets)})"
+
+
+def _sketch_counterparties(conn, window_start: str, wallets: Optional[Sequence[str]]) -> pd.DataFrame:
+    # Daily sketches overlapping the window are merged, so the 30d count has day resolution.
+    result = conn.exec_driver_sql(
+        f"""
+        SELECT wallet_address, precision, registers
+        FROM wallet_counterparty_sketches
+        WHERE sketch_date >= ?
+          {_wallet_filter(wallets, "wallet_address")}
+        """,
+        (window_start[:10], *(wallets or ())),
+    )
+    sketches = pd.DataFrame(result.fetchall(), columns=["wallet_address", "precision", "registers"])
+    if sketches.empty:
+        return pd.DataFrame(columns=["wallet_address", "unique_counterparties_30d"])
+    precision = int(sketches["precision"].min())
+    counts = hll.estimate(hll.explode_sketches(sketches, precision), "wallet_address", precision)
+    return counts.round().rename("unique_counterparties_30d").rename_axis("wallet_address").reset_index()
+
+
+def _fetch_frame(conn, query: str, params: Sequence) -> pd.DataFrame:
+    result = conn.exec_driver_sql(query, tuple(params))
+    return pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+
+
+def get_metrics(
+    window_starts: Optional[Dict[str, str]] = None,
+    wallets: Optional[Sequence[str]] = None,
+    counterparty_mode: str = "exact",
+    bucket_reader: Optional[Callable[[str, Sequence], pd.DataFrame]] = None,
+):
+    # Every window is a sum over the hourly buckets kept current at load time.
+    window_starts = window_starts or _window_starts()
+    activity_columns = [
+        "wallet_address",
+        "tx_count_30d",
+        "volume_30d",
+        "contract_interactions_30d",
+        "avg_tx_size",
+        *WINDOW_COLUMNS,
+    ]
+    columns = [
+        *activity_columns[:3],
+        "unique_counterparties_30d",
+        "new_counterparties_30d",
+        *activity_columns[3:],
+    ]
+    if wallets is not None and not wallets:
+        return pd.DataFrame(columns=columns)
+    window_sums = "".join(
+        f"""
+      SUM(CASE WHEN b.bucket_start >= ? THEN b.tx_count ELSE 0 END) AS tx_count_{window},
+      SUM(CASE WHEN b.bucket_start >= ? THEN b.volume_eth END) AS volume_{window},"""
+        for window in SHORT_WINDOWS
+    )
+    activity_query = f"""
     SELECT
-      wallet_address,
-      COUNT(*) AS tx_count_30d,
-      SUM(value_eth) AS volume_30d,
-      COUNT(DISTINCT CASE WHEN direction = 'out' THEN to_address ELSE from_address END)
-          AS unique_counterparties_30d,
-      SUM(CASE WHEN is_contract_interaction = 1 THEN 1 ELSE 0 END)
-          AS contract_interactions_30d,
-      AVG(value_eth) AS avg_tx_size
-    FROM transactions
+      b.wallet_address,{window_sums}
+      SUM(b.tx_count) AS tx_count_30d,
+      SUM(b.volume_eth) AS volume_30d,
+      SUM(b.contract_interactions) AS contract_interactions_30d,
+      SUM(b.volume_eth) / NULLIF(SUM(b.value_count), 0) AS avg_tx_size
+    FROM wallet_activity_buckets b
     JOIN entities
-      ON LOWER(transactions.wallet_address) = entities.address
-    WHERE timestamp >= datetime('now', '-30 days')
+      ON b.wallet_address = entities.address
+    WHERE b.bucket_start >= ?
       AND LOWER(entities.entity_type) NOT IN ('stablecoin', 'contract', 'bridge', 'erc20')
+      {_wallet_filter(wallets, "b.wallet_address")}
+    GROUP BY b.wallet_address;
+    """
+    counterparty_query = f"""
+    SELECT wallet_address, COUNT(DISTINCT counterparty) AS unique_counterparties_30d
+    FROM wallet_counterparty_buckets
+    WHERE bucket_start >= ?
+      {_wallet_filter(wallets, "wallet_address")}
+    GROUP BY wallet_address;
+    """
+    # Counterparties whose first transfer with the wallet falls in the window; the
+    # first_seen index keeps this to a range scan over recent first contacts.
+    new_counterparty_query = f"""
+    SELECT wallet_address, COUNT(*) AS new_counterparties_30d
+    FROM counterparty_first_seen
+    WHERE first_seen >= ?
+      {_wallet_filter(wallets, "wallet_address")}
     GROUP BY wallet_address;
     """
-    return pd.read_sql(query, engine)
+    window_params = [window_starts[window] for window in SHORT_WINDOWS for _ in range(2)]
+    with get_engine().connect() as conn:
+        # bucket_reader lets another engine answer the bucket queries (see duckdb_engine).
+        read_buckets = bucket_reader or (lambda query, params: _fetch_frame(conn, query, params))
+        activity = read_buckets(activity_query, (*window_params, window_starts["30d"], *(wallets or ())))
+        if counterparty_mode == "hll":
+            counterparties = _sketch_counterparties(conn, window_starts["30d"], wallets)
+        else:
+            counterparties = read_buckets(counterparty_query, (window_starts["30d"], *(wallets or ())))
+        new_counterparties = _fetch_frame(conn, new_counterparty_query, (window_starts["30d"], *(wallets or ())))
+    df = activity.merge(counterparties, on="wallet_address", how="left")
+    df = df.merge(new_counterparties, on="wallet_address", how="left")
+    for column in ("unique_counterparties_30d", "new_counterparties_30d"):
+        df[column] = df[column].fillna(0).astype("int64")
+    return df[columns]
 
-def add_risk_scores(df):
+def add_risk_scores(df, stats=None):
     df = df.copy()
 
-    df["z_volume"] = _zscore(df["volume_30d"])
-    df["z_txs"] = _zscore(df["tx_count_30d"])
-    df["z_counterparties"] = _zscore(df["unique_counterparties_30d"])
-    df["z_contract_interactions"] = _zscore(df["contract_interactions_30d"])
+    for z_column, feature in RISK_FEATURES.items():
+        if stats is None:
+            df[z_column] = _zscore(df[feature])
+        else:
+            df[z_column] = _zscore(df[feature], *_mean_std(stats.get(feature)))
 
-    df[["z_volume", "z_txs", "z_counterparties", "z_contract_interactions"]] = (
-        df[["z_volume", "z_txs", "z_counterparties", "z_contract_interactions"]].fillna(0)
-    )
+    df[list(RISK_FEATURES)] = df[list(RISK_FEATURES)].fillna(0)
     df["risk_score"] = 0.6 * df["z_volume"] + 0.4 * df["z_txs"]
 
-    df["reason_velocity"] = df["z_txs"].clip(lower=0)
-    df["reason_new_counterparties"] = df["z_counterparties"].clip(lower=0)
+    # A burst in the last 24h raises velocity before it moves the 30d count.
+    df["reason_velocity"] = df[["z_txs", "z_txs_24h"]].max(axis=1).clip(lower=0)
+    df["reason_new_counterparties"] = df["z_new_counterparties"].clip(lower=0)
     df["reason_contract_interactions"] = df["z_contract_interactions"].clip(lower=0)
     return df
 
-def build_risk_metrics():
-    metrics = get_metrics()
-    if metrics.empty:
-        return metrics
-    scored = add_risk_scores(metrics)
-    scored["as_of_date"] = date.today().isoformat()
+
+def _mean_std(stat: Optional[Tuple[int, float, float]]) -> Tuple[float, float]:
+    if not stat or stat[0] < 2:
+        return 0.0, float("nan")
+    n, mean, m2 = stat
+    # m2 / (n - 1) matches the sample std pandas uses in the batch path.
+    return mean, math.sqrt(max(m2, 0.0) / (n - 1))
+
+
+def _batch_stat(values: pd.Series) -> Tuple[int, float, float]:
+    values = pd.to_numeric(values, errors="coerce").dropna().to_numpy(dtype=float)
+    if not len(values):
+        return 0, 0.0, 0.0
+    mean = float(values.mean())
+    return len(values), mean, float(((values - mean) ** 2).sum())
+
+
+def _merge_stat(total, batch):
+    # Chan et al. parallel variant of Welford's update: fold a whole batch in at once.
+    n_a, mean_a, m2_a = total
+    n_b, mean_b, m2_b = batch
+    n = n_a + n_b
+    if n == 0:
+        return 0, 0.0, 0.0
+    delta = mean_b - mean_a
+    return n, mean_a + delta * n_b / n, m2_a + m2_b + delta * delta * n_a * n_b / n
+
+
+def _remove_stat(total, batch):
+    n, mean, m2 = total
+    n_b, mean_b, m2_b = batch
+    n_a = n - n_b
+    if n_a <= 0:
+        return 0, 0.0, 0.0
+    mean_a = (n * mean - n_b * mean_b) / n_a
+    delta = mean_b - mean_a
+    return n_a, mean_a, max(m2 - m2_b - delta * delta * n_a * n_b / n, 0.0)
+
+
+def _load_stats(conn) -> Dict[str, Tuple[int, float, float]]:
+    rows = conn.exec_driver_sql("SELECT feature, n, mean, m2 FROM risk_population_stats").fetchall()
+    return {feature: (int(n), float(mean), float(m2)) for feature, n, mean, m2 in rows}
+
+
+def _load_scored_stats(conn) -> Dict[str, Tuple[int, float, float]]:
+    # The statistics every score in wallet_risk_state was standardized against.
+    rows = conn.exec_driver_sql(
+        "SELECT feature, scored_n, scored_mean, scored_m2 FROM risk_population_stats WHERE scored_n IS NOT NULL"
+    ).fetchall()
+    return {feature: (int(n), float(mean), float(m2)) for feature, n, mean, m2 in rows}
+
+
+def _stats_drifted(stats, scored_stats) -> bool:
+    for feature in RISK_FEATURES.values():
+        if stats.get(feature) == scored_stats.get(feature):
+            continue
+        mean, std = _mean_std(stats.get(feature))
+        scored_mean, scored_std = _mean_std(scored_stats.get(feature))
+        if not (std > 0 or scored_std > 0):
+            # Without spread every z-score is 0 whatever the mean.
+            continue
+        if not (std > 0 and scored_std > 0):
+            return True
+        if abs(mean - scored_mean) > RISK_STATS_TOLERANCE * scored_std:
+            return True
+        if abs(std - scored_std) > RISK_STATS_TOLERANCE * scored_std:
+            return True
+    return False
+
+
+def _save_state(conn, scored: pd.DataFrame, stats, scored_stats, removed: Sequence[str] = ()) -> None:
+    for start in range(0, len(removed), 500):
+        chunk = removed[start:start + 500]
+        conn.exec_driver_sql(
+            f"DELETE FROM wallet_risk_state WHERE wallet_address IN ({', '.join('?' for _ in chunk)})",
+            tuple(chunk),
+        )
+    if not scored.empty:
+        records = scored[STATE_COLUMNS].astype(object).where(scored[STATE_COLUMNS].notna(), None)
+        updates = ", ".join(f"{col} = excluded.{col}" for col in STATE_COLUMNS[1:])
+        conn.exec_driver_sql(
+            f"""
+            INSERT INTO wallet_risk_state ({", ".join(STATE_COLUMNS)})
+            VALUES ({", ".join("?" for _ in STATE_COLUMNS)})
+            ON CONFLICT (wallet_address) DO UPDATE SET {updates}, updated_at = CURRENT_TIMESTAMP
+            """,
+            list(records.itertuples(index=False, name=None)),
+        )
+    conn.exec_driver_sql(
+        """
+        INSERT INTO risk_population_stats (feature, n, mean, m2, scored_n, scored_mean, scored_m2)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (feature) DO UPDATE SET
+            n = excluded.n, mean = excluded.mean, m2 = excluded.m2,
+            scored_n = excluded.scored_n, scored_mean = excluded.scored_mean, scored_m2 = excluded.scored_m2
+        """,
+        [(feature, *stat, *scored_stats.get(feature, (None, None, None))) for feature, stat in stats.items()],
+    )
+
+
+def build_risk_metrics(counterparty_mode: str = "exact", bucket_reader=None):
+    window_starts = _window_starts()
+    metrics = get_metrics(window_starts, counterparty_mode=counterparty_mode, bucket_reader=bucket_reader)
+    stats = {feature: _batch_stat(metrics[feature]) for feature in RISK_FEATURES.values()}
+    scored = add_risk_scores(metrics) if not metrics.empty else metrics
+    if not scored.empty:
+        scored["as_of_date"] = date.today().isoformat()
+        scored["window_start"] = window_starts["30d"]
+    with get_engine().begin() as conn:
+        conn.exec_driver_sql("DELETE FROM wallet_risk_state")
+        conn.exec_driver_sql("DELETE FROM risk_dirty_wallets")
+        _save_state(conn, scored, stats, stats)
+    return scored
+
+
+def _stale_wallets(conn, window_starts: Dict[str, str]) -> List[str]:
+    # Wallets with new transfers, plus wallets where any window has since
+    # dropped buckets. window_start is where the 30d window began at scoring.
+    expired = []
+    params = []
+    for window, span in WINDOWS.items():
+        offset = int((WINDOWS["30d"] - span) / pd.Timedelta(hours=1))
+        expired.append(
+            f"""
+            EXISTS (
+                SELECT 1 FROM wallet_activity_buckets b
+                WHERE b.wallet_address = s.wallet_address
+                  AND b.bucket_start >= datetime(s.window_start, '+{offset} hours')
+                  AND b.bucket_start < ?
+            )"""
+        )
+        params.append(window_starts[window])
+    rows = conn.exec_driver_sql(
+        f"""
+        SELECT wallet_address FROM risk_dirty_wallets
+        UNION
+        SELECT s.wallet_address
+        FROM wallet_risk_state s
+        WHERE s.window_start < ?
+          AND ({" OR ".join(expired)})
+        """,
+        (window_starts["30d"], *params),
+    ).fetchall()
+    return sorted(row[0] for row in rows)
+
+
+def refresh_risk_scores(counterparty_mode: str = "exact", bucket_reader=None):
+    window_starts = _window_starts()
+    with get_engine().connect() as conn:
+        stats = _load_stats(conn)
+        if not stats:
+            # Nothing to stream against yet; seed the state with a full pass.
+            return build_risk_metrics(counterparty_mode, bucket_reader)
+        scored_stats = _load_scored_stats(conn)
+        wallets = _stale_wallets(conn, window_starts)
+        chunks = [wallets[start:start + 500] for start in range(0, len(wallets), 500)]
+        previous = pd.concat(
+            [
+                pd.read_sql(
+                    "SELECT * FROM wallet_risk_state "
+                    f"WHERE wallet_address IN ({', '.join('?' for _ in chunk)})",
+                    conn,
+                    params=tuple(chunk),
+                )
+                for chunk in chunks
+            ]
+            or [pd.DataFrame(columns=STATE_COLUMNS)],
+            ignore_index=True,
+        )
+    metrics = pd.concat(
+        [get_metrics(window_starts, chunk, counterparty_mode, bucket_reader) for chunk in chunks]
+        or [get_metrics(window_starts, [], counterparty_mode, bucket_reader)],
+        ignore_index=True,
+    )
+
+    # Swap each refreshed wallet's old contribution for its new one.
+    for feature in RISK_FEATURES.values():
+        stat = stats.get(feature, (0, 0.0, 0.0))
+        stat = _remove_stat(stat, _batch_stat(previous[feature]))
+        stats[feature] = _merge_stat(stat, _batch_stat(metrics[feature]))
+
+    # Stored scores must share one set of statistics to be ranked together. Small
+    # moves score the refreshed wallets against the stored set; larger ones
+    # restandardize every wallet from its stored features.
+    others = pd.DataFrame()
+    if _stats_drifted(stats, scored_stats):
+        scored_stats = dict(stats)
+        with get_engine().connect() as conn:
+            others = pd.read_sql("SELECT * FROM wallet_risk_state", conn).drop(columns=["updated_at"])
+        others = others[~others["wallet_address"].isin(wallets)]
+        if not others.empty:
+            others = add_risk_scores(others, stats=scored_stats)
+
+    scored = add_risk_scores(metrics, stats=scored_stats) if not metrics.empty else metrics
+    if not scored.empty:
+        scored["window_start"] = window_starts["30d"]
+    scored = pd.concat([frame for frame in (scored, others) if not frame.empty] or [scored], ignore_index=True)
+    if not scored.empty:
+        scored["as_of_date"] = date.today().isoformat()
+    removed = sorted(set(previous["wallet_address"]) - set(metrics["wallet_address"]))
+    with get_engine().begin() as conn:
+        _save_state(conn, scored, stats, scored_stats, removed)
+        for chunk in chunks:
+            conn.exec_driver_sql(
+                f"DELETE FROM risk_dirty_wallets WHERE wallet_address IN ({', '.join('?' for _ in chunk)})",
+                tuple(chunk),
+            )
     return scored
 
+
+def top_risk_scores(limit: int) -> pd.DataFrame:
+    query = """
+    SELECT *
+    FROM wallet_risk_state
+    ORDER BY risk_score DESC
+    LIMIT :limit
+    """
+    return pd.read_sql(query, get_engine(), params={"limit": limit})
+
 def write_risk_metrics(df: pd.DataFrame) -> None:
     if df.empty:
         return
@@ -77,14 +419,27 @@ def write_risk_metrics(df: pd.DataFrame) -> None:
         "tx_count_30d",
         "volume_30d",
         "unique_counterparties_30d",
+        "new_counterparties_30d",
         "contract_interactions_30d",
         "avg_tx_size",
+        *WINDOW_COLUMNS,
         "risk_score",
         "reason_velocity",
         "reason_new_counterparties",
         "reason_contract_interactions",
     ]
-    df[columns].to_sql("risk_metrics", engine, if_exists="append", index=False)
+    # One row per wallet and day: a later refresh on the same day replaces it.
+    with get_engine().begin() as conn:
+        for as_of_date, wallets in df.groupby("as_of_date")["wallet_address"]:
+            wallets = list(wallets)
+            for start in range(0, len(wallets), 500):
+                chunk = wallets[start:start + 500]
+                conn.exec_driver_sql(
+                    "DELETE FROM risk_metrics WHERE as_of_date = ? "
+                    f"AND wallet_address IN ({', '.join('?' for _ in chunk)})",
+                    (as_of_date, *chunk),
+                )
+    bulk_insert(get_engine(), "risk_metrics", df[columns])
     write_audit_table(df)
 
 
@@ -111,4 +466,4 @@ def write_audit_table(df: pd.DataFrame) -> None:
         "top_reasons": df.apply(_top_reasons, axis=1),
         "pipeline_version": PIPELINE_VERSION,
     })
-    audit_df.to_sql("audit_table", engine, if_exists="append", index=False)
+    bulk_insert(get_engine(), "audit_table", audit_df)
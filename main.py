@@ -1,43 +1,201 @@
+from __future__ import annotations
+
 import argparse
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+from typing import TYPE_CHECKING, Dict, Iterator, Optional
 
-import pandas as pd
+# pandas, SQLAlchemy and the HTTP clients are imported inside the functions that
+# use them, so `--help` and argument errors return without loading them.
+from src.etl.options import (
+    COUNTERPARTY_MODES,
+    MIN_RETAIN_DAYS,
+    REPORT_FORMATS,
+    STORAGE_BACKENDS,
+)
 
-from analytics.metrics import build_daily_metrics, summarize_flow_metrics, write_daily_metrics
-from analytics.risk import build_risk_metrics, write_risk_metrics
-from analytics.case_report import generate_case_report
-from src.etl.entities import list_entities, load_entities, reset_analysis_tables
-from src.etl.enrich import add_contract_flags
-from src.etl.fetch import fetch_token_transfers, fetch_wallet_txs
-from src.etl.load import load_transactions, normalize
+if TYPE_CHECKING:
+    import pandas as pd
 
+TOKEN_ENTITY_TYPES = {"stablecoin", "contract"}
+_LOAD_LOCK = threading.Lock()
 
-def ingest_wallet(
+
+def watermark_category(entity_type: str = "") -> str:
+    return "erc20" if (entity_type or "").lower() in TOKEN_ENTITY_TYPES else "native"
+
+
+def iter_wallet_chunks(
     wallet_address: str,
     entity_type: str = "",
     max_transfers: int = 1000,
     skip_stablecoins: bool = False,
     since_days: int = 0,
-) -> pd.DataFrame:
+    from_block: int = 0,
+    max_pages: int = 0,
+) -> Iterator[pd.DataFrame]:
+    from src.etl.enrich import add_contract_flags
+    from src.etl.fetch import iter_token_transfer_pages, iter_wallet_tx_pages
+    from src.etl.load import drop_seen_transfers, normalize
+
     entity_type = (entity_type or "").lower()
-    if skip_stablecoins and entity_type in {"stablecoin", "contract"}:
-        return pd.DataFrame()
-    if entity_type in {"stablecoin", "contract"}:
-        raw = fetch_token_transfers(
+    if skip_stablecoins and entity_type in TOKEN_ENTITY_TYPES:
+        return
+    if entity_type in TOKEN_ENTITY_TYPES:
+        pages = iter_token_transfer_pages(
             wallet_address,
             max_count=max_transfers,
             since_days=since_days,
+            from_block=from_block,
+            max_pages=max_pages,
         )
     else:
-        raw = fetch_wallet_txs(
+        pages = iter_wallet_tx_pages(
             wallet_address,
             max_count=max_transfers,
             since_days=since_days,
+            from_block=from_block,
+            max_pages=max_pages,
+        )
+    for raw in pages:
+        normalized = normalize(raw, wallet_address)
+        normalized = drop_seen_transfers(normalized, wallet_address, from_block)
+        if normalized.empty:
+            continue
+        yield add_contract_flags(normalized)
+
+
+def ingest_wallet(
+    wallet_address: str,
+    entity_type: str = "",
+    max_transfers: int = 1000,
+    skip_stablecoins: bool = False,
+    since_days: int = 0,
+    incremental: bool = True,
+    max_pages: int = 0,
+    entity_ids: Optional[Dict[str, int]] = None,
+) -> int:
+    import pandas as pd
+
+    from src.etl.load import get_watermark, load_transactions, update_watermark
+
+    category = watermark_category(entity_type)
+    from_block = 0
+    if incremental:
+        from_block, _ = get_watermark(wallet_address, category)
+
+    loaded = 0
+    latest = None
+    for chunk in iter_wallet_chunks(
+        wallet_address,
+        entity_type,
+        max_transfers=max_transfers,
+        skip_stablecoins=skip_stablecoins,
+        since_days=since_days,
+        from_block=from_block,
+        max_pages=max_pages,
+    ):
+        with _LOAD_LOCK:
+            load_transactions(chunk, entity_ids)
+        loaded += len(chunk)
+        blocks = pd.to_numeric(chunk["block_number"], errors="coerce")
+        if blocks.notna().any():
+            tip = chunk.loc[[blocks.idxmax()]]
+            if latest is None or blocks.max() > latest["block_number"].iloc[0]:
+                latest = tip
+
+    # Fetchers only release blocks both directions were read through, so the
+    # highest stored block is safe to resume from once every chunk is stored.
+    if latest is not None:
+        with _LOAD_LOCK:
+            update_watermark(wallet_address, category, latest)
+    return loaded
+
+
+async def _ingest_async(
+    targets,
+    max_transfers: int,
+    skip_stablecoins: bool,
+    since_days: int,
+    incremental: bool,
+    max_pages: int,
+    max_in_flight: int,
+    entity_ids: Optional[Dict[str, int]] = None,
+) -> int:
+    import asyncio
+
+    # aiohttp is only needed for this mode, so import it on demand.
+    from src.etl.async_fetch import (
+        fetch_token_transfers_async,
+        fetch_wallet_txs_async,
+        open_session,
+    )
+    from src.etl.enrich import add_contract_flags
+    from src.etl.load import (
+        drop_seen_transfers,
+        get_watermark,
+        load_transactions,
+        normalize,
+        update_watermark,
+    )
+
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    # Parsing, enrichment and SQLite writes block, so they run in worker threads
+    # while the event loop keeps the other addresses' requests in flight.
+    def _prepare(raw, address: str, from_block: int):
+        normalized = normalize(raw, address)
+        normalized = drop_seen_transfers(normalized, address, from_block)
+        if normalized.empty:
+            return normalized
+        return add_contract_flags(normalized)
+
+    def _store(chunk, address: str, category: str) -> None:
+        with _LOAD_LOCK:
+            load_transactions(chunk, entity_ids)
+            update_watermark(address, category, chunk)
+
+    async def _ingest_one(address: str, entity_type: str) -> int:
+        entity_type = (entity_type or "").lower()
+        if skip_stablecoins and entity_type in TOKEN_ENTITY_TYPES:
+            return 0
+        category = watermark_category(entity_type)
+        from_block = 0
+        if incremental:
+            from_block, _ = await asyncio.to_thread(get_watermark, address, category)
+        fetcher = (
+            fetch_token_transfers_async
+            if entity_type in TOKEN_ENTITY_TYPES
+            else fetch_wallet_txs_async
+        )
+        raw = await fetcher(
+            session,
+            semaphore,
+            address,
+            max_count=max_transfers,
+            since_days=since_days,
+            from_block=from_block,
+            max_pages=max_pages,
+        )
+        enriched = await asyncio.to_thread(_prepare, raw, address, from_block)
+        if enriched.empty:
+            return 0
+        await asyncio.to_thread(_store, enriched, address, category)
+        return len(enriched)
+
+    async with open_session(max_in_flight) as session:
+        results = await asyncio.gather(
+            *(_ingest_one(address, entity_type) for address, entity_type, _ in targets),
+            return_exceptions=True,
         )
-    normalized = normalize(raw, wallet_address)
-    enriched = add_contract_flags(normalized)
-    return enriched
+
+    loaded = 0
+    for (address, _, label), result in zip(targets, results):
+        if isinstance(result, Exception):
+            print(f"Failed to ingest {label or address}: {result}")
+        else:
+            loaded += result
+    return loaded
 
 
 def run(
@@ -52,34 +210,107 @@ def run(
     skip_risk: bool,
     case_report: bool,
     case_report_path: str,
+    full_refresh: bool = False,
+    max_pages: int = 0,
+    async_ingest: bool = False,
+    max_in_flight: int = 16,
+    rebuild_metrics: bool = False,
+    metrics_engine: str = "sql",
+    rebuild_risk: bool = False,
+    counterparty_mode: str = "exact",
+    case_report_top: int = 0,
+    case_report_wallets: str = "",
+    case_report_dir: str = "reports",
+    case_report_format: str = "markdown",
+    storage_backend: str = "sqlite",
+    retain_days: int = 0,
 ) -> None:
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    from analytics.case_report import generate_case_report, generate_case_reports
+    from analytics.metrics import (
+        build_daily_metrics,
+        clear_dirty_dates,
+        get_dirty_dates,
+        write_daily_metrics,
+    )
+    from analytics.risk import (
+        build_risk_metrics,
+        refresh_risk_scores,
+        top_risk_scores,
+        write_risk_metrics,
+    )
+    from src.etl.contract_cache import contract_cache
+    from src.etl.enrich import forget_stored_counterparties
+    from src.etl.entities import (
+        entity_id_lookup,
+        list_entities,
+        load_entities,
+        reset_analysis_tables,
+    )
+    from src.etl.load import rebuild_counterparty_sketches
+    from src.etl.parquet_store import (
+        archive_cutoff,
+        archive_transactions,
+        export_transaction_partitions,
+        stored_transaction_dates,
+        transactions_dir,
+    )
+
     load_entities(entities_csv)
+    if full_refresh:
+        forget_stored_counterparties()
+        reset_analysis_tables()
+    entity_ids = entity_id_lookup()
 
-    collected = []
-    if wallet_address:
-        df = ingest_wallet(
+    loaded = 0
+    if async_ingest and (wallet_address or ingest_entities):
+        if wallet_address:
+            targets = [(wallet_address, "", "")]
+        else:
+            targets = [
+                (entity["address"], entity.get("entity_type", ""), entity.get("label"))
+                for entity in list_entities()
+            ]
+        loaded += asyncio.run(
+            _ingest_async(
+                targets,
+                max_transfers,
+                skip_stablecoins,
+                since_days,
+                not full_refresh,
+                max_pages,
+                max_in_flight,
+                entity_ids,
+            )
+        )
+    elif wallet_address:
+        loaded += ingest_wallet(
             wallet_address,
             max_transfers=max_transfers,
             skip_stablecoins=skip_stablecoins,
             since_days=since_days,
+            incremental=not full_refresh,
+            max_pages=max_pages,
+            entity_ids=entity_ids,
         )
-        if not df.empty:
-            collected.append(df)
     elif ingest_entities:
         entities = list_entities()
         workers = int(os.getenv("INGEST_WORKERS", "4"))
         workers = max(1, min(workers, len(entities)))
         if workers == 1:
             for entity in entities:
-                df = ingest_wallet(
+                loaded += ingest_wallet(
                     entity["address"],
                     entity.get("entity_type", ""),
                     max_transfers=max_transfers,
                     skip_stablecoins=skip_stablecoins,
                     since_days=since_days,
+                    incremental=not full_refresh,
+                    max_pages=max_pages,
+                    entity_ids=entity_ids,
                 )
-                if not df.empty:
-                    collected.append(df)
         else:
             with ThreadPoolExecutor(max_workers=workers) as executor:
                 futures = {
@@ -90,41 +321,97 @@ def run(
                         max_transfers,
                         skip_stablecoins,
                         since_days,
+                        not full_refresh,
+                        max_pages,
+                        entity_ids,
                     ): entity
                     for entity in entities
                 }
                 for future in as_completed(futures):
                     entity = futures[future]
                     try:
-                        df = future.result()
-                        if df is not None and not df.empty:
-                            collected.append(df)
+                        loaded += future.result()
                     except Exception as exc:
                         print(f"Failed to ingest {entity.get('label') or entity['address']}: {exc}")
 
-    if collected:
-        reset_analysis_tables()
-        for df in collected:
-            load_transactions(df)
-    else:
+    stats = contract_cache.stats()
+    if stats["memory_hits"] or stats["disk_hits"] or stats["misses"]:
+        print(
+            "Contract cache: {memory_hits} memory hits, {disk_hits} disk hits, "
+            "{misses} misses".format(**stats)
+        )
+
+    if not loaded:
         print("No new data fetched; keeping existing data.")
 
-    metrics = None
+    if storage_backend == "parquet":
+        # Days with new transfers are the dirty metric dates, so those partitions are rewritten.
+        full_export = full_refresh or not os.path.isdir(transactions_dir())
+        exported = export_transaction_partitions(None if full_export else get_dirty_dates())
+        if exported:
+            print(f"Exported {exported} transaction partitions to {transactions_dir()}")
+
+    build_metrics = build_daily_metrics
+    bucket_reader = None
+    if metrics_engine == "columnar":
+        from analytics.columnar_metrics import build_daily_metrics_columnar
+
+        build_metrics = build_daily_metrics_columnar
+    elif metrics_engine == "duckdb":
+        from analytics.duckdb_engine import build_daily_metrics_duckdb, risk_bucket_reader
+
+        build_metrics = build_daily_metrics_duckdb
+        bucket_reader = risk_bucket_reader() if not skip_risk else None
+
     if not skip_risk:
-        metrics = build_risk_metrics()
+        if full_refresh or rebuild_risk:
+            if rebuild_risk and counterparty_mode == "hll":
+                rebuild_counterparty_sketches()
+            metrics = build_risk_metrics(counterparty_mode, bucket_reader)
+        else:
+            metrics = refresh_risk_scores(counterparty_mode, bucket_reader)
         write_risk_metrics(metrics)
 
-    daily_metrics = build_daily_metrics(large_tx_threshold=large_tx_threshold)
-    write_daily_metrics(daily_metrics)
+    dirty_dates = get_dirty_dates()
+    rebuild_all = full_refresh or rebuild_metrics
+    archived_before = archive_cutoff() if metrics_engine != "duckdb" else None
+    if archived_before:
+        # SQLite only holds transfers from the archive cutoff on, so older days
+        # can only be rebuilt by DuckDB over the Parquet archive.
+        archived_dates = [value for value in dirty_dates if value < archived_before]
+        if archived_dates:
+            print(
+                f"Skipping {len(archived_dates)} dirty dates before the archive cutoff {archived_before}; "
+                "rebuild them with --metrics-engine duckdb."
+            )
+        if rebuild_all:
+            dirty_dates, rebuild_all = stored_transaction_dates(), False
+        dirty_dates = [value for value in dirty_dates if value >= archived_before]
+    if rebuild_all:
+        daily_metrics = build_metrics(large_tx_threshold=large_tx_threshold)
+        write_daily_metrics(daily_metrics)
+    elif dirty_dates:
+        daily_metrics = build_metrics(
+            large_tx_threshold=large_tx_threshold,
+            dates=dirty_dates,
+        )
+        write_daily_metrics(daily_metrics, dates=dirty_dates)
+    clear_dirty_dates(dirty_dates)
+
+    if retain_days:
+        cutoff, deleted, months = archive_transactions(retain_days)
+        if deleted or months:
+            print(f"Archived {deleted} transfers before {cutoff} to {transactions_dir()} ({months} months compacted)")
 
     if not skip_risk:
-        if metrics is None or metrics.empty:
+        top = top_risk_scores(top_n)
+        if top.empty:
             print("No risk metrics available yet.")
         else:
-            top = metrics.sort_values("risk_score", ascending=False).head(top_n)
             columns = [
                 "wallet_address",
                 "risk_score",
+                "tx_count_24h",
                 "tx_count_30d",
                 "volume_30d",
                 "unique_counterparties_30d",
@@ -137,9 +424,19 @@ def run(
         if not wallet_address:
             print("Case report generation requires a wallet address.")
         else:
-            output_path = generate_case_report(wallet_address, case_report_path or None)
+            output_path = generate_case_report(wallet_address, case_report_path or None, case_report_format)
             print(f"Case report saved to {output_path}")
 
+    report_wallets = []
+    if case_report_wallets:
+        with open(case_report_wallets, encoding="utf-8") as handle:
+            report_wallets.extend(line.strip() for line in handle if line.strip())
+    if case_report_top:
+        report_wallets.extend(top_risk_scores(case_report_top)["wallet_address"])
+    if report_wallets:
+        paths = generate_case_reports(report_wallets, case_report_dir, fmt=case_report_format)
+        print(f"Saved {len(paths)} case reports to {case_report_dir}")
+
     # Exchange flow output removed to keep results focused.
 
 def main() -> None:
@@ -166,7 +463,13 @@ def main() -> None:
         "--max-transfers",
         type=int,
         default=1000,
-        help="Max transfers per address (Alchemy/Etherscan).",
+        help="Transfers per page requested from Alchemy/Etherscan.",
+    )
+    parser.add_argument(
+        "--max-pages",
+        type=int,
+        default=0,
+        help="Stop after N pages per address (0 follows every page).",
     )
     parser.add_argument(
         "--skip-stablecoins",
@@ -192,12 +495,93 @@ def main() -> None:
     parser.add_argument(
         "--case-report-path",
         default="",
-        help="Optional output path for the case report markdown.",
+        help="Optional output path for the case report.",
+    )
+    parser.add_argument(
+        "--case-report-top",
+        type=int,
+        default=0,
+        help="Generate case reports for the N highest risk scores.",
+    )
+    parser.add_argument(
+        "--case-report-wallets",
+        default="",
+        help="File with one wallet address per line to generate case reports for.",
+    )
+    parser.add_argument(
+        "--case-report-dir",
+        default="reports",
+        help="Output directory for --case-report-top / --case-report-wallets reports.",
+    )
+    parser.add_argument(
+        "--case-report-format",
+        choices=REPORT_FORMATS,
+        default="markdown",
+        help="Write case reports as markdown, HTML or JSON.",
+    )
+    parser.add_argument(
+        "--full-refresh",
+        action="store_true",
+        help="Ignore ingest watermarks and reload every address from block 0.",
+    )
+    parser.add_argument(
+        "--async-ingest",
+        action="store_true",
+        help="Fetch all addresses concurrently with asyncio (requires aiohttp).",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=int(os.getenv("INGEST_MAX_IN_FLIGHT", "16")),
+        help="Max concurrent HTTP requests in --async-ingest mode.",
+    )
+    parser.add_argument(
+        "--rebuild-metrics",
+        action="store_true",
+        help="Recompute daily metrics for every date instead of only dates with new transfers.",
+    )
+    parser.add_argument(
+        "--metrics-engine",
+        choices=["sql", "columnar", "duckdb"],
+        default=os.getenv("METRICS_ENGINE", "sql"),
+        help=(
+            "Compute daily metrics with per-family SQL queries, a single chunked pandas pass, "
+            "or DuckDB over the Parquet partitions (requires --storage-backend parquet)."
+        ),
+    )
+    parser.add_argument(
+        "--storage-backend",
+        choices=STORAGE_BACKENDS,
+        default=os.getenv("STORAGE_BACKEND", "sqlite"),
+        help="Also persist transactions as date-partitioned Parquet files under PARQUET_DIR.",
+    )
+    parser.add_argument(
+        "--retain-days",
+        type=int,
+        default=int(os.getenv("TRANSACTION_RETAIN_DAYS", "0")),
+        help="Move transfers older than N days (whole months) from SQLite to the Parquet archive.",
+    )
+    parser.add_argument(
+        "--rebuild-risk",
+        action="store_true",
+        help="Rescore every wallet from scratch instead of only wallets whose 30d window changed.",
+    )
+    parser.add_argument(
+        "--counterparty-mode",
+        choices=COUNTERPARTY_MODES,
+        default=os.getenv("RISK_COUNTERPARTY_MODE", "exact"),
+        help="Count unique counterparties exactly or estimate them from HyperLogLog sketches.",
     )
     args = parser.parse_args()
 
     if not args.wallet_address and not args.ingest_entities:
         parser.error("Provide a wallet address or use --ingest-entities.")
+    if args.metrics_engine == "duckdb" and args.storage_backend != "parquet":
+        parser.error("--metrics-engine duckdb reads the Parquet partitions; add --storage-backend parquet.")
+    if args.retain_days and args.storage_backend != "parquet":
+        parser.error("--retain-days archives transfers to Parquet; add --storage-backend parquet.")
+    if args.retain_days and args.retain_days < MIN_RETAIN_DAYS:
+        parser.error(f"--retain-days must be at least {MIN_RETAIN_DAYS} (risk scores read 30 days).")
 
     run(
         args.wallet_address,
@@ -211,6 +595,20 @@ def main() -> None:
         args.skip_risk,
         args.case_report,
         args.case_report_path,
+        args.full_refresh,
+        args.max_pages,
+        args.async_ingest,
+        args.max_in_flight,
+        args.rebuild_metrics,
+        args.metrics_engine,
+        args.rebuild_risk,
+        args.counterparty_mode,
+        args.case_report_top,
+        args.case_report_wallets,
+        args.case_report_dir,
+        args.case_report_format,
+        args.storage_backend,
+        args.retain_days,
     )
 
 
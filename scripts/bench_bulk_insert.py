@@ -0,0 +1,76 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.etl.bulk import bulk_insert
+from src.etl.db import create_db_engine
+from src.etl.load import TRANSFER_KEY, epoch_seconds
+
+SCHEMA = "src/etl/schema.sql"
+
+
+def synthetic_transactions(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    timestamps = pd.to_datetime(1_700_000_000 + np.arange(rows), unit="s", utc=True)
+    return pd.DataFrame({
+        "tx_hash": [f"0x{i:064x}" for i in range(rows)],
+        "wallet_address": "0x" + "ab" * 20,
+        "direction": np.where(np.arange(rows) % 2, "in", "out"),
+        "from_address": [f"0x{i % 5000:040x}" for i in range(rows)],
+        "to_address": "0x" + "cd" * 20,
+        "value_eth": rng.exponential(2.0, rows),
+        "block_number": 17_000_000 + np.arange(rows),
+        "timestamp": timestamps,
+        "block_time": epoch_seconds(timestamps),
+        "token_symbol": None,
+        "token_value": np.nan,
+        "is_contract_interaction": pd.Series([True, False, None] * (rows // 3) + [None] * (rows % 3), dtype=object),
+        "category": "external",
+        "log_index": 0,
+    })
+
+
+def _fresh_engine(directory: str, name: str):
+    path = os.path.join(directory, f"{name}.db")
+    with sqlite3.connect(path) as conn, open(SCHEMA, encoding="utf-8") as handle:
+        conn.executescript(handle.read())
+    return create_db_engine(f"sqlite:///{path}")
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare DataFrame.to_sql with bulk_insert on SQLite.")
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    df = synthetic_transactions(args.rows)
+    with tempfile.TemporaryDirectory() as directory:
+        engine = _fresh_engine(directory, "to_sql")
+        # The write path load_transactions used before src/etl/bulk.py.
+        to_sql_secs = _timed(lambda: df.to_sql(
+            "transactions", engine, if_exists="append", index=False, chunksize=1000, method="multi"
+        ))
+        engine.dispose()
+
+        engine = _fresh_engine(directory, "bulk")
+        bulk_secs = _timed(lambda: bulk_insert(
+            engine, "transactions", df, conflict_columns=TRANSFER_KEY
+        ))
+        engine.dispose()
+
+    print(f"to_sql(method='multi'): {to_sql_secs:.2f}s ({args.rows / to_sql_secs:,.0f} rows/s)")
+    print(f"bulk_insert:            {bulk_secs:.2f}s ({args.rows / bulk_secs:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
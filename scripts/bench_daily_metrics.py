@@ -0,0 +1,120 @@
+import argparse
+import multiprocessing
+import os
+import resource
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from analytics.columnar_metrics import build_daily_metrics_columnar
+from analytics.metrics import METRIC_COLUMNS, build_daily_metrics
+from src.etl.bulk import bulk_insert
+from src.etl.db import get_engine
+from src.etl.entities import add_entity_ids, entity_id_lookup
+from src.etl.load import SECONDS_PER_DAY, TRANSFER_KEY
+
+SCHEMA = "src/etl/schema.sql"
+ENTITY_TYPES = ["exchange"] * 20 + ["hot wallet"] * 5 + ["stablecoin"] * 5 + ["contract"] * 5 + ["fund"] * 15
+START_TIME = 1_735_689_600  # 2025-01-01 00:00 UTC
+
+
+def synthetic_transactions(rows: int, entities: np.ndarray, seed: int = 0) -> pd.DataFrame:
+    # Transfers between labelled entities and 20k unlabelled wallets over one year;
+    # 30% are ERC-20 rows on stablecoin/contract wallets and 20% are copies stored
+    # under the counterparty wallet, as a two-sided ingest would produce.
+    rng = np.random.default_rng(seed)
+    wallets = np.concatenate([entities, [f"0x{i:040x}" for i in range(1000, 21000)]])
+    originals = int(rows / 1.2)
+
+    def pick(count):
+        labelled = rng.random(count) < 0.4
+        return np.where(labelled, wallets[rng.integers(0, len(entities), count)],
+                        wallets[rng.integers(len(entities), len(wallets), count)])
+
+    from_address, to_address = pick(originals), pick(originals)
+    is_token = rng.random(originals) < 0.3
+    value = rng.exponential(50.0, originals)
+    block_time = START_TIME + rng.integers(0, 365 * SECONDS_PER_DAY, originals)
+    df = pd.DataFrame({
+        "tx_hash": [f"0x{i:064x}" for i in range(originals)],
+        "wallet_address": np.where(is_token, entities[rng.integers(25, 35, originals)], from_address),
+        "direction": np.where(is_token, None, "out"),
+        "from_address": from_address,
+        "to_address": to_address,
+        "value_eth": np.where(is_token, np.nan, value),
+        "timestamp": pd.to_datetime(block_time, unit="s", utc=True),
+        "block_time": block_time,
+        "token_symbol": np.where(is_token, rng.choice(["USDC", "USDT"], originals), None),
+        "token_value": np.where(is_token, value, np.nan),
+        "category": np.where(is_token, "erc20", "external"),
+        "log_index": 0,
+    })
+    copies = df.sample(rows - originals, random_state=seed)
+    copies = copies.assign(
+        wallet_address=copies["to_address"],
+        direction=np.where(copies["direction"].isna(), None, "in"),
+    )
+    return pd.concat([df, copies], ignore_index=True).drop_duplicates(TRANSFER_KEY)
+
+
+def build_database(path: str, rows: int) -> None:
+    with sqlite3.connect(path) as conn, open(SCHEMA, encoding="utf-8") as handle:
+        conn.executescript(handle.read())
+    addresses = np.array([f"0x{i:040x}" for i in range(len(ENTITY_TYPES))])
+    entities = pd.DataFrame({
+        "address": addresses,
+        "label": [f"entity {i}" for i in range(len(ENTITY_TYPES))],
+        "entity_type": ENTITY_TYPES,
+    })
+    bulk_insert(get_engine(), "entities", entities)
+    df = add_entity_ids(synthetic_transactions(rows, addresses), entity_id_lookup())
+    bulk_insert(get_engine(), "transactions", df)
+    print(f"generated {len(df):,} transactions")
+
+
+def _peak_rss_mb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the sql and columnar daily metrics engines.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--db-url", help="Benchmark an existing database instead of a generated one.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.db_url:
+            os.environ["DB_URL"] = args.db_url
+        else:
+            path = os.path.join(directory, "metrics.db")
+            os.environ["DB_URL"] = f"sqlite:///{path}"
+            # Generated in a child process so its memory does not count towards the peaks below.
+            generator = multiprocessing.Process(target=build_database, args=(path, args.rows))
+            generator.start()
+            generator.join()
+
+        # ru_maxrss only grows, so the lighter sql engine runs first and each
+        # reading is the peak up to that point.
+        baseline = _peak_rss_mb()
+        results = {}
+        for name, build in (("sql", build_daily_metrics), ("columnar", build_daily_metrics_columnar)):
+            start = time.perf_counter()
+            results[name] = build()
+            print(f"{name:>8}: {time.perf_counter() - start:.1f}s, {len(results[name]):,} metric rows, "
+                  f"peak RSS {_peak_rss_mb()} MB (baseline {baseline} MB)")
+        get_engine().dispose()
+
+    keys = [column for column in METRIC_COLUMNS if column != "value"]
+    sql, columnar = (
+        results[name][METRIC_COLUMNS].sort_values(keys, na_position="first").reset_index(drop=True)
+        for name in ("sql", "columnar")
+    )
+    pd.testing.assert_frame_equal(sql, columnar, check_dtype=False)
+    print("outputs match")
+
+
+if __name__ == "__main__":
+    main()
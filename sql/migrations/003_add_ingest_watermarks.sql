@@ -0,0 +1,8 @@
+CREATE TABLE IF NOT EXISTS ingest_watermarks (
+    address TEXT NOT NULL,
+    category TEXT NOT NULL,
+    last_block INTEGER,
+    last_tx_hash TEXT,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (address, category)
+);
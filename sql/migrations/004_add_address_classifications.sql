@@ -0,0 +1,5 @@
+CREATE TABLE IF NOT EXISTS address_classifications (
+    address TEXT PRIMARY KEY,
+    is_contract BOOLEAN NOT NULL,
+    checked_at INTEGER NOT NULL
+);
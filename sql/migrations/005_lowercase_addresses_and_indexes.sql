@@ -0,0 +1,14 @@
+UPDATE transactions
+SET wallet_address = LOWER(wallet_address),
+    from_address = LOWER(from_address),
+    to_address = LOWER(to_address);
+UPDATE risk_metrics SET wallet_address = LOWER(wallet_address);
+UPDATE risk_events SET wallet_address = LOWER(wallet_address);
+UPDATE audit_table SET wallet_address = LOWER(wallet_address);
+
+CREATE INDEX IF NOT EXISTS idx_transactions_wallet_timestamp ON transactions (wallet_address, timestamp);
+CREATE INDEX IF NOT EXISTS idx_transactions_from_address ON transactions (from_address);
+CREATE INDEX IF NOT EXISTS idx_transactions_to_address ON transactions (to_address);
+CREATE INDEX IF NOT EXISTS idx_transactions_tx_hash ON transactions (tx_hash);
+CREATE INDEX IF NOT EXISTS idx_risk_metrics_wallet_date ON risk_metrics (wallet_address, as_of_date);
+CREATE INDEX IF NOT EXISTS idx_risk_events_wallet_time ON risk_events (wallet_address, event_time);
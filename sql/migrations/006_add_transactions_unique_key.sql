@@ -0,0 +1,16 @@
+-- Rows loaded before this migration cannot be given their real key: internal
+-- transfers were stored without a category and ERC-20 rows carry no log index.
+-- Refetched copies would be keyed from the provider's uniqueId and land beside
+-- them as duplicates, so the legacy rows and everything derived from them are
+-- cleared instead. Watermarks go too, and the next run reloads every address
+-- from block 0, which is the same work a --full-refresh does.
+ALTER TABLE transactions ADD COLUMN category TEXT NOT NULL DEFAULT 'external';
+ALTER TABLE transactions ADD COLUMN log_index INTEGER NOT NULL DEFAULT 0;
+
+DELETE FROM risk_metrics;
+DELETE FROM daily_metrics;
+DELETE FROM transactions;
+DELETE FROM ingest_watermarks;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_transactions_transfer
+    ON transactions (tx_hash, category, log_index, wallet_address);
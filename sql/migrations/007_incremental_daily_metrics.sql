@@ -0,0 +1,24 @@
+DELETE FROM daily_metrics
+WHERE id NOT IN (
+    SELECT MAX(id)
+    FROM daily_metrics
+    GROUP BY metric_date, metric_name, entity_type, entity_label, asset_symbol
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_daily_metrics_partition ON daily_metrics (
+    metric_date,
+    metric_name,
+    COALESCE(entity_type, ''),
+    COALESCE(entity_label, ''),
+    COALESCE(asset_symbol, '')
+);
+
+CREATE TABLE IF NOT EXISTS daily_metrics_dirty (
+    metric_date TEXT PRIMARY KEY
+);
+
+-- Existing history has not been tracked yet; rebuild it once.
+INSERT INTO daily_metrics_dirty (metric_date)
+SELECT DISTINCT date(timestamp) FROM transactions
+WHERE timestamp IS NOT NULL
+ON CONFLICT (metric_date) DO NOTHING;
@@ -0,0 +1,6 @@
+ALTER TABLE transactions ADD COLUMN from_entity_id INTEGER;
+ALTER TABLE transactions ADD COLUMN to_entity_id INTEGER;
+
+UPDATE transactions
+SET from_entity_id = (SELECT id FROM entities WHERE entities.address = transactions.from_address),
+    to_entity_id = (SELECT id FROM entities WHERE entities.address = transactions.to_address);
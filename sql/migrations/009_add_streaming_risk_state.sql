@@ -0,0 +1,71 @@
+CREATE TABLE IF NOT EXISTS wallet_activity_buckets (
+    wallet_address TEXT NOT NULL,
+    bucket_start TEXT NOT NULL,
+    tx_count INTEGER NOT NULL,
+    volume_eth REAL,
+    value_count INTEGER NOT NULL,
+    contract_interactions INTEGER NOT NULL,
+    PRIMARY KEY (wallet_address, bucket_start)
+);
+
+CREATE INDEX IF NOT EXISTS idx_wallet_activity_buckets_start ON wallet_activity_buckets (bucket_start);
+
+CREATE TABLE IF NOT EXISTS wallet_counterparty_buckets (
+    wallet_address TEXT NOT NULL,
+    bucket_start TEXT NOT NULL,
+    counterparty TEXT NOT NULL,
+    PRIMARY KEY (wallet_address, bucket_start, counterparty)
+);
+
+CREATE TABLE IF NOT EXISTS wallet_risk_state (
+    wallet_address TEXT PRIMARY KEY,
+    window_start TEXT NOT NULL,
+    tx_count_30d INTEGER,
+    volume_30d REAL,
+    unique_counterparties_30d INTEGER,
+    contract_interactions_30d INTEGER,
+    avg_tx_size REAL,
+    risk_score REAL,
+    reason_velocity REAL,
+    reason_new_counterparties REAL,
+    reason_contract_interactions REAL,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_wallet_risk_state_score ON wallet_risk_state (risk_score);
+
+CREATE TABLE IF NOT EXISTS risk_population_stats (
+    feature TEXT PRIMARY KEY,
+    n INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    m2 REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS risk_dirty_wallets (
+    wallet_address TEXT PRIMARY KEY
+);
+
+-- Seed the hourly store from existing history; risk state is rebuilt on the next run.
+INSERT INTO wallet_activity_buckets (
+    wallet_address, bucket_start, tx_count, volume_eth, value_count, contract_interactions
+)
+SELECT
+    wallet_address,
+    substr(timestamp, 1, 13) || ':00:00',
+    COUNT(*),
+    SUM(value_eth),
+    COUNT(value_eth),
+    SUM(CASE WHEN is_contract_interaction = 1 THEN 1 ELSE 0 END)
+FROM transactions
+WHERE wallet_address IS NOT NULL AND timestamp IS NOT NULL
+GROUP BY wallet_address, substr(timestamp, 1, 13);
+
+INSERT INTO wallet_counterparty_buckets (wallet_address, bucket_start, counterparty)
+SELECT DISTINCT
+    wallet_address,
+    substr(timestamp, 1, 13) || ':00:00',
+    CASE WHEN direction = 'out' THEN to_address ELSE from_address END
+FROM transactions
+WHERE wallet_address IS NOT NULL
+  AND timestamp IS NOT NULL
+  AND CASE WHEN direction = 'out' THEN to_address ELSE from_address END IS NOT NULL;
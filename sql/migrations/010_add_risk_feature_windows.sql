@@ -0,0 +1,17 @@
+ALTER TABLE risk_metrics ADD COLUMN tx_count_1h INTEGER;
+ALTER TABLE risk_metrics ADD COLUMN volume_1h REAL;
+ALTER TABLE risk_metrics ADD COLUMN tx_count_24h INTEGER;
+ALTER TABLE risk_metrics ADD COLUMN volume_24h REAL;
+ALTER TABLE risk_metrics ADD COLUMN tx_count_7d INTEGER;
+ALTER TABLE risk_metrics ADD COLUMN volume_7d REAL;
+
+ALTER TABLE wallet_risk_state ADD COLUMN tx_count_1h INTEGER;
+ALTER TABLE wallet_risk_state ADD COLUMN volume_1h REAL;
+ALTER TABLE wallet_risk_state ADD COLUMN tx_count_24h INTEGER;
+ALTER TABLE wallet_risk_state ADD COLUMN volume_24h REAL;
+ALTER TABLE wallet_risk_state ADD COLUMN tx_count_7d INTEGER;
+ALTER TABLE wallet_risk_state ADD COLUMN volume_7d REAL;
+
+-- The velocity reason now also uses 24h counts; rescore everything on the next run.
+DELETE FROM wallet_risk_state;
+DELETE FROM risk_population_stats;
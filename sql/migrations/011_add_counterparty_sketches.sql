@@ -0,0 +1,10 @@
+CREATE TABLE IF NOT EXISTS wallet_counterparty_sketches (
+    wallet_address TEXT NOT NULL,
+    sketch_date TEXT NOT NULL,
+    precision INTEGER NOT NULL,
+    registers BLOB NOT NULL,
+    PRIMARY KEY (wallet_address, sketch_date)
+);
+
+-- Sketches are built in Python; backfill existing history with
+-- `python main.py ... --rebuild-risk --counterparty-mode hll`.
@@ -0,0 +1,26 @@
+CREATE TABLE IF NOT EXISTS counterparty_first_seen (
+    wallet_address TEXT NOT NULL,
+    counterparty TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    PRIMARY KEY (wallet_address, counterparty)
+);
+
+CREATE INDEX IF NOT EXISTS idx_counterparty_first_seen_time ON counterparty_first_seen (first_seen);
+
+INSERT INTO counterparty_first_seen (wallet_address, counterparty, first_seen)
+SELECT
+    wallet_address,
+    CASE WHEN direction = 'out' THEN to_address ELSE from_address END AS counterparty,
+    MIN(timestamp)
+FROM transactions
+WHERE wallet_address IS NOT NULL
+  AND timestamp IS NOT NULL
+  AND CASE WHEN direction = 'out' THEN to_address ELSE from_address END IS NOT NULL
+GROUP BY wallet_address, counterparty;
+
+ALTER TABLE risk_metrics ADD COLUMN new_counterparties_30d INTEGER;
+ALTER TABLE wallet_risk_state ADD COLUMN new_counterparties_30d INTEGER;
+
+-- reason_new_counterparties now scores new counterparties; rescore everything on the next run.
+DELETE FROM wallet_risk_state;
+DELETE FROM risk_population_stats;
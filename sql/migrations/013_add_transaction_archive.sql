@@ -0,0 +1,9 @@
+-- Day/month range scans (Parquet export, retention deletes) use an index instead of a full scan.
+CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions (timestamp);
+
+-- Transfers before archived_before live only in the Parquet archive (see --retain-days).
+CREATE TABLE IF NOT EXISTS archive_watermarks (
+    table_name TEXT PRIMARY KEY,
+    archived_before TEXT NOT NULL,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,16 @@
+-- Block time as integer epoch seconds: range filters compare integers on an index
+-- and a UTC day is block_time / 86400. timestamp stays as the display text.
+ALTER TABLE transactions ADD COLUMN block_time INTEGER;
+UPDATE transactions SET block_time = CAST(strftime('%s', timestamp) AS INTEGER) WHERE timestamp IS NOT NULL;
+
+-- Exact amounts as decimal text (an INTEGER column overflows past ~9.2 ETH in wei).
+-- Existing rows only have the REAL columns, so these stay NULL until the transfers
+-- are reloaded with --full-refresh.
+ALTER TABLE transactions ADD COLUMN value_wei TEXT;
+ALTER TABLE transactions ADD COLUMN token_value_raw TEXT;
+ALTER TABLE transactions ADD COLUMN token_decimals INTEGER;
+
+DROP INDEX IF EXISTS idx_transactions_wallet_timestamp;
+DROP INDEX IF EXISTS idx_transactions_timestamp;
+CREATE INDEX IF NOT EXISTS idx_transactions_wallet_block_time ON transactions (wallet_address, block_time);
+CREATE INDEX IF NOT EXISTS idx_transactions_block_time ON transactions (block_time);
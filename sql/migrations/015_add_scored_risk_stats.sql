@@ -0,0 +1,5 @@
+-- The statistics stored scores were standardized against. NULL until the next
+-- run, which restandardizes every wallet and records them.
+ALTER TABLE risk_population_stats ADD COLUMN scored_n INTEGER;
+ALTER TABLE risk_population_stats ADD COLUMN scored_mean REAL;
+ALTER TABLE risk_population_stats ADD COLUMN scored_m2 REAL;
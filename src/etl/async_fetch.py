@@ -0,0 +1,161 @@
+import asyncio
+from typing import List, Optional, Tuple
+
+import aiohttp
+import pandas as pd
+
+from src.etl import ratelimit
+from src.etl.fetch import (
+    ALCHEMY_URL,
+    ETHERSCAN_API_KEY,
+    _concat_pages,
+    _drop_self_transfers,
+    _filter_since_days,
+    _iter_wallet_txs_etherscan,
+    _reached_block,
+    _through_block,
+    _transfers_frame,
+)
+
+
+def open_session(max_in_flight: int) -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(limit=max_in_flight)
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=20),
+    )
+
+
+async def _alchemy_request(session, semaphore, params):
+    payload = {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "alchemy_getAssetTransfers",
+        "params": [params],
+    }
+    data = await ratelimit.post_json_async(
+        session,
+        "alchemy",
+        ALCHEMY_URL,
+        payload,
+        cost=ratelimit.compute_units(payload["method"]),
+        semaphore=semaphore,
+    )
+    if "error" in data:
+        raise RuntimeError(f"Alchemy error: {data['error']}")
+    return data.get("result", {})
+
+
+async def _alchemy_transfers(
+    session,
+    semaphore,
+    address: str,
+    direction_key: Optional[str],
+    categories,
+    contract_addresses=None,
+    max_count: int = 1000,
+    from_block: int = 0,
+    max_pages: int = 0,
+) -> Tuple[pd.DataFrame, bool]:
+    # Also returns whether max_pages stopped the stream with pages left.
+    if not ALCHEMY_URL:
+        raise RuntimeError("ALCHEMY_URL is not set in your environment.")
+
+    params = {
+        "fromBlock": hex(from_block),
+        "toBlock": "latest",
+        "category": categories,
+        "withMetadata": True,
+        "excludeZeroValue": False,
+        "maxCount": hex(max_count),
+    }
+    if direction_key:
+        params[direction_key] = address
+    if contract_addresses:
+        params["contractAddresses"] = contract_addresses
+
+    frames: List[pd.DataFrame] = []
+    pages = 0
+    while True:
+        result = await _alchemy_request(session, semaphore, params)
+        frames.append(_transfers_frame(result.get("transfers", [])))
+        pages += 1
+        page_key = result.get("pageKey")
+        if not page_key or (max_pages and pages >= max_pages):
+            break
+        params = dict(params, pageKey=page_key)
+    return _concat_pages(iter(frames)), bool(page_key)
+
+
+async def fetch_wallet_txs_async(
+    session,
+    semaphore,
+    address: str,
+    max_count: int = 1000,
+    since_days: int = 0,
+    from_block: int = 0,
+    max_pages: int = 0,
+) -> pd.DataFrame:
+    categories = ["external", "internal"]
+    kwargs = {"max_count": max_count, "from_block": from_block, "max_pages": max_pages}
+    try:
+        (outbound, outbound_more), (inbound, inbound_more) = await asyncio.gather(
+            _alchemy_transfers(session, semaphore, address, "fromAddress", categories, **kwargs),
+            _alchemy_transfers(session, semaphore, address, "toAddress", categories, **kwargs),
+        )
+    except aiohttp.ClientResponseError as exc:
+        if exc.status < 500 or not ETHERSCAN_API_KEY:
+            raise
+        return await asyncio.to_thread(
+            _fetch_wallet_txs_etherscan, address, max_count, since_days, from_block, max_pages
+        )
+    except aiohttp.ClientError:
+        if not ETHERSCAN_API_KEY:
+            raise
+        return await asyncio.to_thread(
+            _fetch_wallet_txs_etherscan, address, max_count, since_days, from_block, max_pages
+        )
+
+    # Same rows as the sync path: distinct transfers sharing a tx hash are kept,
+    # and nothing past the block where a truncated direction stopped.
+    inbound = _drop_self_transfers(inbound, address)
+    through = min(_reached_block(outbound, outbound_more), _reached_block(inbound, inbound_more))
+    df = _concat_pages(iter([_through_block(outbound, through), _through_block(inbound, through)]))
+    return _filter_since_days(df, since_days)
+
+
+def _fetch_wallet_txs_etherscan(address, max_count, since_days, from_block, max_pages):
+    return _concat_pages(
+        _iter_wallet_txs_etherscan(
+            address,
+            max_count=max_count,
+            since_days=since_days,
+            from_block=from_block,
+            max_pages=max_pages,
+        )
+    )
+
+
+async def fetch_token_transfers_async(
+    session,
+    semaphore,
+    contract_address: str,
+    max_count: int = 1000,
+    since_days: int = 0,
+    from_block: int = 0,
+    max_pages: int = 0,
+) -> pd.DataFrame:
+    df, _ = await _alchemy_transfers(
+        session,
+        semaphore,
+        contract_address,
+        direction_key=None,
+        categories=["erc20"],
+        contract_addresses=[contract_address],
+        max_count=max_count,
+        from_block=from_block,
+        max_pages=max_pages,
+    )
+    if df.empty:
+        return df
+    return _filter_since_days(df, since_days)
@@ -0,0 +1,81 @@
+import csv
+import io
+from typing import List, Optional, Sequence
+
+import pandas as pd
+
+def _to_records(df: pd.DataFrame) -> List[tuple]:
+    out = df.copy()
+    for col in out.columns:
+        if pd.api.types.is_datetime64_any_dtype(out[col]):
+            values = out[col]
+            if values.dt.tz is not None:
+                values = values.dt.tz_convert("UTC").dt.tz_localize(None)
+            # Same text layout pandas.to_sql used, so string range filters keep working.
+            out[col] = values.dt.strftime("%Y-%m-%d %H:%M:%S.%f")
+    out = out.astype(object).where(out.notna(), None)
+    return list(out.itertuples(index=False, name=None))
+
+
+def _conflict_clause(conflict_columns: Optional[Sequence[str]]) -> str:
+    if not conflict_columns:
+        return ""
+    return f" ON CONFLICT ({', '.join(conflict_columns)}) DO NOTHING"
+
+
+def _insert_many(engine, table: str, columns: List[str], records: List[tuple], conflict: str) -> None:
+    placeholder = "?" if engine.dialect.paramstyle == "qmark" else "%s"
+    statement = (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(placeholder for _ in columns)}){conflict}"
+    )
+    # SQLite connections already run with synchronous=NORMAL (see src/etl/db.py).
+    with engine.begin() as conn:
+        conn.exec_driver_sql(statement, records)
+
+
+def _copy_postgres(engine, table: str, columns: List[str], records: List[tuple], conflict: str) -> bool:
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        if not hasattr(cursor, "copy_expert"):
+            return False
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(records)
+        buffer.seek(0)
+        column_list = ", ".join(columns)
+        if conflict:
+            # COPY has no ON CONFLICT, so stage the rows and merge them in one statement.
+            cursor.execute(
+                f"CREATE TEMP TABLE _bulk_{table} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+            cursor.copy_expert(f"COPY _bulk_{table} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+            cursor.execute(
+                f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM _bulk_{table}{conflict}"
+            )
+        else:
+            cursor.copy_expert(f"COPY {table} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+        raw.commit()
+        return True
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+
+def bulk_insert(
+    engine,
+    table: str,
+    df: pd.DataFrame,
+    conflict_columns: Optional[Sequence[str]] = None,
+) -> int:
+    if df.empty:
+        return 0
+    columns = list(df.columns)
+    records = _to_records(df)
+    conflict = _conflict_clause(conflict_columns)
+    if engine.dialect.name == "postgresql" and _copy_postgres(engine, table, columns, records, conflict):
+        return len(records)
+    _insert_many(engine, table, columns, records, conflict)
+    return len(records)
@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Tuple
+
+from dotenv import load_dotenv
+
+from src.etl.db import get_engine
+
+load_dotenv("src/config/.env")
+
+# Contracts can self-destruct and empty addresses can later receive CREATE2
+# deployments, so both kinds of entry are re-checked once they go stale.
+CONTRACT_TTL_SECONDS = float(os.getenv("CONTRACT_CACHE_TTL_DAYS", "7")) * 86400
+EOA_TTL_SECONDS = float(os.getenv("EOA_CACHE_TTL_DAYS", "30")) * 86400
+MEMORY_SIZE = int(os.getenv("CONTRACT_CACHE_SIZE", "10000"))
+_QUERY_CHUNK = 500
+
+
+class ContractCache:
+    def __init__(self, maxsize: int = MEMORY_SIZE):
+        self.maxsize = maxsize
+        self._memory: "OrderedDict[str, Tuple[bool, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _fresh(is_contract: bool, checked_at: float, now: float) -> bool:
+        ttl = CONTRACT_TTL_SECONDS if is_contract else EOA_TTL_SECONDS
+        return now - checked_at < ttl
+
+    def _remember(self, address: str, is_contract: bool, checked_at: float) -> None:
+        self._memory[address] = (is_contract, checked_at)
+        self._memory.move_to_end(address)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def get_many(self, addresses: Iterable[str]) -> Dict[str, bool]:
+        now = time.time()
+        found: Dict[str, bool] = {}
+        pending = []
+        with self._lock:
+            for address in addresses:
+                entry = self._memory.get(address)
+                if entry is not None and self._fresh(entry[0], entry[1], now):
+                    self._memory.move_to_end(address)
+                    found[address] = entry[0]
+                else:
+                    pending.append(address)
+            self.memory_hits += len(found)
+
+        rows = []
+        if pending:
+            with get_engine().connect() as conn:
+                for start in range(0, len(pending), _QUERY_CHUNK):
+                    chunk = pending[start:start + _QUERY_CHUNK]
+                    placeholders = ", ".join("?" for _ in chunk)
+                    rows.extend(
+                        conn.exec_driver_sql(
+                            "SELECT address, is_contract, checked_at FROM address_classifications "
+                            f"WHERE address IN ({placeholders})",
+                            tuple(chunk),
+                        ).fetchall()
+                    )
+
+        with self._lock:
+            disk_found = 0
+            for address, is_contract, checked_at in rows:
+                if self._fresh(bool(is_contract), checked_at, now):
+                    self._remember(address, bool(is_contract), checked_at)
+                    found[address] = bool(is_contract)
+                    disk_found += 1
+            self.disk_hits += disk_found
+            self.misses += len(pending) - disk_found
+        return found
+
+    def put_many(self, flags: Dict[str, bool]) -> None:
+        if not flags:
+            return
+        now = int(time.time())
+        records = [(address, bool(flag), now) for address, flag in flags.items()]
+        with get_engine().begin() as conn:
+            conn.exec_driver_sql(
+                """
+                INSERT INTO address_classifications (address, is_contract, checked_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT (address) DO UPDATE SET
+                    is_contract = excluded.is_contract,
+                    checked_at = excluded.checked_at
+                """,
+                records,
+            )
+        with self._lock:
+            for address, flag, checked_at in records:
+                self._remember(address, flag, checked_at)
+
+    def invalidate(self, addresses: Iterable[str]) -> None:
+        addresses = [address.lower() for address in addresses if address]
+        if not addresses:
+            return
+        with self._lock:
+            for address in addresses:
+                self._memory.pop(address, None)
+        with get_engine().begin() as conn:
+            conn.exec_driver_sql(
+                "DELETE FROM address_classifications WHERE address = ?",
+                [(address,) for address in addresses],
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_size": len(self._memory),
+            }
+
+
+contract_cache = ContractCache()
@@ -0,0 +1,65 @@
+import os
+import threading
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from dotenv import load_dotenv
+
+load_dotenv("src/config/.env")
+
+# Applied to every SQLite connection. WAL lets readers (the dashboard, reports)
+# run while ingestion writes; under WAL, synchronous=NORMAL only risks the last
+# commits on power loss, never corruption.
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+SQLITE_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}",
+    f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}",
+    f"PRAGMA cache_size = {SQLITE_CACHE_SIZE}",
+    "PRAGMA temp_store = MEMORY",
+]
+# Server databases (Postgres) share one pool across the ETL and analytics modules.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+_engine: Optional[Engine] = None
+_lock = threading.Lock()
+
+
+def _apply_sqlite_pragmas(dbapi_connection, _record) -> None:
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+def create_db_engine(url: Optional[str] = None) -> Engine:
+    url = url or os.getenv("DB_URL")
+    if not url:
+        raise RuntimeError("DB_URL is not set in your environment.")
+    if make_url(url).get_backend_name() == "sqlite":
+        engine = create_engine(url)
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+        return engine
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+
+def get_engine() -> Engine:
+    # Created on first use, so importing a module never opens a pool.
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                _engine = create_db_engine()
+    return _engine
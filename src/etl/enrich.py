@@ -1,32 +1,121 @@
 import os
-from functools import lru_cache
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
 
 import pandas as pd
-from web3 import Web3
+import requests
 from dotenv import load_dotenv
 
+from src.etl import ratelimit
+from src.etl.contract_cache import contract_cache
+from src.etl.db import get_engine
+
 load_dotenv()
 ALCHEMY_URL = os.getenv("ALCHEMY_URL")
+CONTRACT_BATCH_SIZE = int(os.getenv("CONTRACT_BATCH_SIZE", "100"))
+CONTRACT_BATCH_WORKERS = int(os.getenv("CONTRACT_BATCH_WORKERS", "4"))
+
+
+def _has_code(result: Optional[str]) -> bool:
+    return bool(result) and result not in ("0x", "0x0")
 
-w3 = Web3(Web3.HTTPProvider(ALCHEMY_URL)) if ALCHEMY_URL else None
 
 def is_contract(address):
-    if not w3:
+    if not ALCHEMY_URL:
         raise RuntimeError("ALCHEMY_URL is not set in your environment.")
-    code = w3.eth.get_code(Web3.to_checksum_address(address))
-    return code != b""
-
-@lru_cache(maxsize=10000)
-def _is_contract_cached(address_lower: str):
-    if not w3:
-        return None
-    if not address_lower:
-        return None
+    payload = {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "eth_getCode",
+        "params": [address, "latest"],
+    }
+    resp = ratelimit.request(
+        "alchemy",
+        "POST",
+        ALCHEMY_URL,
+        cost=ratelimit.compute_units("eth_getCode"),
+        json=payload,
+        timeout=20,
+    )
+    resp.raise_for_status()
+    data = resp.json()
+    if "error" in data:
+        raise ValueError(f"eth_getCode error: {data['error']}")
+    return _has_code(data.get("result"))
+
+def _get_code_batch(addresses: List[str]) -> Dict[str, Optional[bool]]:
+    payload = [
+        {"jsonrpc": "2.0", "id": idx, "method": "eth_getCode", "params": [address, "latest"]}
+        for idx, address in enumerate(addresses)
+    ]
+    resp = ratelimit.request(
+        "alchemy",
+        "POST",
+        ALCHEMY_URL,
+        cost=ratelimit.compute_units("eth_getCode") * len(addresses),
+        json=payload,
+        timeout=30,
+    )
+    resp.raise_for_status()
+    data = resp.json()
+    if not isinstance(data, list):
+        error = data.get("error", data) if isinstance(data, dict) else data
+        raise ValueError(f"eth_getCode batch error: {error}")
+
+    by_id = {item.get("id"): item for item in data}
+    results: Dict[str, Optional[bool]] = {}
+    for idx, address in enumerate(addresses):
+        item = by_id.get(idx)
+        if item is None or "error" in item:
+            results[address] = None
+        else:
+            results[address] = _has_code(item.get("result"))
+    return results
+
+
+def _get_code_batch_or_unknown(addresses: List[str]) -> Dict[str, Optional[bool]]:
+    # One failed batch leaves its flags unknown rather than aborting the whole load.
     try:
-        return is_contract(address_lower)
-    except ValueError:
-        return None
+        return _get_code_batch(addresses)
+    except (requests.RequestException, ValueError) as exc:
+        print(f"eth_getCode batch of {len(addresses)} addresses failed: {exc}")
+        return dict.fromkeys(addresses)
+
+
+def resolve_contract_flags(addresses: Iterable[str]) -> Dict[str, Optional[bool]]:
+    unique = {address.lower() for address in addresses if address}
+    flags: Dict[str, Optional[bool]] = dict(contract_cache.get_many(unique))
+    missing = sorted(unique - flags.keys())
+
+    if missing and ALCHEMY_URL:
+        batches = [
+            missing[start:start + CONTRACT_BATCH_SIZE]
+            for start in range(0, len(missing), CONTRACT_BATCH_SIZE)
+        ]
+        workers = max(1, min(CONTRACT_BATCH_WORKERS, len(batches)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for result in executor.map(_get_code_batch_or_unknown, batches):
+                flags.update(result)
+                # Failed lookups stay uncached so the next run retries them.
+                contract_cache.put_many(
+                    {address: flag for address, flag in result.items() if flag is not None}
+                )
+
+    return {address: flags.get(address) for address in unique}
+
+
+def forget_stored_counterparties() -> None:
+    # A full refresh re-checks every counterparty it reloads, so contracts that
+    # self-destructed (or addresses that gained code) since they were cached are caught.
+    with get_engine().connect() as conn:
+        addresses = [
+            row[0]
+            for row in conn.exec_driver_sql(
+                "SELECT DISTINCT to_address FROM transactions WHERE to_address IS NOT NULL"
+            )
+        ]
+    contract_cache.invalidate(addresses)
+
 
 def add_contract_flags(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
@@ -34,14 +123,11 @@ def add_contract_flags(df: pd.DataFrame) -> pd.DataFrame:
 
     df = df.copy()
 
-    if not w3:
+    if not ALCHEMY_URL:
         df["is_contract_interaction"] = None
         return df
 
-    def _lookup(address: Optional[str]) -> Optional[bool]:
-        if not address:
-            return None
-        return _is_contract_cached(address.lower())
-
-    df["is_contract_interaction"] = df["to_address"].map(_lookup)
+    to_addresses = df["to_address"].where(df["to_address"].notna(), "").astype(str).str.lower()
+    flags = resolve_contract_flags(to_addresses.unique())
+    df["is_contract_interaction"] = to_addresses.map(flags)
     return df
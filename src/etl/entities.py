@@ -1,52 +1,122 @@
 import os
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 
 import pandas as pd
-from sqlalchemy import create_engine
-from dotenv import load_dotenv
 
-load_dotenv("src/config/.env")
-engine = create_engine(os.getenv("DB_URL"))
+from src.etl.db import get_engine
 
 
 def load_entities(csv_path: str) -> int:
     if not csv_path or not os.path.exists(csv_path):
         return 0
 
-    df = pd.read_csv(csv_path)
+    df = pd.read_csv(csv_path, dtype=str)
     required = {"address", "label", "entity_type"}
     missing = required - set(df.columns)
     if missing:
         raise ValueError(f"entities CSV missing columns: {sorted(missing)}")
 
-    df = df.copy()
+    df = df.dropna(subset=["address"])[["address", "label", "entity_type"]].copy()
     df["address"] = df["address"].astype(str).str.lower()
-    df = df.dropna(subset=["address"])
+    # Blank cells read as NaN but come back from the table as NULL.
+    df = df.astype(object).where(df.notna(), None)
 
-    records: List[Tuple[str, str, str]] = list(
-        df[["address", "label", "entity_type"]].itertuples(index=False, name=None)
-    )
-    with engine.begin() as conn:
-        conn.exec_driver_sql("DELETE FROM entities")
+    records: List[Tuple[str, str, str]] = list(df.itertuples(index=False, name=None))
+    with get_engine().begin() as conn:
+        existing = {
+            row[0]: tuple(row)
+            for row in conn.exec_driver_sql("SELECT address, label, entity_type FROM entities")
+        }
+        incoming = {record[0] for record in records}
+        removed = [(address,) for address in existing if address not in incoming]
+        if removed:
+            conn.exec_driver_sql("DELETE FROM entities WHERE address = ?", removed)
         if records:
+            # Upsert rather than reload so entity ids stored on transactions stay valid.
             conn.exec_driver_sql(
-                "INSERT INTO entities (address, label, entity_type) VALUES (?, ?, ?)",
+                """
+                INSERT INTO entities (address, label, entity_type) VALUES (?, ?, ?)
+                ON CONFLICT (address) DO UPDATE SET
+                    label = excluded.label,
+                    entity_type = excluded.entity_type
+                """,
                 records,
             )
+        _resolve_transaction_entity_ids(conn, sorted(set(existing) ^ incoming))
+        current = {record[0]: record for record in records}
+        changed = sorted(
+            address for address in set(existing) | incoming if existing.get(address) != current.get(address)
+        )
+        if changed:
+            # Entity labels feed every daily metric, so all days need rebuilding.
+            conn.exec_driver_sql(
+                """
+                INSERT INTO daily_metrics_dirty (metric_date)
+                SELECT DISTINCT date(block_time / 86400 * 86400, 'unixepoch') FROM transactions
+                WHERE block_time IS NOT NULL
+                ON CONFLICT (metric_date) DO NOTHING
+                """
+            )
+            # Only these wallets can enter or leave the scored population; the next
+            # refresh swaps their contribution to the running stats.
+            conn.exec_driver_sql(
+                "INSERT INTO risk_dirty_wallets (wallet_address) VALUES (?) ON CONFLICT (wallet_address) DO NOTHING",
+                [(address,) for address in changed],
+            )
 
     return len(records)
 
 
+def _resolve_transaction_entity_ids(conn, addresses: List[str]) -> None:
+    for side in ("from", "to"):
+        for start in range(0, len(addresses), 500):
+            chunk = addresses[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            conn.exec_driver_sql(
+                f"""
+                UPDATE transactions
+                SET {side}_entity_id = (
+                    SELECT id FROM entities WHERE entities.address = transactions.{side}_address
+                )
+                WHERE {side}_address IN ({placeholders})
+                """,
+                tuple(chunk),
+            )
+
+
 def reset_analysis_tables() -> None:
-    with engine.begin() as conn:
+    with get_engine().begin() as conn:
         conn.exec_driver_sql("DELETE FROM risk_metrics")
         conn.exec_driver_sql("DELETE FROM daily_metrics")
+        conn.exec_driver_sql("DELETE FROM daily_metrics_dirty")
         conn.exec_driver_sql("DELETE FROM transactions")
+        conn.exec_driver_sql("DELETE FROM ingest_watermarks")
+        conn.exec_driver_sql("DELETE FROM archive_watermarks")
+        conn.exec_driver_sql("DELETE FROM wallet_activity_buckets")
+        conn.exec_driver_sql("DELETE FROM wallet_counterparty_buckets")
+        conn.exec_driver_sql("DELETE FROM wallet_counterparty_sketches")
+        conn.exec_driver_sql("DELETE FROM counterparty_first_seen")
+        conn.exec_driver_sql("DELETE FROM wallet_risk_state")
+        conn.exec_driver_sql("DELETE FROM risk_population_stats")
+        conn.exec_driver_sql("DELETE FROM risk_dirty_wallets")
 
 
 def list_entities() -> List[dict]:
-    query = "SELECT address, entity_type, label FROM entities"
-    df = pd.read_sql(query, engine)
+    query = "SELECT id, address, entity_type, label FROM entities"
+    df = pd.read_sql(query, get_engine())
     if df.empty:
         return []
     return df.dropna(subset=["address"]).to_dict(orient="records")
+
+
+def entity_id_lookup() -> Dict[str, int]:
+    return {entity["address"]: int(entity["id"]) for entity in list_entities()}
+
+
+def add_entity_ids(df: pd.DataFrame, entity_ids: Dict[str, int]) -> pd.DataFrame:
+    if df.empty:
+        return df
+    df = df.copy()
+    df["from_entity_id"] = df["from_address"].map(entity_ids).astype("Int64")
+    df["to_entity_id"] = df["to_address"].map(entity_ids).astype("Int64")
+    return df
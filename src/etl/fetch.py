@@ -1,15 +1,22 @@
+import math
 import os
 from datetime import datetime, timedelta, timezone
-from decimal import Decimal
+from typing import Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 import requests
 from dotenv import load_dotenv
 
+from src.etl import ratelimit
+
 load_dotenv("src/config/.env")
 
 ETHERSCAN_API_KEY = os.getenv("ETHERSCAN_API_KEY")
 ALCHEMY_URL = os.getenv("ALCHEMY_URL")
+ETHERSCAN_URL = "https://api.etherscan.io/v2/api"
+# Etherscan refuses page * offset beyond this, so long histories are walked in windows.
+ETHERSCAN_RESULT_WINDOW = 10000
 ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
 
 
@@ -20,7 +27,14 @@ def _alchemy_request(params):
         "method": "alchemy_getAssetTransfers",
         "params": [params],
     }
-    resp = requests.post(ALCHEMY_URL, json=payload, timeout=20)
+    resp = ratelimit.request(
+        "alchemy",
+        "POST",
+        ALCHEMY_URL,
+        cost=ratelimit.compute_units(payload["method"]),
+        json=payload,
+        timeout=20,
+    )
     resp.raise_for_status()
     data = resp.json()
     if "error" in data:
@@ -28,18 +42,103 @@ def _alchemy_request(params):
     return data.get("result", {})
 
 
-def _alchemy_transfers(
+def _alchemy_pages(params, max_pages: int = 0) -> Iterator[Tuple[List[dict], bool]]:
+    # Yields (transfers, more); more is still True on the last page when max_pages
+    # cut the stream short.
+    page_key = None
+    pages = 0
+    while True:
+        page_params = dict(params)
+        if page_key:
+            page_params["pageKey"] = page_key
+        result = _alchemy_request(page_params)
+        page_key = result.get("pageKey")
+        yield result.get("transfers", []), bool(page_key)
+        pages += 1
+        if not page_key or (max_pages and pages >= max_pages):
+            return
+
+
+def _hex_int(value) -> Optional[int]:
+    if not isinstance(value, str) or not value.startswith("0x"):
+        return None
+    try:
+        return int(value, 16)
+    except ValueError:
+        return None
+
+
+def _quantities(values: pd.Series) -> pd.Series:
+    # Alchemy quantities are 0x-prefixed hex; plain numbers pass through.
+    parsed = [_hex_int(value) if isinstance(value, str) and value.startswith("0x") else value for value in values]
+    return pd.to_numeric(pd.Series(parsed, index=values.index, dtype=object), errors="coerce").astype("Int64")
+
+
+def _transfers_frame(transfers: List[dict]) -> pd.DataFrame:
+    if not transfers:
+        return pd.DataFrame([])
+
+    def column(name: str) -> pd.Series:
+        # Pull only the fields we use; pd.json_normalize flattens every key and
+        # was slower than the old per-row loop.
+        outer, _, inner = name.partition(".")
+        if inner:
+            values = [(item.get(outer) or {}).get(inner) for item in transfers]
+        else:
+            values = [item.get(name) for item in transfers]
+        return pd.Series(values, dtype=object)
+
+    category = column("category")
+    is_erc20 = category.eq("erc20")
+    value = pd.to_numeric(column("value"), errors="coerce")
+    # uniqueId is "<hash>:log:<n>" for token logs and "<hash>:<category>[:<n>]" otherwise.
+    suffixes = [uid.rpartition(":")[2] if isinstance(uid, str) else None for uid in column("uniqueId")]
+    log_index = pd.to_numeric(pd.Series(suffixes), errors="coerce").fillna(0).astype("int64")
+
+    decimals = column("rawContract.decimals")
+    decimals = _quantities(decimals.where(decimals.notna(), column("rawContract.decimal")))
+    # 256-bit amounts overflow every numpy dtype, so they are parsed as Python ints and
+    # kept as exact decimal text alongside the float columns.
+    raw_ints = [_hex_int(value) for value in column("rawContract.value")]
+    raw_value = pd.Series([np.nan if value is None else float(value) for value in raw_ints], dtype="float64")
+    raw_units = pd.Series([None if value is None else str(value) for value in raw_ints], dtype=object)
+    scaled = raw_value / np.power(10.0, decimals.astype("float64"))
+    token_value = scaled.where(scaled.notna(), value).where(is_erc20)
+
+    return pd.DataFrame(
+        {
+            "hash": column("hash"),
+            "from": column("from"),
+            "to": column("to"),
+            "value_eth": value.where(~is_erc20),
+            "blockNumber": column("blockNum"),
+            "timeStamp": column("metadata.blockTimestamp"),
+            "category": category,
+            "log_index": log_index,
+            "token_symbol": column("asset").where(is_erc20),
+            "token_value": token_value,
+            "token_contract_address": column("rawContract.address").where(is_erc20),
+            "value_wei": raw_units.where(~is_erc20),
+            "token_value_raw": raw_units.where(is_erc20),
+            "token_decimals": decimals.where(is_erc20),
+        }
+    )
+
+
+def _alchemy_transfer_pages(
     address: str,
     direction_key: str,
     categories,
     contract_addresses=None,
     max_count: int = 1000,
-) -> pd.DataFrame:
+    from_block: int = 0,
+    max_pages: int = 0,
+) -> Iterator[Tuple[pd.DataFrame, bool]]:
     if not ALCHEMY_URL:
         raise RuntimeError("ALCHEMY_URL is not set in your environment.")
 
     params = {
-        "fromBlock": "0x0",
+        "fromBlock": hex(from_block),
         "toBlock": "latest",
         "category": categories,
         "withMetadata": True,
@@ -51,48 +150,38 @@ def _alchemy_transfers(
     if contract_addresses:
         params["contractAddresses"] = contract_addresses
 
-    result = _alchemy_request(params)
-    transfers = result.get("transfers", [])
-
-    rows = []
-    for item in transfers:
-        category = item.get("category")
-        value = item.get("value")
-        value_wei = None
-        token_value = None
-        token_symbol = None
-        token_contract_address = None
-
-        if category == "erc20":
-            raw = item.get("rawContract", {}) or {}
-            token_contract_address = raw.get("address")
-            decimals = raw.get("decimals") or raw.get("decimal")
-            raw_value = raw.get("value")
-            token_symbol = item.get("asset")
-            if raw_value and decimals is not None:
-                decimals_int = int(decimals, 16) if isinstance(decimals, str) and decimals.startswith("0x") else int(decimals)
-                token_value = int(raw_value, 16) / (10 ** decimals_int)
-            elif value is not None:
-                token_value = value
-        else:
-            if value is not None:
-                value_wei = str(int(Decimal(str(value)) * Decimal("1e18")))
-        rows.append(
-            {
-                "hash": item.get("hash"),
-                "from": item.get("from"),
-                "to": item.get("to"),
-                "value": value_wei,
-                "blockNumber": item.get("blockNum"),
-                "timeStamp": item.get("metadata", {}).get("blockTimestamp"),
-                "category": category,
-                "token_symbol": token_symbol,
-                "token_value": token_value,
-                "token_contract_address": token_contract_address,
-            }
+    for transfers, more in _alchemy_pages(params, max_pages=max_pages):
+        yield _transfers_frame(transfers), more
+
+
+def _alchemy_transfers(
+    address: str,
+    direction_key: str,
+    categories,
+    contract_addresses=None,
+    max_count: int = 1000,
+    from_block: int = 0,
+    max_pages: int = 0,
+) -> pd.DataFrame:
+    return _concat_pages(
+        page
+        for page, _ in _alchemy_transfer_pages(
+            address,
+            direction_key,
+            categories,
+            contract_addresses=contract_addresses,
+            max_count=max_count,
+            from_block=from_block,
+            max_pages=max_pages,
         )
+    )
 
-    return pd.DataFrame(rows)
+
+def _concat_pages(pages: Iterator[pd.DataFrame]) -> pd.DataFrame:
+    frames = [page for page in pages if not page.empty]
+    if not frames:
+        return pd.DataFrame([])
+    return pd.concat(frames, ignore_index=True)
 
 
 def _filter_since_days(df: pd.DataFrame, since_days: int) -> pd.DataFrame:
@@ -112,95 +201,265 @@ def _filter_since_days(df: pd.DataFrame, since_days: int) -> pd.DataFrame:
     return df[ts >= cutoff].copy()
 
 
-def _fetch_wallet_txs_alchemy(
+def _drop_self_transfers(inbound: pd.DataFrame, address: str) -> pd.DataFrame:
+    # Self-transfers also match the outbound (fromAddress) query.
+    if inbound.empty:
+        return inbound
+    return inbound[inbound["from"].str.lower() != address.lower()]
+
+
+def _reached_block(df: pd.DataFrame, more: bool) -> float:
+    # Highest block a stream has been read through: all of them once no pages remain.
+    if not more:
+        return math.inf
+    if df.empty:
+        return -1
+    blocks = _quantities(df["blockNumber"])
+    return int(blocks.max()) if blocks.notna().any() else -1
+
+
+def _through_block(df: pd.DataFrame, block: float) -> pd.DataFrame:
+    if df.empty or block == math.inf:
+        return df
+    return df[(_quantities(df["blockNumber"]) <= block).fillna(False).to_numpy(dtype=bool)]
+
+
+def _iter_wallet_txs_alchemy(
     address: str,
     max_count: int = 1000,
     since_days: int = 0,
-) -> pd.DataFrame:
+    from_block: int = 0,
+    max_pages: int = 0,
+) -> Iterator[pd.DataFrame]:
     categories = ["external", "internal"]
-    outbound = _alchemy_transfers(address, "fromAddress", categories, max_count=max_count)
-    inbound = _alchemy_transfers(address, "toAddress", categories, max_count=max_count)
-    if outbound.empty and inbound.empty:
-        return pd.DataFrame([])
-    df = pd.concat([outbound, inbound], ignore_index=True)
-    df = df.drop_duplicates(subset=["hash", "from", "to", "value", "blockNumber"])
-    return _filter_since_days(df, since_days)
+    kwargs = {"max_count": max_count, "from_block": from_block, "max_pages": max_pages}
+    streams = [
+        _alchemy_transfer_pages(address, "fromAddress", categories, **kwargs),
+        _alchemy_transfer_pages(address, "toAddress", categories, **kwargs),
+    ]
+    # Both directions ascend by block, but max_pages can stop one far below the
+    # other. Rows are only released up to the lowest block both have been read
+    # through, so loads stay gap-free and the highest stored block is a safe
+    # watermark; rows past a truncated stream are fetched again next run.
+    reached = [-1, -1]
+    pending = pd.DataFrame([])
+    while True:
+        # A stream that stopped short caps how far the other one is worth reading.
+        cap = min((reached[i] for i, stream in enumerate(streams) if stream is None), default=math.inf)
+        readable = [i for i, stream in enumerate(streams) if stream is not None and reached[i] < cap]
+        if not readable:
+            return
+        index = min(readable, key=reached.__getitem__)
+        page, more = next(streams[index], (pd.DataFrame([]), None))
+        if more is None:
+            streams[index] = None
+            continue
+        if index == 1:
+            page = _drop_self_transfers(page, address)
+        reached[index] = max(reached[index], _reached_block(page, more))
+        pending = _concat_pages(iter([pending, page]))
+        ready = _through_block(pending, min(reached))
+        if len(ready) < len(pending):
+            pending = pending.drop(ready.index).reset_index(drop=True)
+        else:
+            pending = pd.DataFrame([])
+        if not ready.empty:
+            yield _filter_since_days(ready.reset_index(drop=True), since_days)
 
 
-def _fetch_token_transfers_alchemy(
+def _iter_token_transfers_alchemy(
     contract_address: str,
     max_count: int = 1000,
     since_days: int = 0,
-) -> pd.DataFrame:
+    from_block: int = 0,
+    max_pages: int = 0,
+) -> Iterator[pd.DataFrame]:
     categories = ["erc20"]
-    df = _alchemy_transfers(
+    for page, _ in _alchemy_transfer_pages(
         contract_address,
         direction_key=None,
         categories=categories,
         contract_addresses=[contract_address],
         max_count=max_count,
+        from_block=from_block,
+        max_pages=max_pages,
+    ):
+        yield _filter_since_days(page, since_days)
+
+
+def _etherscan_throttled(resp) -> bool:
+    # Etherscan reports rate limiting as a 200 with status "0".
+    try:
+        data = resp.json()
+    except ValueError:
+        return False
+    return data.get("status") == "0" and "rate limit" in str(data.get("result", "")).lower()
+
+
+def _etherscan_request(params):
+    resp = ratelimit.request(
+        "etherscan",
+        "GET",
+        ETHERSCAN_URL,
+        retry_if=_etherscan_throttled,
+        params=params,
+        timeout=15,
     )
-    if df.empty:
-        return df
-    return _filter_since_days(df, since_days)
+    data = resp.json()
+
+    if os.getenv("DEBUG_ETHERSCAN") == "1":
+        print("DEBUG Etherscan response:", data)
+
+    if data.get("status") != "1":
+        if data.get("message") == "No transactions found":
+            return []
+        raise RuntimeError(
+            f"Etherscan error: {data.get('message')} | result={data.get('result')}"
+        )
+    return data["result"]
 
-def fetch_wallet_txs(address: str, max_count: int = 1000, since_days: int = 0) -> pd.DataFrame:
-    if ALCHEMY_URL:
-        try:
-            return _fetch_wallet_txs_alchemy(address, max_count=max_count, since_days=since_days)
-        except requests.HTTPError as exc:
-            status = exc.response.status_code if exc.response is not None else None
-            if status is None or status < 500 or not ETHERSCAN_API_KEY:
-                raise
-        except requests.RequestException:
-            if not ETHERSCAN_API_KEY:
-                raise
 
+def _iter_wallet_txs_etherscan(
+    address: str,
+    max_count: int = 1000,
+    since_days: int = 0,
+    from_block: int = 0,
+    max_pages: int = 0,
+) -> Iterator[pd.DataFrame]:
     if not ETHERSCAN_API_KEY:
         raise RuntimeError("ETHERSCAN_API_KEY is not set in your environment.")
 
-    url = "https://api.etherscan.io/v2/api"
-
+    # incremental runs walk forward from the watermark so nothing is skipped
+    ascending = bool(from_block)
     params = {
         "apikey": ETHERSCAN_API_KEY,   # your key
         "chainid": "1",                # Ethereum mainnet
         "module": "account",           # from docs: default 'account'
         "action": "txlist",            # from docs: default 'txlist'
         "address": address,            # wallet we’re querying
-        "startblock": 0,
+        "startblock": from_block,
         "endblock": 9999999999,
         "page": 1,
-    # docs default offset=1, but we can ask for more per page:
-    "offset": max_count,           # up to 1k txs per page
-    "sort": "desc",                # newest → oldest
+        "offset": max_count,           # up to 1k txs per page
+        "sort": "asc" if ascending else "desc",
     }
 
-    resp = requests.get(url, params=params, timeout=15)
-    data = resp.json()
+    pages = 0
+    boundary_hashes = set()
+    # Hashes of the most recent block in the current window, which can span several pages.
+    tail_block, tail_hashes = None, set()
+    while True:
+        rows = _etherscan_request(params)
+        if not rows:
+            return
+        for row in rows:
+            block = int(row["blockNumber"])
+            if block != tail_block:
+                tail_block, tail_hashes = block, set()
+            tail_hashes.add(row["hash"])
+        df = pd.DataFrame(rows)
+        if boundary_hashes:
+            df = df[~df["hash"].isin(boundary_hashes)]
+        filtered = _filter_since_days(df, since_days)
+        yield filtered
+        pages += 1
 
-    if os.getenv("DEBUG_ETHERSCAN") == "1":
-        print("DEBUG Etherscan response:", data)
+        if len(rows) < max_count or (max_pages and pages >= max_pages):
+            return
+        if not ascending and len(filtered) < len(df):
+            # Newest-first pages have crossed the since_days cutoff.
+            return
 
-    if data.get("status") != "1":
-        if data.get("message") == "No transactions found":
-            return pd.DataFrame([])
-        raise RuntimeError(
-            f"Etherscan error: {data.get('message')} | result={data.get('result')}"
-        )
+        if (params["page"] + 1) * max_count > ETHERSCAN_RESULT_WINDOW:
+            # Restart paging from the last block seen; its rows are skipped on the next pass.
+            boundary_hashes = set(tail_hashes)
+            params["startblock" if ascending else "endblock"] = tail_block
+            params["page"] = 1
+        else:
+            params["page"] += 1
+
+
+def iter_wallet_tx_pages(
+    address: str,
+    max_count: int = 1000,
+    since_days: int = 0,
+    from_block: int = 0,
+    max_pages: int = 0,
+) -> Iterator[pd.DataFrame]:
+    kwargs = {
+        "max_count": max_count,
+        "since_days": since_days,
+        "from_block": from_block,
+        "max_pages": max_pages,
+    }
+    if ALCHEMY_URL:
+        yielded = False
+        try:
+            for page in _iter_wallet_txs_alchemy(address, **kwargs):
+                yielded = True
+                yield page
+            return
+        except requests.HTTPError as exc:
+            # Falling back after pages were consumed would duplicate them.
+            status = exc.response.status_code if exc.response is not None else None
+            if yielded or status is None or status < 500 or not ETHERSCAN_API_KEY:
+                raise
+        except requests.RequestException:
+            if yielded or not ETHERSCAN_API_KEY:
+                raise
 
-    # result is a list of tx dicts → turn into DataFrame
-    return _filter_since_days(pd.DataFrame(data["result"]), since_days)
+    yield from _iter_wallet_txs_etherscan(address, **kwargs)
 
 
-def fetch_token_transfers(
+def iter_token_transfer_pages(
     contract_address: str,
     max_count: int = 1000,
     since_days: int = 0,
-) -> pd.DataFrame:
+    from_block: int = 0,
+    max_pages: int = 0,
+) -> Iterator[pd.DataFrame]:
     if not ALCHEMY_URL:
         raise RuntimeError("ALCHEMY_URL is required for token transfer ingestion.")
-    return _fetch_token_transfers_alchemy(
+    yield from _iter_token_transfers_alchemy(
         contract_address,
         max_count=max_count,
         since_days=since_days,
+        from_block=from_block,
+        max_pages=max_pages,
+    )
+
+
+def fetch_wallet_txs(
+    address: str,
+    max_count: int = 1000,
+    since_days: int = 0,
+    from_block: int = 0,
+    max_pages: int = 0,
+) -> pd.DataFrame:
+    return _concat_pages(
+        iter_wallet_tx_pages(
+            address,
+            max_count=max_count,
+            since_days=since_days,
+            from_block=from_block,
+            max_pages=max_pages,
+        )
+    )
+
+
+def fetch_token_transfers(
+    contract_address: str,
+    max_count: int = 1000,
+    since_days: int = 0,
+    from_block: int = 0,
+    max_pages: int = 0,
+) -> pd.DataFrame:
+    return _concat_pages(
+        iter_token_transfer_pages(
+            contract_address,
+            max_count=max_count,
+            since_days=since_days,
+            from_block=from_block,
+            max_pages=max_pages,
+        )
     )
@@ -0,0 +1,152 @@
+import os
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+# 2**precision registers per sketch; the standard error is about 1.04 / sqrt(2**precision).
+HLL_PRECISION = int(os.getenv("HLL_PRECISION", "12"))
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+# Sketches with few set registers are stored as (index, rank) pairs instead of all registers.
+SPARSE_DTYPE = np.dtype([("index", "<u2"), ("rank", "u1")])
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.uint64)
+    length = np.zeros(len(values), dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = values >> np.uint64(shift)
+        wide = high != 0
+        values = np.where(wide, high, values)
+        length += np.where(wide, shift, 0).astype(np.uint8)
+    return length + (values != 0).astype(np.uint8)
+
+
+def registers(values: pd.Series, precision: int = HLL_PRECISION) -> pd.DataFrame:
+    if not MIN_PRECISION <= precision <= MAX_PRECISION:
+        raise ValueError(f"HLL precision must be between {MIN_PRECISION} and {MAX_PRECISION}.")
+    # hash_pandas_object uses a fixed key, so hashes are stable across runs.
+    hashes = pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+    width = 64 - precision
+    rest = hashes & np.uint64((1 << width) - 1)
+    return pd.DataFrame(
+        {
+            "index": (hashes >> np.uint64(width)).astype(np.uint16),
+            "rank": (width + 1 - _bit_length(rest)).astype(np.uint8),
+        },
+        index=values.index,
+    )
+
+
+def encode(index: np.ndarray, rank: np.ndarray, precision: int) -> bytes:
+    size = 1 << precision
+    if 3 * len(index) < size:
+        sparse = np.empty(len(index), dtype=SPARSE_DTYPE)
+        sparse["index"], sparse["rank"] = index, rank
+        return sparse.tobytes()
+    dense = np.zeros(size, dtype=np.uint8)
+    np.maximum.at(dense, index.astype(np.intp), rank.astype(np.uint8))
+    return dense.tobytes()
+
+
+def decode(blob: bytes, precision: int) -> Tuple[np.ndarray, np.ndarray]:
+    # A sparse blob is always shorter than 2**precision bytes, so the length tells them apart.
+    if len(blob) == 1 << precision:
+        dense = np.frombuffer(blob, dtype=np.uint8)
+        index = np.flatnonzero(dense)
+        return index.astype(np.uint16), dense[index]
+    sparse = np.frombuffer(blob, dtype=SPARSE_DTYPE)
+    return sparse["index"], sparse["rank"]
+
+
+def fold(index: np.ndarray, rank: np.ndarray, precision: int, target: int) -> Tuple[np.ndarray, np.ndarray]:
+    if precision == target:
+        return index, rank
+    if precision < target:
+        raise ValueError(f"Cannot raise a precision {precision} sketch to {target}.")
+    shift = precision - target
+    low = index.astype(np.uint64) & np.uint64((1 << shift) - 1)
+    # Dropped index bits lead the hash suffix: a set bit among them ends the run of zeros.
+    rank = np.where(
+        low != 0,
+        shift + 1 - _bit_length(low).astype(np.int64),
+        rank.astype(np.int64) + shift,
+    )
+    return (index >> shift).astype(np.uint16), rank.astype(np.uint8)
+
+
+def explode_sketches(sketches: pd.DataFrame, precision: int) -> pd.DataFrame:
+    # One row per set register, keyed by the sketches' other columns. Blobs are
+    # concatenated per layout and decoded with a single frombuffer each.
+    keys = sketches.drop(columns=["precision", "registers"]).reset_index(drop=True)
+    stored = sketches["precision"].astype("int64").to_numpy()
+    blobs = sketches["registers"].to_numpy()
+    lengths = np.fromiter((len(blob) for blob in blobs), dtype=np.int64, count=len(blobs))
+    rows, indexes, ranks = [], [], []
+    for size_bits in np.unique(stored):
+        size = 1 << int(size_bits)
+        dense = np.flatnonzero((stored == size_bits) & (lengths == size))
+        sparse = np.flatnonzero((stored == size_bits) & (lengths != size))
+        if len(dense):
+            registers = np.frombuffer(b"".join(blobs[dense]), dtype=np.uint8).reshape(len(dense), size)
+            row, index = np.nonzero(registers)
+            folded = fold(index.astype(np.uint16), registers[row, index], int(size_bits), precision)
+            rows.append(dense[row])
+            indexes.append(folded[0])
+            ranks.append(folded[1])
+        if len(sparse):
+            pairs = np.frombuffer(b"".join(blobs[sparse]), dtype=SPARSE_DTYPE)
+            folded = fold(pairs["index"], pairs["rank"], int(size_bits), precision)
+            rows.append(np.repeat(sparse, lengths[sparse] // SPARSE_DTYPE.itemsize))
+            indexes.append(folded[0])
+            ranks.append(folded[1])
+    if not rows:
+        return keys.iloc[:0].assign(index=np.empty(0, np.uint16), rank=np.empty(0, np.uint8))
+    out = keys.iloc[np.concatenate(rows)].reset_index(drop=True)
+    out["index"] = np.concatenate(indexes)
+    out["rank"] = np.concatenate(ranks)
+    return out
+
+
+def _sigma(x: np.ndarray) -> np.ndarray:
+    x = x.astype("float64")
+    total, weight = x.copy(), 1.0
+    with np.errstate(over="ignore", invalid="ignore"):
+        for _ in range(64):
+            x = x * x
+            total = total + x * weight
+            weight += weight
+    return np.where(x >= 1.0, np.inf, total)
+
+
+def _tau(x: np.ndarray) -> np.ndarray:
+    edge = (x <= 0.0) | (x >= 1.0)
+    x = x.astype("float64")
+    total, weight = 1.0 - x, 1.0
+    for _ in range(64):
+        x = np.sqrt(x)
+        weight *= 0.5
+        total = total - (1.0 - x) ** 2 * weight
+    return np.where(edge, 0.0, total / 3.0)
+
+
+def estimate(registers: pd.DataFrame, key: str, precision: int) -> pd.Series:
+    # Ertl's improved raw estimator (arXiv:1702.01284): no bias correction tables
+    # and no switch to linear counting at small cardinalities.
+    size = 1 << precision
+    width = 64 - precision
+    if registers.empty:
+        return pd.Series(dtype="float64")
+    merged = registers.groupby([key, "index"], sort=False)["rank"].max().astype("float64")
+    saturated = merged.ge(width + 1)
+    grouped = np.exp2(-merged.where(~saturated)).groupby(level=0, sort=False)
+    zeros = (size - merged.groupby(level=0, sort=False).size()).to_numpy()
+    full = saturated.groupby(level=0, sort=False).sum().to_numpy()
+    denominator = (
+        size * _sigma(zeros / size)
+        + grouped.sum().to_numpy()
+        + size * _tau(1.0 - full / size) * 2.0 ** -width
+    )
+    alpha = 1 / (2 * np.log(2))
+    return pd.Series(alpha * size * size / denominator, index=grouped.sum().index)
@@ -1,17 +1,47 @@
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
-import os
-from dotenv import load_dotenv
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+from src.etl import hll
+from src.etl.bulk import bulk_insert
+from src.etl.db import get_engine
+from src.etl.entities import add_entity_ids, entity_id_lookup
+
+TRANSFER_KEY = ["tx_hash", "category", "log_index", "wallet_address"]
+BUCKET_FORMAT = "%Y-%m-%d %H:%M:%S"
+SKETCH_KEY = ["wallet_address", "sketch_date"]
+# Block time is stored as integer epoch seconds, so a UTC day is block_time // 86400.
+SECONDS_PER_DAY = 86400
+EPOCH = pd.Timestamp(0, tz="UTC")
+
+
+def epoch_seconds(timestamps) -> pd.Series:
+    # Whole seconds since the epoch, floored like strftime('%s') in migration 014.
+    times = pd.to_datetime(timestamps, errors="coerce", utc=True)
+    return ((times - EPOCH) // pd.Timedelta(seconds=1)).astype("Int64")
+
+
+def day_start(day: str) -> int:
+    # block_time at 00:00 UTC of a 'YYYY-MM-DD' day.
+    return (date.fromisoformat(day[:10]) - EPOCH.date()).days * SECONDS_PER_DAY
+
+
+def day_labels(days) -> pd.Series:
+    # 'YYYY-MM-DD' for day numbers; each distinct day is formatted once.
+    days = pd.Series(days)
+    unique = days.dropna().unique()
+    labels = pd.to_datetime(unique.astype("int64"), unit="D").strftime("%Y-%m-%d")
+    return days.map(dict(zip(unique, labels)))
 
-load_dotenv("src/config/.env")
-DB_URL = os.getenv("DB_URL")
-engine = create_engine(DB_URL)
 
 def normalize(df, wallet):
     if df.empty:
         return df
 
     df = df.copy()
+    # Addresses are stored lowercased so queries can compare them without LOWER().
+    wallet = wallet.lower()
 
     has_category = "category" in df.columns
     is_erc20 = df["category"].eq("erc20") if has_category else pd.Series(False, index=df.index)
@@ -22,6 +52,16 @@ def normalize(df, wallet):
         df["value_eth"] = pd.to_numeric(df["value"], errors="coerce") / 1e18
     df.loc[is_erc20, "value_eth"] = None
 
+    # Exact integer amounts as decimal text; REAL columns lose precision past 2**53 wei.
+    if "value_wei" in df.columns:
+        value_wei = df["value_wei"]
+    elif "value" in df.columns:
+        text = df["value"].astype("string")
+        value_wei = text.where(text.str.fullmatch(r"\d+"))
+    else:
+        value_wei = pd.Series(None, index=df.index, dtype=object)
+    value_wei = value_wei.where(~is_erc20)
+
     if "timeStamp" in df.columns:
         raw_ts = df["timeStamp"]
         numeric_ts = pd.to_numeric(raw_ts, errors="coerce")
@@ -44,40 +84,313 @@ def normalize(df, wallet):
         df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce", utc=True)
 
     if "blockNumber" in df.columns:
-        df["blockNumber"] = df["blockNumber"].apply(
-            lambda value: int(value, 16) if isinstance(value, str) and value.startswith("0x") else value
-        )
+        # Alchemy block numbers are 0x-prefixed hex, Etherscan's are decimal.
+        blocks = [
+            int(value, 16) if isinstance(value, str) and value.startswith("0x") else value
+            for value in df["blockNumber"]
+        ]
+        df["blockNumber"] = pd.to_numeric(pd.Series(blocks, index=df.index, dtype=object), errors="coerce").astype("Int64")
 
     if has_category and is_erc20.any():
         df["direction"] = None
     else:
-        df["direction"] = df.apply(
-            lambda row: "in" if str(row["to"]).lower() == wallet.lower() else "out",
-            axis=1
-        )
+        is_inbound = df["to"].astype(str).str.lower() == wallet
+        df["direction"] = np.where(is_inbound, "in", "out")
 
     return pd.DataFrame({
         "tx_hash": df["hash"],
         "wallet_address": wallet,
         "direction": df["direction"],
-        "from_address": df["from"],
-        "to_address": df["to"],
+        "from_address": df["from"].str.lower(),
+        "to_address": df["to"].str.lower(),
         "value_eth": df["value_eth"],
         "block_number": df["blockNumber"],
         "timestamp": df["timestamp"],
+        "block_time": epoch_seconds(df["timestamp"]),
+        "value_wei": value_wei,
         "token_symbol": df["token_symbol"] if "token_symbol" in df.columns else None,
         "token_value": df["token_value"] if "token_value" in df.columns else None,
-        "is_contract_interaction": None
+        "token_value_raw": df["token_value_raw"] if "token_value_raw" in df.columns else None,
+        "token_decimals": df["token_decimals"] if "token_decimals" in df.columns else None,
+        "is_contract_interaction": None,
+        # Etherscan txlist rows are plain external transactions.
+        "category": df["category"].fillna("external") if has_category else "external",
+        "log_index": df["log_index"].fillna(0).astype("int64") if "log_index" in df.columns else 0,
     })
 
-def load_transactions(df):
+def load_transactions(df, entity_ids: Optional[Dict[str, int]] = None):
     if df.empty:
         return
-    df.to_sql(
+    if entity_ids is None:
+        entity_ids = entity_id_lookup()
+    df = add_entity_ids(df, entity_ids)
+    # Re-ingesting an overlapping range is a no-op thanks to the natural key.
+    bulk_insert(
+        get_engine(),
         "transactions",
-        engine,
-        if_exists="append",
-        index=False,
-        chunksize=1000,
-        method="multi",
+        df,
+        conflict_columns=TRANSFER_KEY,
+    )
+    mark_dirty_dates(df["timestamp"])
+    update_activity_buckets(df)
+
+
+def mark_dirty_dates(timestamps) -> None:
+    # Days that received transfers get their daily_metrics rebuilt on the next run.
+    days = pd.to_datetime(timestamps, errors="coerce", utc=True).dropna().dt.strftime("%Y-%m-%d")
+    if days.empty:
+        return
+    bulk_insert(
+        get_engine(),
+        "daily_metrics_dirty",
+        pd.DataFrame({"metric_date": days.unique()}),
+        conflict_columns=["metric_date"],
     )
+
+
+def update_activity_buckets(df) -> None:
+    # Feeds the streaming risk scorer. Touched hour buckets are recomputed from
+    # stored rows, so transfers skipped by the natural key are not counted twice.
+    hours = pd.to_datetime(df["timestamp"], errors="coerce", utc=True).dt.floor("h")
+    touched = pd.DataFrame({"wallet_address": df["wallet_address"], "bucket": hours})
+    touched = touched.dropna().drop_duplicates()
+    if touched.empty:
+        return
+    bucket_start = touched["bucket"].dt.strftime(BUCKET_FORMAT)
+    start_time = epoch_seconds(touched["bucket"]).astype("int64").tolist()
+    params = list(
+        zip(
+            touched["wallet_address"],
+            bucket_start,
+            touched["wallet_address"],
+            start_time,
+            [value + 3600 for value in start_time],
+        )
+    )
+    with get_engine().begin() as conn:
+        conn.exec_driver_sql(
+            """
+            INSERT INTO wallet_activity_buckets (
+                wallet_address, bucket_start, tx_count, volume_eth, value_count, contract_interactions
+            )
+            SELECT
+                ?, ?, COUNT(*), SUM(value_eth), COUNT(value_eth),
+                SUM(CASE WHEN is_contract_interaction = 1 THEN 1 ELSE 0 END)
+            FROM transactions
+            WHERE wallet_address = ? AND block_time >= ? AND block_time < ?
+            ON CONFLICT (wallet_address, bucket_start) DO UPDATE SET
+                tx_count = excluded.tx_count,
+                volume_eth = excluded.volume_eth,
+                value_count = excluded.value_count,
+                contract_interactions = excluded.contract_interactions
+            """,
+            params,
+        )
+
+    counterparty = df["to_address"].where(df["direction"].eq("out"), df["from_address"])
+    counterparties = pd.DataFrame(
+        {
+            "wallet_address": df["wallet_address"],
+            "bucket_start": hours.dt.strftime(BUCKET_FORMAT),
+            "counterparty": counterparty,
+        }
+    ).dropna().drop_duplicates()
+    bulk_insert(
+        get_engine(),
+        "wallet_counterparty_buckets",
+        counterparties,
+        conflict_columns=["wallet_address", "bucket_start", "counterparty"],
+    )
+    bulk_insert(
+        get_engine(),
+        "risk_dirty_wallets",
+        touched[["wallet_address"]].drop_duplicates(),
+        conflict_columns=["wallet_address"],
+    )
+    first_seen = (
+        pd.DataFrame(
+            {
+                "wallet_address": df["wallet_address"],
+                "counterparty": counterparty,
+                "first_seen": pd.to_datetime(df["timestamp"], errors="coerce", utc=True),
+            }
+        )
+        .dropna()
+        .groupby(["wallet_address", "counterparty"], as_index=False)["first_seen"]
+        .min()
+    )
+    with get_engine().begin() as conn:
+        _write_counterparty_sketches(conn, counterparties, merge_existing=True)
+        if not first_seen.empty:
+            # Transfers loaded out of order (e.g. a backfill) can only move first_seen earlier.
+            conn.exec_driver_sql(
+                """
+                INSERT INTO counterparty_first_seen (wallet_address, counterparty, first_seen)
+                VALUES (?, ?, ?)
+                ON CONFLICT (wallet_address, counterparty) DO UPDATE SET
+                    first_seen = excluded.first_seen
+                WHERE excluded.first_seen < counterparty_first_seen.first_seen
+                """,
+                list(
+                    zip(
+                        first_seen["wallet_address"],
+                        first_seen["counterparty"],
+                        first_seen["first_seen"].dt.strftime("%Y-%m-%d %H:%M:%S.%f"),
+                    )
+                ),
+            )
+
+
+def _stored_sketches(conn, keys: pd.DataFrame) -> pd.DataFrame:
+    wallets = sorted(keys["wallet_address"].unique())
+    rows = []
+    for start in range(0, len(wallets), 500):
+        chunk = wallets[start:start + 500]
+        rows.extend(
+            conn.exec_driver_sql(
+                f"""
+                SELECT wallet_address, sketch_date, precision, registers
+                FROM wallet_counterparty_sketches
+                WHERE sketch_date >= ? AND wallet_address IN ({', '.join('?' for _ in chunk)})
+                """,
+                (keys["sketch_date"].min(), *chunk),
+            ).fetchall()
+        )
+    stored = pd.DataFrame(rows, columns=[*SKETCH_KEY, "precision", "registers"])
+    return stored.merge(keys, on=SKETCH_KEY)
+
+
+def _write_counterparty_sketches(conn, counterparties: pd.DataFrame, merge_existing: bool) -> None:
+    # Daily HyperLogLog sketches of each wallet's counterparties. Registers merge by
+    # max, so folding in transfers that were already loaded leaves a sketch unchanged.
+    if counterparties.empty:
+        return
+    fresh = pd.DataFrame(
+        {
+            "wallet_address": counterparties["wallet_address"].to_numpy(),
+            "sketch_date": counterparties["bucket_start"].str.slice(0, 10).to_numpy(),
+        }
+    )
+    registers = hll.registers(counterparties["counterparty"].reset_index(drop=True))
+    precision = hll.HLL_PRECISION
+    parts = []
+    if merge_existing:
+        stored = _stored_sketches(conn, fresh.drop_duplicates())
+        if not stored.empty:
+            # Sketches can only be folded down, so merge at the lowest stored precision.
+            precision = min(precision, int(stored["precision"].min()))
+            parts.append(hll.explode_sketches(stored, precision))
+    index, rank = hll.fold(
+        registers["index"].to_numpy(), registers["rank"].to_numpy(), hll.HLL_PRECISION, precision
+    )
+    parts.append(fresh.assign(index=index, rank=rank))
+    merged = (
+        pd.concat(parts, ignore_index=True)
+        .groupby([*SKETCH_KEY, "index"])["rank"]
+        .max()
+        .reset_index()
+    )
+    keys = merged[SKETCH_KEY]
+    starts = np.flatnonzero(keys.ne(keys.shift()).any(axis=1).to_numpy())
+    records = [
+        (wallet, day, precision, hll.encode(index, rank, precision))
+        for wallet, day, index, rank in zip(
+            keys["wallet_address"].to_numpy()[starts],
+            keys["sketch_date"].to_numpy()[starts],
+            np.split(merged["index"].to_numpy(), starts[1:]),
+            np.split(merged["rank"].to_numpy(), starts[1:]),
+        )
+    ]
+    conn.exec_driver_sql(
+        """
+        INSERT INTO wallet_counterparty_sketches (wallet_address, sketch_date, precision, registers)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (wallet_address, sketch_date) DO UPDATE SET
+            precision = excluded.precision,
+            registers = excluded.registers
+        """,
+        records,
+    )
+
+
+def rebuild_counterparty_sketches() -> None:
+    # Recomputes every sketch at HLL_PRECISION from the exact counterparty buckets,
+    # e.g. to backfill an existing database or raise the precision.
+    with get_engine().begin() as conn:
+        conn.exec_driver_sql("DELETE FROM wallet_counterparty_sketches")
+        wallets = [
+            row[0]
+            for row in conn.exec_driver_sql(
+                "SELECT DISTINCT wallet_address FROM wallet_counterparty_buckets ORDER BY wallet_address"
+            )
+        ]
+        for start in range(0, len(wallets), 500):
+            chunk = wallets[start:start + 500]
+            result = conn.exec_driver_sql(
+                f"""
+                SELECT wallet_address, bucket_start, counterparty
+                FROM wallet_counterparty_buckets
+                WHERE wallet_address IN ({', '.join('?' for _ in chunk)})
+                """,
+                tuple(chunk),
+            )
+            counterparties = pd.DataFrame(
+                result.fetchall(), columns=["wallet_address", "bucket_start", "counterparty"]
+            )
+            _write_counterparty_sketches(conn, counterparties, merge_existing=False)
+
+
+def get_watermark(address: str, category: str) -> Tuple[int, Optional[str]]:
+    with get_engine().connect() as conn:
+        row = conn.exec_driver_sql(
+            "SELECT last_block, last_tx_hash FROM ingest_watermarks WHERE address = ? AND category = ?",
+            (address.lower(), category),
+        ).fetchone()
+    if row is None or row[0] is None:
+        return 0, None
+    return int(row[0]), row[1]
+
+
+def drop_seen_transfers(df, wallet, last_block):
+    # The watermark block is re-requested (it may have been cut off mid-block),
+    # so drop the transfers from it that are already stored. Other internal or
+    # token transfers of a stored tx are new rows and are kept.
+    if df.empty or not last_block:
+        return df
+    with get_engine().connect() as conn:
+        seen = [
+            tuple(row)
+            for row in conn.exec_driver_sql(
+                """
+                SELECT tx_hash, category, log_index FROM transactions
+                WHERE wallet_address = ? AND block_number = ?
+                """,
+                (wallet.lower(), last_block),
+            )
+        ]
+    blocks = pd.to_numeric(df["block_number"], errors="coerce")
+    stored = pd.MultiIndex.from_frame(df[["tx_hash", "category", "log_index"]]).isin(seen)
+    keep = (blocks > last_block) | ~stored
+    return df[keep & ~(blocks < last_block)]
+
+
+def update_watermark(address: str, category: str, df) -> None:
+    if df.empty:
+        return
+    blocks = pd.to_numeric(df["block_number"], errors="coerce")
+    if blocks.isna().all():
+        return
+    last = df.loc[blocks.idxmax()]
+    with get_engine().begin() as conn:
+        conn.exec_driver_sql(
+            """
+            INSERT INTO ingest_watermarks (address, category, last_block, last_tx_hash, updated_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (address, category) DO UPDATE SET
+                last_block = excluded.last_block,
+                last_tx_hash = excluded.last_tx_hash,
+                updated_at = excluded.updated_at
+            WHERE excluded.last_block >= COALESCE(ingest_watermarks.last_block, 0)
+            """,
+            (address.lower(), category, int(blocks.max()), last["tx_hash"]),
+        )
@@ -0,0 +1,11 @@
+# Choices the CLI validates before anything else is imported. Keep this module
+# free of third-party imports so `main.py --help` does not load pandas.
+
+# "hll" reads unique counterparties from daily HyperLogLog sketches instead of COUNT(DISTINCT).
+COUNTERPARTY_MODES = ["exact", "hll"]
+REPORT_FORMATS = ["markdown", "html", "json"]
+# "parquet" mirrors transactions into PARQUET_DIR/transactions/date=YYYY-MM-DD/
+# after each load; SQLite stays the system of record for upserts and dedup.
+STORAGE_BACKENDS = ["sqlite", "parquet"]
+# Risk scores and case reports read the last 30 days from SQLite.
+MIN_RETAIN_DAYS = 31
@@ -0,0 +1,289 @@
+import os
+import shutil
+from datetime import date, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from src.etl.db import get_engine
+from src.etl.load import SECONDS_PER_DAY, TRANSFER_KEY, day_labels, day_start
+from src.etl.options import MIN_RETAIN_DAYS
+
+load_dotenv("src/config/.env")
+
+PARQUET_DIR = os.getenv("PARQUET_DIR", "data/parquet")
+EXPORT_CHUNK_ROWS = int(os.getenv("PARQUET_EXPORT_CHUNK_ROWS", "200000"))
+# Dirty dates further apart than this are exported with separate range scans.
+EXPORT_BATCH_DAYS = 31
+PARTITION_PREFIX = "date="
+# Archived months are compacted into one partition each; see archive_transactions.
+MONTH_PREFIX = "month="
+PARTITION_FILE = "part-0.parquet"
+# Fixed dtypes so every partition has the same Parquet schema, even when a
+# column is entirely null on a given day.
+TRANSACTION_DTYPES = {
+    "tx_hash": "string",
+    "wallet_address": "string",
+    "direction": "string",
+    "from_address": "string",
+    "to_address": "string",
+    "value_eth": "float64",
+    "block_number": "Int64",
+    "token_symbol": "string",
+    "token_value": "float64",
+    "is_contract_interaction": "boolean",
+    "category": "string",
+    "log_index": "int64",
+    "from_entity_id": "Int64",
+    "to_entity_id": "Int64",
+    "block_time": "Int64",
+    "value_wei": "string",
+    "token_value_raw": "string",
+    "token_decimals": "Int64",
+}
+TRANSACTION_COLUMNS = [*TRANSACTION_DTYPES, "timestamp"]
+
+
+def transactions_dir() -> str:
+    return os.path.join(PARQUET_DIR, "transactions")
+
+
+def _next_month(month: str) -> str:
+    year, number = int(month[:4]), int(month[5:7])
+    return f"{year + number // 12:04d}-{number % 12 + 1:02d}-01"
+
+
+def _partition_span(name: str) -> Optional[Tuple[str, str]]:
+    # [first day, day after last) covered by a partition directory.
+    if name.startswith(PARTITION_PREFIX):
+        day = name[len(PARTITION_PREFIX):]
+        return day, (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+    if name.startswith(MONTH_PREFIX):
+        month = name[len(MONTH_PREFIX):]
+        return f"{month}-01", _next_month(month)
+    return None
+
+
+def partition_files(start: Optional[str] = None, end: Optional[str] = None) -> List[str]:
+    # Partitions are pruned by directory name, so files outside [start, end) are never opened.
+    root = transactions_dir()
+    if not os.path.isdir(root):
+        return []
+    files = []
+    for name in sorted(os.listdir(root)):
+        span = _partition_span(name)
+        if span is None or (start and span[1] <= start[:10]) or (end and span[0] >= end):
+            continue
+        path = os.path.join(root, name, PARTITION_FILE)
+        if os.path.exists(path):
+            files.append(path)
+    return files
+
+
+def _write_partition(name: str, frame: pd.DataFrame) -> None:
+    directory = os.path.join(transactions_dir(), name)
+    os.makedirs(directory, exist_ok=True)
+    # reindex also fills columns that partitions written before them lack.
+    frame = frame.reindex(columns=TRANSACTION_COLUMNS).astype(TRANSACTION_DTYPES)
+    frame["timestamp"] = pd.to_datetime(frame["timestamp"], format="ISO8601")
+    # Replace atomically so a reader never sees a half-written partition.
+    tmp_path = os.path.join(directory, f"{PARTITION_FILE}.tmp")
+    frame.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, os.path.join(directory, PARTITION_FILE))
+
+
+def _date_batches(dates: Sequence[str]) -> List[List[str]]:
+    batches: List[List[str]] = []
+    for day in sorted(set(dates)):
+        if batches and date.fromisoformat(day) - date.fromisoformat(batches[-1][0]) < timedelta(days=EXPORT_BATCH_DAYS):
+            batches[-1].append(day)
+        else:
+            batches.append([day])
+    return batches
+
+
+def _export_range(cursor, start: Optional[str], end: Optional[str], keep: Optional[set]) -> set:
+    where = "WHERE block_time >= ? AND block_time < ?" if start else "WHERE block_time IS NOT NULL"
+    cursor.execute(
+        f"SELECT {', '.join(TRANSACTION_COLUMNS)} FROM transactions {where} ORDER BY block_time",
+        (day_start(start), day_start(end)) if start else (),
+    )
+    # Rows arrive in block_time order, so a day is complete once the next one starts.
+    written = set()
+    pending = pd.DataFrame(columns=TRANSACTION_COLUMNS)
+    while True:
+        rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+        chunk = pd.DataFrame(rows, columns=TRANSACTION_COLUMNS)
+        frame = pd.concat([pending, chunk], ignore_index=True) if not pending.empty else chunk
+        if frame.empty:
+            break
+        days = day_labels(frame["block_time"] // SECONDS_PER_DAY)
+        last_day = days.iloc[-1]
+        complete = days.ne(last_day) if rows else days.notna()
+        for day, group in frame[complete].groupby(days[complete], sort=False):
+            if keep is None or day in keep:
+                _write_partition(f"{PARTITION_PREFIX}{day}", group)
+                written.add(day)
+        pending = frame[~complete]
+        if not rows:
+            break
+    return written
+
+
+def _partition_names(prefix: str) -> List[str]:
+    root = transactions_dir()
+    return sorted(name for name in os.listdir(root) if name.startswith(prefix)) if os.path.isdir(root) else []
+
+
+def export_transaction_partitions(dates: Optional[Sequence[str]] = None) -> int:
+    # Rewrites whole day partitions from SQLite, so re-exporting a day is idempotent.
+    if dates is None:
+        # Archived months are only kept in their month= partitions, so a full
+        # export replaces the day partitions and leaves the archive alone.
+        for name in _partition_names(PARTITION_PREFIX):
+            shutil.rmtree(os.path.join(transactions_dir(), name))
+    written = 0
+    raw = get_engine().raw_connection()
+    try:
+        cursor = raw.cursor()
+        if dates is None:
+            written += len(_export_range(cursor, None, None, None))
+        for batch in _date_batches([value for value in dates or () if value]):
+            end = (date.fromisoformat(batch[-1]) + timedelta(days=1)).isoformat()
+            days = _export_range(cursor, batch[0], end, set(batch))
+            # A day that lost all its rows must not keep serving its old partition.
+            for day in set(batch) - days:
+                shutil.rmtree(os.path.join(transactions_dir(), f"{PARTITION_PREFIX}{day}"), ignore_errors=True)
+            written += len(days)
+        cursor.close()
+    finally:
+        raw.close()
+    archived = [_partition_span(name)[1] for name in _partition_names(MONTH_PREFIX)]
+    if dates is None and archived:
+        # After a --full-refresh reload, SQLite can hold archived months again;
+        # fold those days back into their month so no transfer is read twice.
+        compact_partitions(max(archived))
+    return written
+
+
+def archive_cutoff() -> Optional[str]:
+    with get_engine().connect() as conn:
+        row = conn.exec_driver_sql(
+            "SELECT archived_before FROM archive_watermarks WHERE table_name = 'transactions'"
+        ).fetchone()
+    return row[0] if row else None
+
+
+def stored_transaction_dates(end: Optional[str] = None) -> List[str]:
+    where = "block_time < ?" if end else "block_time IS NOT NULL"
+    with get_engine().connect() as conn:
+        rows = conn.exec_driver_sql(
+            f"SELECT DISTINCT block_time / {SECONDS_PER_DAY} FROM transactions WHERE {where} ORDER BY 1",
+            (day_start(end),) if end else (),
+        ).fetchall()
+    return day_labels([row[0] for row in rows]).tolist()
+
+
+def compact_partitions(before: str) -> int:
+    # Day partitions of months before the cutoff are merged into that month's
+    # partition, including days of late transfers loaded after it was archived.
+    root = transactions_dir()
+    months = {}
+    for name in sorted(os.listdir(root)) if os.path.isdir(root) else ():
+        span = _partition_span(name)
+        if name.startswith(PARTITION_PREFIX) and span[1] <= before:
+            months.setdefault(span[0][:7], []).append(os.path.join(root, name))
+    for month, directories in months.items():
+        name = f"{MONTH_PREFIX}{month}"
+        paths = [os.path.join(directory, PARTITION_FILE) for directory in directories]
+        archived = os.path.join(root, name, PARTITION_FILE)
+        if os.path.exists(archived):
+            paths.insert(0, archived)
+        frame = pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+        frame = frame.drop_duplicates(TRANSFER_KEY, keep="last").sort_values("timestamp", kind="stable")
+        _write_partition(name, frame)
+        for directory in directories:
+            shutil.rmtree(directory)
+    return len(months)
+
+
+def _swap_out_archived(conn, cutoff: str) -> None:
+    # Copying the kept rows and recreating the indexes costs one pass over what
+    # stays, while a DELETE updates every index once per removed row.
+    table_sql = conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'transactions'"
+    ).scalar()
+    index_sql = [
+        row[0]
+        for row in conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'transactions' AND sql IS NOT NULL"
+        )
+    ]
+    sequence = conn.exec_driver_sql("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'").scalar()
+    conn.exec_driver_sql("DROP TABLE IF EXISTS transactions_keep")
+    conn.exec_driver_sql(table_sql.replace("transactions", "transactions_keep", 1))
+    conn.exec_driver_sql(
+        # A sequential scan; the block_time index would fetch most rows one by one.
+        "INSERT INTO transactions_keep SELECT * FROM transactions NOT INDEXED "
+        "WHERE block_time >= ? OR block_time IS NULL",
+        (day_start(cutoff),),
+    )
+    conn.exec_driver_sql("DROP TABLE transactions")
+    conn.exec_driver_sql("ALTER TABLE transactions_keep RENAME TO transactions")
+    for sql in index_sql:
+        conn.exec_driver_sql(sql)
+    # New rows keep getting ids above every archived one.
+    conn.exec_driver_sql("UPDATE sqlite_sequence SET seq = ? WHERE name = 'transactions'", (sequence,))
+
+
+def archive_transactions(retain_days: int) -> Tuple[str, int, int]:
+    if retain_days < MIN_RETAIN_DAYS:
+        raise ValueError(f"Retention must keep at least {MIN_RETAIN_DAYS} days of transactions.")
+    # The cutoff is a month boundary, so every archived month is compacted whole.
+    cutoff = (date.today() - timedelta(days=retain_days)).replace(day=1).isoformat()
+    export_transaction_partitions(stored_transaction_dates(end=cutoff))
+    months = compact_partitions(cutoff)
+
+    with get_engine().begin() as conn:
+        # Wallets scored before the cutoff would otherwise miss the expiry of the
+        # buckets deleted below; rescoring them sees those buckets gone.
+        conn.exec_driver_sql(
+            """
+            INSERT INTO risk_dirty_wallets (wallet_address)
+            SELECT DISTINCT wallet_address FROM wallet_activity_buckets WHERE bucket_start < ?
+            ON CONFLICT (wallet_address) DO NOTHING
+            """,
+            (cutoff,),
+        )
+        conn.exec_driver_sql("DELETE FROM wallet_activity_buckets WHERE bucket_start < ?", (cutoff,))
+        conn.exec_driver_sql("DELETE FROM wallet_counterparty_buckets WHERE bucket_start < ?", (cutoff,))
+        conn.exec_driver_sql("DELETE FROM wallet_counterparty_sketches WHERE sketch_date < ?", (cutoff,))
+    with get_engine().connect() as conn:
+        deleted = conn.exec_driver_sql(
+            "SELECT COUNT(*) FROM transactions WHERE block_time < ?", (day_start(cutoff),)
+        ).scalar()
+        total = conn.exec_driver_sql("SELECT COUNT(*) FROM transactions").scalar()
+    if get_engine().dialect.name == "sqlite" and 2 * deleted > total:
+        with get_engine().begin() as conn:
+            _swap_out_archived(conn, cutoff)
+    else:
+        # One range delete per month keeps each write transaction small.
+        for month in sorted({value[:7] for value in stored_transaction_dates(end=cutoff)}):
+            with get_engine().begin() as conn:
+                conn.exec_driver_sql(
+                    "DELETE FROM transactions WHERE block_time >= ? AND block_time < ?",
+                    (day_start(f"{month}-01"), day_start(_next_month(month))),
+                )
+    with get_engine().begin() as conn:
+        conn.exec_driver_sql(
+            """
+            INSERT INTO archive_watermarks (table_name, archived_before) VALUES ('transactions', ?)
+            ON CONFLICT (table_name) DO UPDATE SET
+                archived_before = excluded.archived_before,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE excluded.archived_before > archive_watermarks.archived_before
+            """,
+            (cutoff,),
+        )
+    return cutoff, deleted, months
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from contextlib import nullcontext
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+import requests
+from dotenv import load_dotenv
+
+load_dotenv("src/config/.env")
+
+# Alchemy meters throughput in compute units per second; Etherscan in calls per second.
+PROVIDER_RATES = {
+    "alchemy": float(os.getenv("ALCHEMY_CU_PER_SECOND", "330")),
+    "etherscan": float(os.getenv("ETHERSCAN_CALLS_PER_SECOND", "5")),
+}
+ALCHEMY_COMPUTE_UNITS = {
+    "alchemy_getAssetTransfers": 150,
+    "eth_getCode": 26,
+}
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "5"))
+BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "30"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, cost: float = 1.0) -> float:
+        # Take the tokens now (possibly going negative) and return how long the
+        # caller must wait, so concurrent callers queue up in arrival order.
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= cost
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, cost: float = 1.0) -> None:
+        wait = self.reserve(cost)
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self, cost: float = 1.0) -> None:
+        wait = self.reserve(cost)
+        if wait:
+            await asyncio.sleep(wait)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+_session = requests.Session()
+
+
+def get_bucket(provider: str) -> TokenBucket:
+    with _buckets_lock:
+        if provider not in _buckets:
+            _buckets[provider] = TokenBucket(PROVIDER_RATES.get(provider, 0.0))
+        return _buckets[provider]
+
+
+def compute_units(method: str) -> float:
+    return float(ALCHEMY_COMPUTE_UNITS.get(method, 26))
+
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    server_delay = _retry_after_seconds(retry_after)
+    if server_delay is not None:
+        return min(server_delay, BACKOFF_MAX)
+    # Full jitter keeps retrying workers from hammering the provider in lockstep.
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def request(
+    provider: str,
+    method: str,
+    url: str,
+    cost: float = 1.0,
+    retry_if: Optional[Callable[[requests.Response], bool]] = None,
+    **kwargs,
+) -> requests.Response:
+    bucket = get_bucket(provider)
+    for attempt in range(MAX_RETRIES + 1):
+        bucket.acquire(cost)
+        try:
+            resp = _session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(backoff_delay(attempt))
+            continue
+        retryable = resp.status_code in RETRY_STATUSES or (retry_if is not None and retry_if(resp))
+        # Once attempts run out the last response goes back as-is, so callers see the real status.
+        if not retryable or attempt == MAX_RETRIES:
+            return resp
+        time.sleep(backoff_delay(attempt, resp.headers.get("Retry-After")))
+
+
+async def post_json_async(session, provider: str, url: str, payload, cost: float = 1.0, semaphore=None):
+    import aiohttp
+
+    bucket = get_bucket(provider)
+    for attempt in range(MAX_RETRIES + 1):
+        await bucket.acquire_async(cost)
+        try:
+            async with semaphore or nullcontext():
+                async with session.post(url, json=payload) as resp:
+                    # Once attempts run out the last error status is raised as-is.
+                    if resp.status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                        resp.raise_for_status()
+                        return await resp.json(content_type=None)
+                    delay = backoff_delay(attempt, resp.headers.get("Retry-After"))
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+        await asyncio.sleep(delay)
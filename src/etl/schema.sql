@@ -17,9 +17,26 @@ CREATE TABLE IF NOT EXISTS transactions (
     timestamp TEXT,
     token_symbol TEXT,
     token_value REAL,
-    is_contract_interaction BOOLEAN
+    is_contract_interaction BOOLEAN,
+    category TEXT NOT NULL DEFAULT 'external',
+    log_index INTEGER NOT NULL DEFAULT 0,
+    from_entity_id INTEGER,
+    to_entity_id INTEGER,
+    block_time INTEGER,
+    value_wei TEXT,
+    token_value_raw TEXT,
+    token_decimals INTEGER
 );
 
+CREATE UNIQUE INDEX IF NOT EXISTS uq_transactions_transfer
+    ON transactions (tx_hash, category, log_index, wallet_address);
+
+CREATE INDEX IF NOT EXISTS idx_transactions_wallet_block_time ON transactions (wallet_address, block_time);
+CREATE INDEX IF NOT EXISTS idx_transactions_from_address ON transactions (from_address);
+CREATE INDEX IF NOT EXISTS idx_transactions_to_address ON transactions (to_address);
+CREATE INDEX IF NOT EXISTS idx_transactions_tx_hash ON transactions (tx_hash);
+CREATE INDEX IF NOT EXISTS idx_transactions_block_time ON transactions (block_time);
+
 CREATE TABLE IF NOT EXISTS risk_metrics (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     wallet_address TEXT,
@@ -27,14 +44,23 @@ CREATE TABLE IF NOT EXISTS risk_metrics (
     tx_count_30d INTEGER,
     volume_30d REAL,
     unique_counterparties_30d INTEGER,
+    new_counterparties_30d INTEGER,
     contract_interactions_30d INTEGER,
     avg_tx_size REAL,
+    tx_count_1h INTEGER,
+    volume_1h REAL,
+    tx_count_24h INTEGER,
+    volume_24h REAL,
+    tx_count_7d INTEGER,
+    volume_7d REAL,
     risk_score REAL,
     reason_velocity REAL,
     reason_new_counterparties REAL,
     reason_contract_interactions REAL
 );
 
+CREATE INDEX IF NOT EXISTS idx_risk_metrics_wallet_date ON risk_metrics (wallet_address, as_of_date);
+
 CREATE TABLE IF NOT EXISTS risk_events (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     wallet_address TEXT,
@@ -44,6 +70,8 @@ CREATE TABLE IF NOT EXISTS risk_events (
     details TEXT
 );
 
+CREATE INDEX IF NOT EXISTS idx_risk_events_wallet_time ON risk_events (wallet_address, event_time);
+
 CREATE TABLE IF NOT EXISTS entities (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     address TEXT UNIQUE,
@@ -62,6 +90,18 @@ CREATE TABLE IF NOT EXISTS daily_metrics (
     value REAL
 );
 
+CREATE UNIQUE INDEX IF NOT EXISTS uq_daily_metrics_partition ON daily_metrics (
+    metric_date,
+    metric_name,
+    COALESCE(entity_type, ''),
+    COALESCE(entity_label, ''),
+    COALESCE(asset_symbol, '')
+);
+
+CREATE TABLE IF NOT EXISTS daily_metrics_dirty (
+    metric_date TEXT PRIMARY KEY
+);
+
 CREATE TABLE IF NOT EXISTS audit_table (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     wallet_address TEXT,
@@ -71,3 +111,98 @@ CREATE TABLE IF NOT EXISTS audit_table (
     pipeline_version TEXT,
     created_at TEXT DEFAULT CURRENT_TIMESTAMP
 );
+
+CREATE TABLE IF NOT EXISTS archive_watermarks (
+    table_name TEXT PRIMARY KEY,
+    archived_before TEXT NOT NULL,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS ingest_watermarks (
+    address TEXT NOT NULL,
+    category TEXT NOT NULL,
+    last_block INTEGER,
+    last_tx_hash TEXT,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (address, category)
+);
+
+CREATE TABLE IF NOT EXISTS address_classifications (
+    address TEXT PRIMARY KEY,
+    is_contract BOOLEAN NOT NULL,
+    checked_at INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS wallet_activity_buckets (
+    wallet_address TEXT NOT NULL,
+    bucket_start TEXT NOT NULL,
+    tx_count INTEGER NOT NULL,
+    volume_eth REAL,
+    value_count INTEGER NOT NULL,
+    contract_interactions INTEGER NOT NULL,
+    PRIMARY KEY (wallet_address, bucket_start)
+);
+
+CREATE INDEX IF NOT EXISTS idx_wallet_activity_buckets_start ON wallet_activity_buckets (bucket_start);
+
+CREATE TABLE IF NOT EXISTS wallet_counterparty_buckets (
+    wallet_address TEXT NOT NULL,
+    bucket_start TEXT NOT NULL,
+    counterparty TEXT NOT NULL,
+    PRIMARY KEY (wallet_address, bucket_start, counterparty)
+);
+
+CREATE TABLE IF NOT EXISTS wallet_counterparty_sketches (
+    wallet_address TEXT NOT NULL,
+    sketch_date TEXT NOT NULL,
+    precision INTEGER NOT NULL,
+    registers BLOB NOT NULL,
+    PRIMARY KEY (wallet_address, sketch_date)
+);
+
+CREATE TABLE IF NOT EXISTS counterparty_first_seen (
+    wallet_address TEXT NOT NULL,
+    counterparty TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    PRIMARY KEY (wallet_address, counterparty)
+);
+
+CREATE INDEX IF NOT EXISTS idx_counterparty_first_seen_time ON counterparty_first_seen (first_seen);
+
+CREATE TABLE IF NOT EXISTS wallet_risk_state (
+    wallet_address TEXT PRIMARY KEY,
+    window_start TEXT NOT NULL,
+    tx_count_30d INTEGER,
+    volume_30d REAL,
+    unique_counterparties_30d INTEGER,
+    new_counterparties_30d INTEGER,
+    contract_interactions_30d INTEGER,
+    avg_tx_size REAL,
+    tx_count_1h INTEGER,
+    volume_1h REAL,
+    tx_count_24h INTEGER,
+    volume_24h REAL,
+    tx_count_7d INTEGER,
+    volume_7d REAL,
+    risk_score REAL,
+    reason_velocity REAL,
+    reason_new_counterparties REAL,
+    reason_contract_interactions REAL,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_wallet_risk_state_score ON wallet_risk_state (risk_score);
+
+CREATE TABLE IF NOT EXISTS risk_population_stats (
+    feature TEXT PRIMARY KEY,
+    n INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    m2 REAL NOT NULL,
+    scored_n INTEGER,
+    scored_mean REAL,
+    scored_m2 REAL
+);
+
+CREATE TABLE IF NOT EXISTS risk_dirty_wallets (
+    wallet_address TEXT PRIMARY KEY
+);
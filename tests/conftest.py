@@ -0,0 +1,42 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.etl import db
+from src.etl.load import epoch_seconds
+
+SCHEMA = "src/etl/schema.sql"
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    path = tmp_path / "onchain.db"
+    with sqlite3.connect(path) as conn, open(SCHEMA, encoding="utf-8") as handle:
+        conn.executescript(handle.read())
+    monkeypatch.setenv("DB_URL", f"sqlite:///{path}")
+    monkeypatch.setattr(db, "_engine", None)
+    yield db.get_engine()
+    db.get_engine().dispose()
+
+
+@pytest.fixture
+def transfers():
+    def make(rows):
+        # rows: (tx_hash, wallet_address, counterparty, value_eth, timestamp) for outbound ETH transfers.
+        df = pd.DataFrame(rows, columns=["tx_hash", "wallet_address", "to_address", "value_eth", "timestamp"])
+        df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+        return df.assign(
+            direction="out",
+            from_address=df["wallet_address"],
+            block_number=range(1, len(df) + 1),
+            block_time=epoch_seconds(df["timestamp"]),
+            token_symbol=None,
+            token_value=np.nan,
+            is_contract_interaction=False,
+            category="external",
+            log_index=0,
+        )
+
+    return make
@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+# main.py keeps pandas, SQLAlchemy and the HTTP clients out of its top-level
+# imports so --help and argument errors return in tens of milliseconds.
+HEAVY_MODULES = ["pandas", "numpy", "sqlalchemy", "requests", "aiohttp", "duckdb", "pyarrow"]
+PROBE = """
+import runpy, sys
+sys.argv = ["main.py", *sys.argv[1:]]
+try:
+    runpy.run_path("main.py", run_name="__main__")
+except SystemExit:
+    pass
+print("loaded:" + ",".join(name for name in {modules!r} if name in sys.modules))
+"""
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _loaded_modules(*args):
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(modules=HEAVY_MODULES), *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    loaded = result.stdout.rsplit("loaded:", 1)[1].strip()
+    return loaded.split(",") if loaded else []
+
+
+def test_help_does_not_import_heavy_modules():
+    assert _loaded_modules("--help") == []
+
+
+def test_argument_errors_do_not_import_heavy_modules():
+    assert _loaded_modules("0xabc", "--retain-days", "5") == []
@@ -0,0 +1,39 @@
+import pandas as pd
+import requests
+
+from src.etl import enrich
+from src.etl.contract_cache import contract_cache
+from src.etl.load import load_transactions
+
+ADDRESSES = [f"0x{index:040x}" for index in range(1, 6)]
+
+
+def test_failed_code_batch_leaves_flags_unknown(engine, monkeypatch, capsys):
+    def get_code_batch(addresses):
+        if ADDRESSES[2] in addresses:
+            raise requests.HTTPError("503 Server Error")
+        return {address: address == ADDRESSES[0] for address in addresses}
+
+    monkeypatch.setattr(enrich, "ALCHEMY_URL", "http://stub")
+    monkeypatch.setattr(enrich, "CONTRACT_BATCH_SIZE", 2)
+    monkeypatch.setattr(enrich, "_get_code_batch", get_code_batch)
+    monkeypatch.setattr(contract_cache, "_memory", type(contract_cache._memory)())
+
+    df = pd.DataFrame({"to_address": ADDRESSES})
+    flags = enrich.add_contract_flags(df)["is_contract_interaction"].tolist()
+
+    # ADDRESSES[2:4] share the failed batch; they stay unknown and uncached for a retry.
+    assert flags == [True, False, None, None, False]
+    assert contract_cache.get_many(ADDRESSES[2:4]) == {}
+    assert "eth_getCode batch of 2 addresses failed" in capsys.readouterr().out
+
+
+def test_full_refresh_forgets_stored_counterparties(engine, transfers, monkeypatch):
+    monkeypatch.setattr(contract_cache, "_memory", type(contract_cache._memory)())
+    contract_cache.put_many({ADDRESSES[0]: True, ADDRESSES[1]: False})
+    load_transactions(transfers([("0xaa", ADDRESSES[4], ADDRESSES[0], 1.0, "2023-11-14")]))
+
+    enrich.forget_stored_counterparties()
+
+    # Only the reloaded counterparty is re-checked; other classifications stay cached.
+    assert contract_cache.get_many(ADDRESSES[:2]) == {ADDRESSES[1]: False}
@@ -0,0 +1,48 @@
+from src.etl.entities import load_entities
+
+HOT = "0x00000000000000000000000000000000000000aa"
+COLD = "0x00000000000000000000000000000000000000bb"
+
+
+def _write_csv(path, rows):
+    lines = ["address,label,entity_type", *(",".join(row) for row in rows)]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def _dirty_dates(engine):
+    with engine.connect() as conn:
+        return [row[0] for row in conn.exec_driver_sql("SELECT metric_date FROM daily_metrics_dirty ORDER BY 1")]
+
+
+def _seed_transactions(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO transactions (tx_hash, wallet_address, from_address, to_address, block_time) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [("0x1", HOT, HOT, COLD, 1_700_000_000), ("0x2", HOT, COLD, HOT, 1_700_100_000)],
+        )
+
+
+def test_identical_reload_marks_nothing_dirty(engine, tmp_path):
+    csv_path = tmp_path / "entities.csv"
+    _write_csv(csv_path, [(HOT, "Hot wallet", "exchange_hot"), (COLD, "", "")])
+    _seed_transactions(engine)
+    load_entities(str(csv_path))
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM daily_metrics_dirty")
+
+    assert load_entities(str(csv_path)) == 2
+    assert _dirty_dates(engine) == []
+
+
+def test_changed_label_marks_dates_dirty(engine, tmp_path):
+    csv_path = tmp_path / "entities.csv"
+    _write_csv(csv_path, [(HOT, "Hot wallet", "exchange_hot"), (COLD, "", "")])
+    _seed_transactions(engine)
+    load_entities(str(csv_path))
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM daily_metrics_dirty")
+
+    _write_csv(csv_path, [(HOT, "Hot wallet 2", "exchange_hot"), (COLD, "", "")])
+    load_entities(str(csv_path))
+    assert _dirty_dates(engine) == ["2023-11-14", "2023-11-16"]
@@ -0,0 +1,173 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+from src.etl import async_fetch, fetch, ratelimit
+
+WALLET = "0x00000000000000000000000000000000000000aa"
+OTHER = "0x00000000000000000000000000000000000000bb"
+
+
+def _transfer(unique_id, sender, receiver, value, category="internal", block=16):
+    return {
+        "uniqueId": unique_id,
+        "hash": unique_id.split(":")[0],
+        "from": sender,
+        "to": receiver,
+        "value": value,
+        "blockNum": hex(block),
+        "category": category,
+        "asset": "ETH",
+        "rawContract": {"value": hex(int(value * 10**18)), "address": None, "decimal": "0x12"},
+        "metadata": {"blockTimestamp": "2024-01-01T00:00:00.000Z"},
+    }
+
+
+# Two internal transfers in one tx with the same counterparty and amount, and
+# a self-transfer that both the outbound and inbound queries return.
+OUTBOUND = [
+    _transfer("0x01:internal:0", WALLET, OTHER, 1.0),
+    _transfer("0x01:internal:1", WALLET, OTHER, 1.0),
+    _transfer("0x02:external", WALLET, WALLET, 2.0, "external"),
+]
+INBOUND = [
+    _transfer("0x02:external", WALLET, WALLET, 2.0, "external"),
+    _transfer("0x03:external", OTHER, WALLET, 3.0, "external"),
+]
+
+
+def _result(params):
+    return {"transfers": OUTBOUND if "fromAddress" in params else INBOUND}
+
+
+def _page(prefix, sender, receiver, blocks):
+    return [_transfer(f"0x{prefix}{block}:external", sender, receiver, 1.0, "external", block) for block in blocks]
+
+
+# Outbound history is dense (three pages), inbound sparse (two pages reaching far higher blocks).
+PAGED = {
+    ("fromAddress", None): (_page(1, WALLET, OTHER, (1, 2, 3)), "o2"),
+    ("fromAddress", "o2"): (_page(1, WALLET, OTHER, (4, 5, 6)), "o3"),
+    ("fromAddress", "o3"): (_page(1, WALLET, OTHER, (7, 8, 9)), None),
+    ("toAddress", None): (_page(2, OTHER, WALLET, (2, 50)), "i2"),
+    ("toAddress", "i2"): (_page(2, OTHER, WALLET, (60,)), None),
+}
+
+
+def _paged_result(params):
+    direction = "fromAddress" if "fromAddress" in params else "toAddress"
+    transfers, page_key = PAGED[(direction, params.get("pageKey"))]
+    return {"transfers": transfers, **({"pageKey": page_key} if page_key else {})}
+
+
+class _Response:
+    status = 200
+    headers = {}
+
+    def __init__(self, result):
+        self._result = result
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    async def json(self, content_type=None):
+        return {"jsonrpc": "2.0", "id": 1, "result": self._result}
+
+
+class _Session:
+    def __init__(self, respond):
+        self.respond = respond
+        self.calls = 0
+
+    def post(self, url, json):
+        self.calls += 1
+        return _Response(self.respond(json["params"][0]))
+
+
+@pytest.fixture
+def alchemy(monkeypatch):
+    monkeypatch.setattr(fetch, "ALCHEMY_URL", "http://stub")
+    monkeypatch.setattr(async_fetch, "ALCHEMY_URL", "http://stub")
+    monkeypatch.setitem(ratelimit._buckets, "alchemy", ratelimit.TokenBucket(0))
+
+    def use(respond):
+        monkeypatch.setattr(fetch, "_alchemy_request", respond)
+        return _Session(respond)
+
+    return use
+
+
+def _fetch_async(session, **kwargs):
+    return asyncio.run(async_fetch.fetch_wallet_txs_async(session, asyncio.Semaphore(4), WALLET, **kwargs))
+
+
+def test_async_wallet_fetch_matches_sync_path(alchemy):
+    session = alchemy(_result)
+    async_df = _fetch_async(session)
+    sync_df = fetch.fetch_wallet_txs(WALLET)
+
+    assert session.calls == 2
+    assert list(async_df["log_index"]) == [0, 1, 0, 0]
+    assert list(async_df["hash"]) == ["0x01", "0x01", "0x02", "0x03"]
+    pd.testing.assert_frame_equal(async_df, sync_df)
+
+
+@pytest.mark.parametrize(
+    "max_pages, blocks",
+    [
+        # Both directions stop early; nothing past outbound's block 3 is kept.
+        (1, [1, 2, 2, 3]),
+        # Inbound is complete, outbound stops at block 6, so inbound's 50 and 60 wait for the next run.
+        (2, [1, 2, 2, 3, 4, 5, 6]),
+        (0, [1, 2, 2, 3, 4, 5, 6, 7, 8, 9, 50, 60]),
+    ],
+)
+def test_truncated_direction_caps_both_streams(alchemy, max_pages, blocks):
+    session = alchemy(_paged_result)
+    sync_df = fetch.fetch_wallet_txs(WALLET, max_pages=max_pages)
+    async_df = _fetch_async(session, max_pages=max_pages)
+
+    for df in (sync_df, async_df):
+        assert sorted(int(block, 16) for block in df["blockNumber"]) == blocks
+
+
+def _etherscan_rows(blocks):
+    return [
+        {"hash": f"0x{block:02d}{index}", "blockNumber": str(block), "timeStamp": "1700000000"}
+        for index, block in enumerate(blocks)
+    ]
+
+
+# Block 4 spans the last two pages of the first window; block 7 spans the second window's end.
+ETHERSCAN_ROWS = _etherscan_rows([1, 2, 3, 4, 4, 4, 5, 5, 6, 7, 7, 7, 7, 8, 9])
+
+
+def _etherscan_request(params):
+    # Mimics txlist: a block range, then page * offset must stay inside the result window.
+    assert params["page"] * params["offset"] <= fetch.ETHERSCAN_RESULT_WINDOW
+    start, end = int(params["startblock"]), int(params["endblock"])
+    rows = [row for row in ETHERSCAN_ROWS if start <= int(row["blockNumber"]) <= end]
+    if params["sort"] == "desc":
+        rows = rows[::-1]
+    first = (params["page"] - 1) * params["offset"]
+    return rows[first:first + params["offset"]]
+
+
+@pytest.mark.parametrize("from_block", [0, 1])
+def test_etherscan_paging_restarts_at_the_result_window(monkeypatch, from_block):
+    monkeypatch.setattr(fetch, "ETHERSCAN_API_KEY", "key")
+    monkeypatch.setattr(fetch, "ETHERSCAN_RESULT_WINDOW", 6)
+    monkeypatch.setattr(fetch, "_etherscan_request", _etherscan_request)
+
+    pages = list(fetch._iter_wallet_txs_etherscan(WALLET, max_count=2, from_block=from_block))
+    hashes = [tx_hash for page in pages for tx_hash in page["hash"]]
+
+    assert len(hashes) == len(set(hashes))
+    assert sorted(hashes) == sorted(row["hash"] for row in ETHERSCAN_ROWS)
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.etl import hll
+
+
+def _addresses(start, stop):
+    return pd.Series([f"0x{value:040x}" for value in range(start, stop)])
+
+
+def _sketch(values, precision, key="wallet"):
+    return hll.registers(values, precision).assign(wallet=key)
+
+
+def _estimate(registers, precision):
+    return hll.estimate(registers, "wallet", precision).iloc[0]
+
+
+@pytest.mark.parametrize("count", [100, 5_000, 100_000])
+def test_estimate_is_within_a_few_percent(count):
+    # p=12 has a standard error of about 1.6%.
+    estimate = _estimate(_sketch(_addresses(0, count), 12), 12)
+    assert estimate == pytest.approx(count, rel=0.05)
+
+
+def test_merged_sketches_estimate_the_union():
+    left, right = _addresses(0, 30_000), _addresses(20_000, 50_000)
+    sketches = []
+    for values in (left, right):
+        registers = _sketch(values, 12)
+        blob = hll.encode(registers["index"].to_numpy(), registers["rank"].to_numpy(), 12)
+        sketches.append({"wallet": "w", "precision": 12, "registers": blob})
+    merged = hll.explode_sketches(pd.DataFrame(sketches), 12)
+
+    union = _sketch(pd.concat([left, right], ignore_index=True), 12)
+    assert _estimate(merged, 12) == _estimate(union, 12)
+    assert _estimate(merged, 12) == pytest.approx(50_000, rel=0.05)
+
+
+def test_folded_sketch_matches_a_lower_precision_sketch():
+    values = _addresses(0, 40_000)
+    high = _sketch(values, 14)
+    index, rank = hll.fold(high["index"].to_numpy(), high["rank"].to_numpy(), 14, 10)
+    folded = pd.DataFrame({"wallet": "wallet", "index": index, "rank": rank})
+
+    direct = _sketch(values, 10)
+    pd.testing.assert_series_equal(
+        folded.groupby("index")["rank"].max(),
+        direct.groupby("index")["rank"].max(),
+    )
+    # p=10 has a standard error of about 3.3%.
+    assert _estimate(folded, 10) == pytest.approx(40_000, rel=0.1)
+
+
+def test_sparse_and_dense_blobs_round_trip():
+    for count in (10, 20_000):
+        registers = _sketch(_addresses(0, count), 12)
+        blob = hll.encode(registers["index"].to_numpy(), registers["rank"].to_numpy(), 12)
+        index, rank = hll.decode(blob, 12)
+        decoded = pd.Series(rank, index=index).groupby(level=0).max()
+        expected = registers.groupby("index")["rank"].max()
+        assert np.array_equal(decoded.index, expected.index)
+        assert np.array_equal(decoded.to_numpy(), expected.to_numpy())
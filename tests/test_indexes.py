@@ -0,0 +1,39 @@
+import pytest
+
+WALLET = "0x00000000000000000000000000000000000000aa"
+
+# (lookup, index it must search) for the wallet and counterparty filters that
+# migration 005 indexed; block_time replaced timestamp in migration 014.
+LOOKUPS = [
+    (
+        "SELECT * FROM transactions WHERE wallet_address = ? AND block_time >= ?",
+        (WALLET, 0),
+        "idx_transactions_wallet_block_time",
+    ),
+    (
+        "SELECT tx_hash, category, log_index FROM transactions WHERE wallet_address = ? AND block_number = ?",
+        (WALLET, 1),
+        "idx_transactions_wallet_block_time",
+    ),
+    ("SELECT * FROM transactions WHERE from_address = ?", (WALLET,), "idx_transactions_from_address"),
+    ("SELECT * FROM transactions WHERE to_address = ?", (WALLET,), "idx_transactions_to_address"),
+    ("SELECT * FROM transactions WHERE tx_hash = ?", ("0x1",), "idx_transactions_tx_hash"),
+    (
+        "SELECT * FROM risk_metrics WHERE wallet_address = ? ORDER BY as_of_date DESC LIMIT 1",
+        (WALLET,),
+        "idx_risk_metrics_wallet_date",
+    ),
+    (
+        "SELECT * FROM risk_events WHERE wallet_address = ? ORDER BY event_time DESC",
+        (WALLET,),
+        "idx_risk_events_wallet_time",
+    ),
+]
+
+
+@pytest.mark.parametrize("query, params, index", LOOKUPS)
+def test_address_lookups_search_their_index(engine, query, params, index):
+    with engine.connect() as conn:
+        plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {query}", params)]
+    assert any(f"USING INDEX {index}" in step for step in plan), plan
+    assert not any(step.startswith("SCAN") for step in plan), plan
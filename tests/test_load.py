@@ -0,0 +1,33 @@
+from src.etl.load import drop_seen_transfers, load_transactions
+
+WALLET = "0x00000000000000000000000000000000000000aa"
+OTHER = "0x00000000000000000000000000000000000000bb"
+
+
+def test_drop_seen_transfers_matches_the_full_transfer_key(engine, transfers):
+    stored = transfers([("0xa", WALLET, OTHER, 1.0, "2024-01-01")]).assign(block_number=10, category="internal")
+    load_transactions(stored, entity_ids={})
+
+    incoming = transfers(
+        [
+            ("0x9", WALLET, OTHER, 1.0, "2024-01-01"),
+            ("0xa", WALLET, OTHER, 1.0, "2024-01-01"),
+            ("0xa", WALLET, OTHER, 1.0, "2024-01-01"),
+            ("0xa", WALLET, OTHER, 1.0, "2024-01-01"),
+            ("0xb", WALLET, OTHER, 1.0, "2024-01-01"),
+        ]
+    ).assign(
+        block_number=[9, 10, 10, 10, 11],
+        category=["external", "internal", "internal", "erc20", "external"],
+        log_index=[0, 0, 1, 5, 0],
+    )
+    kept = drop_seen_transfers(incoming, WALLET, 10)
+
+    # Block 9 precedes the watermark and (0xa, internal, 0) is already stored; the
+    # tx's other internal transfer and its token log are new.
+    assert list(zip(kept["tx_hash"], kept["category"], kept["log_index"])) == [
+        ("0xa", "internal", 1),
+        ("0xa", "erc20", 5),
+        ("0xb", "external", 0),
+    ]
+    assert list(drop_seen_transfers(incoming, WALLET, 11)["tx_hash"]) == ["0xb"]
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics.metrics import DELTA_METRIC, ZERO_ADDRESS, daily_metrics_from, restrict_to_partitions
+from src.etl.entities import load_entities
+from src.etl.load import load_transactions
+
+EXCHANGE = "0x" + "e1" * 20
+FUND = "0x" + "f1" * 20
+STABLECOIN = "0x" + "5c" * 20
+OUTSIDER = "0x" + "0a" * 20
+
+
+def _row_by_row(entity_df, large_df, stable_df, exchange_df):
+    # The per-row dict build daily_metrics_from used before melt_metrics.
+    metrics = []
+
+    def add(row, name, value, entity_type, entity_label, asset_symbol):
+        metrics.append({
+            "metric_date": row["metric_date"],
+            "metric_name": name,
+            "entity_type": entity_type,
+            "entity_label": entity_label,
+            "asset_symbol": asset_symbol,
+            "value": value,
+        })
+
+    for _, row in entity_df.iterrows():
+        for name in ("inflow", "outflow", "net_flow"):
+            add(row, name, row[name], row["entity_type"], row["entity_label"], "ETH")
+    for _, row in large_df.iterrows():
+        for name in ("large_tx_count", "large_tx_volume"):
+            add(row, name, row[name], None, None, "ETH")
+    if not stable_df.empty:
+        stable_df = stable_df.sort_values("metric_date")
+        for _, row in stable_df.iterrows():
+            values = {
+                "tokens_minted": row["minted"],
+                "tokens_burned": row["burned"],
+                "net_flow_to_exchanges": row["to_exchanges"] - row["from_exchanges"],
+                "transfer_count": row["transfer_count"],
+            }
+            for name, value in values.items():
+                add(row, name, value, row["entity_type"], row["entity_label"], row["asset_symbol"])
+        stable_df = stable_df.copy()
+        stable_df["transfer_count_7d_avg"] = (
+            stable_df.groupby(["entity_label", "asset_symbol"])["transfer_count"]
+            .rolling(7, min_periods=2)
+            .mean()
+            .shift(1)
+            .reset_index(level=[0, 1], drop=True)
+        )
+        stable_df[DELTA_METRIC] = stable_df["transfer_count"] - stable_df["transfer_count_7d_avg"]
+        for _, row in stable_df.dropna(subset=[DELTA_METRIC]).iterrows():
+            add(row, DELTA_METRIC, row[DELTA_METRIC], row["entity_type"], row["entity_label"], row["asset_symbol"])
+    for _, row in exchange_df.iterrows():
+        values = {
+            "exchange_deposits": row["deposits"],
+            "exchange_withdrawals": row["withdrawals"],
+            "exchange_net_flow": row["deposits"] - row["withdrawals"],
+        }
+        for name, value in values.items():
+            add(row, name, value, "exchange", row["exchange_label"], row["asset_symbol"])
+    return pd.DataFrame(metrics)
+
+
+@pytest.fixture
+def history(engine, tmp_path, transfers):
+    csv_path = tmp_path / "entities.csv"
+    csv_path.write_text(
+        "address,label,entity_type\n"
+        f"{EXCHANGE},Exchange A,exchange\n{FUND},Fund B,fund\n{STABLECOIN},USD Coin,stablecoin\n",
+        encoding="utf-8",
+    )
+    load_entities(str(csv_path))
+    rng = np.random.default_rng(0)
+    days = pd.date_range("2025-01-01", periods=12, freq="D", tz="UTC")
+    eth = [
+        (f"0x{day:02x}{n:02x}", wallet, counterparty, float(rng.choice([0.5, 40.0, 2500.0])), days[day])
+        for day in range(len(days))
+        for n, (wallet, counterparty) in enumerate([(FUND, EXCHANGE), (EXCHANGE, OUTSIDER), (OUTSIDER, FUND)])
+    ]
+    load_transactions(transfers(eth))
+    # Mints, burns and exchange transfers on the stablecoin wallet, a varying count per day.
+    tokens = [
+        (f"0x{day:02x}ff", STABLECOIN, from_address, to_address, float(rng.integers(1, 1000)), days[day], n)
+        for day in range(len(days))
+        for n, (from_address, to_address) in enumerate(
+            [(ZERO_ADDRESS, OUTSIDER), (OUTSIDER, ZERO_ADDRESS), (OUTSIDER, EXCHANGE), (EXCHANGE, FUND)][: 1 + day % 4]
+        )
+    ]
+    token_df = transfers([(tx_hash, wallet, to_address, np.nan, ts) for tx_hash, wallet, _, to_address, _, ts, _ in tokens])
+    load_transactions(token_df.assign(
+        direction=None,
+        from_address=[row[2] for row in tokens],
+        token_symbol="USDC",
+        token_value=[row[4] for row in tokens],
+        category="erc20",
+        log_index=[row[6] for row in tokens],
+    ))
+
+
+@pytest.mark.parametrize("dates", [None, ["2025-01-05", "2025-01-06"]])
+def test_melted_metrics_match_the_row_by_row_build(engine, history, dates):
+    frames = []
+
+    def read_sql(query, params):
+        frame = pd.read_sql(query, engine, params=params)
+        frames.append(frame.copy())
+        return frame
+
+    result = daily_metrics_from(read_sql, large_tx_threshold=1000.0, dates=dates)
+    reference = restrict_to_partitions(_row_by_row(*frames), dates)
+
+    assert set(reference["metric_name"]) >= {"inflow", "large_tx_count", "tokens_minted", DELTA_METRIC, "exchange_net_flow"}
+    pd.testing.assert_frame_equal(result, reference)
@@ -0,0 +1,44 @@
+import os
+
+import pandas as pd
+
+from src.etl import parquet_store
+from src.etl.entities import reset_analysis_tables
+from src.etl.load import load_transactions
+
+WALLET = "0x00000000000000000000000000000000000000aa"
+OTHER = "0x00000000000000000000000000000000000000bb"
+
+
+def _stored_rows():
+    files = parquet_store.partition_files()
+    return pd.concat([pd.read_parquet(path) for path in files], ignore_index=True) if files else pd.DataFrame()
+
+
+def test_full_export_keeps_archived_months(engine, transfers, tmp_path, monkeypatch):
+    monkeypatch.setattr(parquet_store, "PARQUET_DIR", str(tmp_path / "parquet"))
+    recent = pd.Timestamp.now(tz="UTC").floor("D") - pd.Timedelta(days=2)
+    rows = [
+        ("0x1", WALLET, OTHER, 1.0, "2024-01-05"),
+        ("0x2", WALLET, OTHER, 2.0, "2024-02-07"),
+        ("0x3", WALLET, OTHER, 3.0, recent),
+    ]
+    load_transactions(transfers(rows), entity_ids={})
+    parquet_store.archive_transactions(45)
+    assert sorted(os.listdir(parquet_store.transactions_dir())) == ["month=2024-01", "month=2024-02"]
+
+    # --full-refresh: transactions are wiped and the reload may not reach the archived months.
+    reset_analysis_tables()
+    load_transactions(transfers(rows[2:]), entity_ids={})
+    parquet_store.export_transaction_partitions()
+    assert sorted(_stored_rows()["tx_hash"]) == ["0x1", "0x2", "0x3"]
+
+    # A reload that does reach them is folded back into the month, not read twice.
+    load_transactions(transfers(rows), entity_ids={})
+    parquet_store.export_transaction_partitions()
+    assert sorted(_stored_rows()["tx_hash"]) == ["0x1", "0x2", "0x3"]
+    assert sorted(os.listdir(parquet_store.transactions_dir())) == [
+        f"date={recent:%Y-%m-%d}",
+        "month=2024-01",
+        "month=2024-02",
+    ]
@@ -0,0 +1,160 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import aiohttp
+import pytest
+import requests
+
+from src.etl import ratelimit
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Response:
+    def __init__(self, status, headers=None):
+        self.status_code = status
+        self.headers = headers or {}
+
+
+class _Session:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class _AsyncResponse:
+    def __init__(self, status, headers=None):
+        self.status = status
+        self.headers = headers or {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise aiohttp.ClientResponseError(None, (), status=self.status)
+
+    async def json(self, content_type=None):
+        return {"result": "ok"}
+
+
+class _AsyncSession:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+
+    def post(self, url, json):
+        return _AsyncResponse(self.statuses.pop(0), {"Retry-After": "1"})
+
+
+@pytest.fixture
+def retries(monkeypatch):
+    # Two retries, no throttling, and sleeps recorded instead of taken.
+    sleeps = []
+    monkeypatch.setattr(ratelimit, "MAX_RETRIES", 2)
+    monkeypatch.setitem(ratelimit._buckets, "test", ratelimit.TokenBucket(0))
+    monkeypatch.setattr(ratelimit.time, "sleep", sleeps.append)
+
+    async def sleep(delay):
+        sleeps.append(delay)
+
+    monkeypatch.setattr(ratelimit.asyncio, "sleep", sleep)
+    return sleeps
+
+
+def test_token_bucket_reserve_queues_callers(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    bucket = ratelimit.TokenBucket(10)
+
+    assert bucket.reserve(10) == 0.0
+    # The bucket goes into debt, so each later caller waits behind the previous one.
+    assert bucket.reserve(5) == pytest.approx(0.5)
+    assert bucket.reserve(5) == pytest.approx(1.0)
+    clock.now = 1.0
+    assert bucket.reserve(1) == pytest.approx(0.1)
+    # Refills stop at capacity however long the bucket sits idle.
+    clock.now = 100.0
+    assert bucket.reserve(10) == 0.0
+    assert bucket.reserve(1) == pytest.approx(0.1)
+    assert ratelimit.TokenBucket(0).reserve(1000) == 0.0
+
+
+def test_backoff_delay_uses_full_jitter_within_the_cap(monkeypatch):
+    monkeypatch.setattr(ratelimit, "BACKOFF_BASE", 1.0)
+    monkeypatch.setattr(ratelimit, "BACKOFF_MAX", 8.0)
+    random.seed(0)
+
+    for attempt, ceiling in [(0, 1.0), (1, 2.0), (2, 4.0), (3, 8.0), (10, 8.0)]:
+        delays = [ratelimit.backoff_delay(attempt) for _ in range(500)]
+        assert all(0.0 <= delay <= ceiling for delay in delays)
+        assert min(delays) < ceiling * 0.1
+        assert max(delays) > ceiling * 0.9
+
+
+def test_backoff_delay_honours_retry_after(monkeypatch):
+    monkeypatch.setattr(ratelimit, "BACKOFF_MAX", 30.0)
+    in_20s = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=20), usegmt=True)
+    past = format_datetime(datetime.now(timezone.utc) - timedelta(seconds=20), usegmt=True)
+
+    assert ratelimit.backoff_delay(5, "3") == 3.0
+    assert ratelimit.backoff_delay(0, "120") == 30.0
+    assert 18.0 <= ratelimit.backoff_delay(0, in_20s) <= 20.0
+    assert ratelimit.backoff_delay(0, past) == 0.0
+
+
+def test_request_waits_for_retry_after(monkeypatch, retries):
+    ok = _Response(200)
+    session = _Session([_Response(429, {"Retry-After": "2"}), ok])
+    monkeypatch.setattr(ratelimit, "_session", session)
+
+    assert ratelimit.request("test", "GET", "http://stub") is ok
+    assert retries == [2.0]
+
+
+def test_request_returns_last_response_when_retries_run_out(monkeypatch, retries):
+    last = _Response(503, {"Retry-After": "1"})
+    session = _Session([_Response(503, {"Retry-After": "1"}), _Response(503, {"Retry-After": "1"}), last])
+    monkeypatch.setattr(ratelimit, "_session", session)
+
+    assert ratelimit.request("test", "GET", "http://stub") is last
+    assert session.calls == 3
+    assert retries == [1.0, 1.0]
+
+
+def test_request_reraises_the_last_connection_error(monkeypatch, retries):
+    errors = [requests.ConnectionError(f"attempt {attempt}") for attempt in range(3)]
+    monkeypatch.setattr(ratelimit, "_session", _Session(errors))
+
+    with pytest.raises(requests.ConnectionError, match="attempt 2"):
+        ratelimit.request("test", "GET", "http://stub")
+    assert len(retries) == 2
+
+
+def test_post_json_async_raises_the_last_error_status(retries):
+    session = _AsyncSession([503, 503, 502])
+
+    with pytest.raises(aiohttp.ClientResponseError) as error:
+        asyncio.run(ratelimit.post_json_async(session, "test", "http://stub", {}))
+    assert error.value.status == 502
+    assert retries == [1.0, 1.0]
+
+    session = _AsyncSession([429, 200])
+    assert asyncio.run(ratelimit.post_json_async(session, "test", "http://stub", {})) == {"result": "ok"}
@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+
+from analytics import risk
+from analytics.risk import _load_stats, build_risk_metrics, refresh_risk_scores, write_risk_metrics
+from src.etl.entities import load_entities
+from src.etl.load import load_transactions
+
+WALLETS = [f"0x{index:040x}" for index in range(1, 5)]
+
+
+def _write_entities(path, types):
+    rows = [f"{wallet},wallet {index},{kind}" for index, (wallet, kind) in enumerate(zip(WALLETS, types))]
+    lines = ["address,label,entity_type", *rows]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def _state_wallets(engine):
+    with engine.connect() as conn:
+        return sorted(row[0] for row in conn.exec_driver_sql("SELECT wallet_address FROM wallet_risk_state"))
+
+
+def _state_scores(engine):
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("SELECT wallet_address, risk_score FROM wallet_risk_state")
+        return dict(rows.fetchall())
+
+
+@pytest.fixture
+def scored(engine, tmp_path, transfers):
+    csv_path = tmp_path / "entities.csv"
+    _write_entities(csv_path, ["exchange_hot"] * len(WALLETS))
+    load_entities(str(csv_path))
+    now = pd.Timestamp.now(tz="UTC").floor("h")
+    rows = [
+        (f"0x{wallet[-2:]}{n}", wallet, f"0x{n:040x}", float(i + n), now - pd.Timedelta(hours=n + 1))
+        for i, wallet in enumerate(WALLETS)
+        for n in range(i + 2)
+    ]
+    load_transactions(transfers(rows))
+    build_risk_metrics()
+    return csv_path
+
+
+def test_identical_entity_reload_keeps_risk_state(engine, scored):
+    load_entities(str(scored))
+    assert _state_wallets(engine) == WALLETS
+    assert refresh_risk_scores().empty
+
+
+def test_changed_entity_restandardizes_every_wallet_when_stats_move(engine, scored):
+    _write_entities(scored, ["exchange_hot", "exchange_hot", "contract", "exchange_hot"])
+    load_entities(str(scored))
+    assert _state_wallets(engine) == WALLETS
+
+    refreshed = refresh_risk_scores()
+    remaining = [WALLETS[0], WALLETS[1], WALLETS[3]]
+    assert sorted(refreshed["wallet_address"]) == remaining
+    assert _state_wallets(engine) == remaining
+    with engine.connect() as conn:
+        streamed = _load_stats(conn)
+    streamed_scores = _state_scores(engine)
+    build_risk_metrics()
+    with engine.connect() as conn:
+        rebuilt = _load_stats(conn)
+    assert streamed.keys() == rebuilt.keys()
+    for feature, stat in rebuilt.items():
+        assert streamed[feature] == pytest.approx(stat)
+    assert streamed_scores == pytest.approx(_state_scores(engine))
+
+
+def test_small_stat_moves_keep_the_stored_basis(engine, scored, monkeypatch):
+    monkeypatch.setattr(risk, "RISK_STATS_TOLERANCE", 1e9)
+    before = _state_scores(engine)
+    _write_entities(scored, ["exchange_hot", "exchange_hot", "contract", "exchange_hot"])
+    load_entities(str(scored))
+
+    assert refresh_risk_scores().empty
+    assert _state_scores(engine) == {wallet: score for wallet, score in before.items() if wallet != WALLETS[2]}
+    with engine.connect() as conn:
+        assert risk._load_scored_stats(conn) != _load_stats(conn)
+
+
+def test_risk_metrics_keep_one_row_per_wallet_and_day(engine, scored):
+    write_risk_metrics(build_risk_metrics())
+    write_risk_metrics(build_risk_metrics())
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("SELECT wallet_address, as_of_date FROM risk_metrics").fetchall()
+    assert sorted(wallet for wallet, _ in rows) == WALLETS